@@ -0,0 +1,81 @@
+# alerts.py
+"""
+Low-stock, reorder and expiry alerts from maintained state.
+
+StockBalance.needs_reorder is kept current by every stock write (see
+inventory.apply_stock_deltas) and indexed with business_id, so the reorder list
+is an index range rather than a catalog scan. Product(business_id, expiry_date)
+is the sorted expiry index.
+
+StockBalance.suggested_reorder comes from the demand forecast. Its window ends
+yesterday, so it only changes once a day: refresh_suggestions() runs as a
+background job the first time alerts are asked for on a given day.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import bindparam
+from extensions import db
+from models import Product, StockBalance
+from forecasting import forecast_business
+from inventory import refresh_reorder_flags
+from events import publish
+
+_sb = StockBalance.__table__
+# updated_at kept: a forecast isn't a catalog change (inventory.catalog_changes)
+_SUGGEST = (_sb.update().where(_sb.c.id == bindparam("b_id"))
+            .values(suggested_reorder=bindparam("b_suggested"), updated_at=_sb.c.updated_at))
+
+def refresh_suggestions(business_id):
+    """Store today's forecast suggested_reorder on every balance row, then re-flag. Returns rows changed."""
+    forecast = forecast_business(business_id)
+    rows = (db.session.query(StockBalance.id, StockBalance.product_id, StockBalance.suggested_reorder)
+            .filter(StockBalance.business_id == business_id).all())
+    changed = [{"b_id": row_id, "b_suggested": forecast[pid]["suggested_reorder"]}
+               for row_id, pid, old in rows
+               if pid in forecast and forecast[pid]["suggested_reorder"] != (old or 0)]
+    for i in range(0, len(changed), 5000):
+        db.session.execute(_SUGGEST, changed[i:i + 5000])
+    refresh_reorder_flags(business_id)
+    if changed:
+        publish(business_id, "alerts", {"changed": len(changed)})
+    db.session.commit()
+    return len(changed)
+
+def _reasons(qty, reorder_point, suggested):
+    out = []
+    if qty <= 0:
+        out.append("out_of_stock")
+    elif (reorder_point or 0) > 0 and qty <= reorder_point:
+        out.append("below_reorder_point")
+    if qty < (suggested or 0):
+        out.append("forecast_shortfall")
+    return out
+
+def reorder_alerts(business_id, limit):
+    """(total, items): products flagged needs_reorder, emptiest first."""
+    q = (db.session.query(Product, StockBalance.qty, StockBalance.suggested_reorder)
+         .join(StockBalance, StockBalance.product_id == Product.id)
+         .filter(StockBalance.business_id == business_id, StockBalance.needs_reorder.is_(True)))
+    total = q.count()
+    items = [{
+        "product_id": p.id, "sku": p.sku, "name": p.name, "stock": qty,
+        "reorder_point": p.reorder_point or 0, "suggested_reorder": suggested or 0,
+        "reasons": _reasons(qty, p.reorder_point, suggested),
+    } for p, qty, suggested in q.order_by(StockBalance.qty, Product.id).limit(limit)]
+    return total, items
+
+def expiry_alerts(business_id, days, limit):
+    """(total, items): in-stock products expiring within `days` (or already expired), soonest first."""
+    today = datetime.utcnow().date()
+    q = (db.session.query(Product, StockBalance.qty)
+         .join(StockBalance, StockBalance.product_id == Product.id)
+         .filter(Product.business_id == business_id,
+                 Product.expiry_date.isnot(None),
+                 Product.expiry_date <= today + timedelta(days=days),
+                 StockBalance.qty > 0))
+    total = q.count()
+    items = [{
+        "product_id": p.id, "sku": p.sku, "name": p.name, "stock": qty,
+        "expiry_date": p.expiry_date.isoformat(),
+        "days_left": (p.expiry_date - today).days,
+    } for p, qty in q.order_by(Product.expiry_date, Product.id).limit(limit)]
+    return total, items
@@ -1,22 +1,33 @@
+# app.py
+# Importing this module does no database I/O and builds no app: WSGI servers call
+# create_app() ("app:create_app()"), and the schema is created by
+# `python manage.py init-db`, not on boot.
 from flask import Flask, render_template, request
+from flask_login import login_required
 from config import Config
-from extensions import db, login_manager
-from models import *
-from routes_auth import auth_bp
-from routes_api import api_bp
-from flask_login import login_required, current_user
-from routes_admin import admin_bp
+from extensions import db, login_manager, init_storage
 
 def create_app():
+    # blueprints (and through them the models) load with the first app, not on import
+    from routes_auth import auth_bp
+    from routes_api import api_bp
+    from routes_admin import admin_bp
+    from profiling import init_profiling
+    from tenancy import init_tenancy
+    from search import init_search
+    from encoding import init_compression
+
     app = Flask(__name__, static_folder="static", template_folder="templates")
     app.config.from_object(Config)
 
     db.init_app(app)
+    init_storage(app)
+    init_profiling(app)
+    init_tenancy(app)
+    init_search(app)
+    init_compression(app)
     login_manager.init_app(app)
 
-    with app.app_context():
-        db.create_all()
-
     app.register_blueprint(auth_bp)
     app.register_blueprint(api_bp)
     app.register_blueprint(admin_bp) 
@@ -48,12 +59,18 @@ def create_app():
   
     @app.after_request
     def never_cache_private(r):
+        # Versioned API snapshots: browser may keep them but must revalidate (304)
+        if request.path.startswith('/api/') and r.headers.get('ETag'):
+            r.headers['Cache-Control'] = 'private, no-cache'
+            r.vary.add('Cookie')
+            return r
+
         # Never cache APIs
         if request.path.startswith('/api/'):
             r.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
             r.headers['Pragma'] = 'no-cache'
             r.headers['Expires'] = '0'
-            r.headers['Vary'] = 'Cookie'
+            r.vary.add('Cookie')
             return r
 
         # For HTML that depends on login state (/, /dashboard, /products, /sales, /purchases)
@@ -63,14 +80,22 @@ def create_app():
             r.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
             r.headers['Pragma'] = 'no-cache'
             r.headers['Expires'] = '0'
-            r.headers['Vary'] = 'Cookie'
+            r.vary.add('Cookie')
         return r
 
     
     return app
 
+_app = None
 
-app = create_app()
+def __getattr__(name):
+    # `from app import app` (existing WSGI files) still works: built on first use, once
+    global _app
+    if name != "app":
+        raise AttributeError(name)
+    if _app is None:
+        _app = create_app()
+    return _app
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,116 @@
+# benchmarks/concurrent_sales.py
+"""
+Several "tills" posting sales at once against one SQLite file.
+
+    python benchmarks/concurrent_sales.py --tills 8 --sales 200
+    python benchmarks/concurrent_sales.py --tills 8 --businesses 4 --sharded
+
+Each till is a separate process (like a pre-forked WSGI worker) that logs in
+as its own cashier and POSTs /api/sales in a loop. Reports throughput and how
+many requests failed (e.g. "database is locked"). With --businesses the tills
+are spread over several stores; --sharded gives each store its own SQLite
+file (SHARD_DIR) instead of sharing one.
+"""
+import argparse, multiprocessing as mp, os, sys, tempfile, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _app(db_path, shard_dir=None):
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    if shard_dir:
+        os.environ["SHARD_DIR"] = shard_dir
+    sys.path.insert(0, ROOT)
+    from app import create_app
+    app = create_app()
+    app.config["PROPAGATE_EXCEPTIONS"] = False  # count failures as 500s instead of raising
+    return app
+
+def _setup(db_path, shard_dir, tills, products, businesses):
+    app = _app(db_path, shard_dir)
+    from extensions import create_schema
+    with app.app_context():
+        create_schema()
+    pids = []
+    for b in range(businesses):
+        c = app.test_client()
+        c.post("/auth/register", data={"email": f"owner{b}@example.com", "password": "benchpw",
+                                       "confirm_password": "benchpw", "store_name": f"Bench {b}"})
+        pids.append([c.post("/api/products", json={"sku": f"SKU{i}", "name": f"Item {i}",
+                                                   "opening_stock": 10**6}).get_json()["id"]
+                     for i in range(products)])
+        for t in range(b, tills, businesses):   # till t works for store t % businesses
+            c.post("/admin/users", data={"email": f"till{t}@example.com", "password": "benchpw",
+                                         "role": "staff"})
+    return pids
+
+def _till(db_path, shard_dir, t, sales, pids, start, out, batch=0, done=None):
+    c = _app(db_path, shard_dir).test_client()
+    c.post("/auth/login", data={"email": f"till{t}@example.com", "password": "benchpw"})
+    start.wait()
+    ok = failed = i = 0
+    latencies = []
+    while (i < sales) if not batch else not done.is_set():
+        items = [{"product_id": pids[(t + i + k) % len(pids)], "qty": 1, "unit_price": 2.5}
+                 for k in range(3)]
+        t0 = time.perf_counter()
+        if batch:   # back-office catch-up: one big write transaction per request
+            r = c.post("/api/sync", json={"version": 2, "sales": [{"items": items}] * batch})
+        else:
+            r = c.post("/api/sales", json={"items": items})
+        latencies.append((time.perf_counter() - t0) * 1000)
+        if r.status_code == 200:
+            ok += batch or 1
+        else:
+            failed += 1
+        i += 1
+    out.put((t, ok, failed, latencies))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tills", type=int, default=8)
+    ap.add_argument("--sales", type=int, default=200, help="sales per till")
+    ap.add_argument("--products", type=int, default=50)
+    ap.add_argument("--businesses", type=int, default=1, help="stores the tills are spread over")
+    ap.add_argument("--sharded", action="store_true", help="one SQLite file per store")
+    ap.add_argument("--batch", type=int, default=0,
+                    help="till 0 keeps syncing this many sales per request until the others finish")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    db_path = os.path.join(tmp, "bench.db")
+    shard_dir = os.path.join(tmp, "shards") if args.sharded else None
+    pids = _setup(db_path, shard_dir, args.tills, args.products, args.businesses)
+
+    ctx = mp.get_context("spawn")
+    start, out, done = ctx.Barrier(args.tills + 1), ctx.Queue(), ctx.Event()
+    procs = [ctx.Process(target=_till, args=(db_path, shard_dir, t, args.sales,
+                                             pids[t % args.businesses], start, out,
+                                             args.batch if t == 0 else 0, done))
+             for t in range(args.tills)]
+    for p in procs:
+        p.start()
+    start.wait()
+    t0 = time.perf_counter()
+    results, tills = {}, set(range(1 if args.batch else 0, args.tills))
+    while not tills <= results.keys():
+        t, *r = out.get()
+        results[t] = r
+    dt = time.perf_counter() - t0
+    done.set()
+    if args.batch:
+        t, *r = out.get()
+        results[t] = r
+    for p in procs:
+        p.join()
+    ok, failed = sum(results[t][0] for t in tills), sum(results[t][1] for t in tills)
+    lat = sorted(ms for t in tills for ms in results[t][2])
+    layout = "sharded" if args.sharded else "one file"
+    print(f"{len(tills)} tills x {args.sales} sales, {args.businesses} store(s), {layout}: "
+          f"{ok}/{ok + failed} ok, {failed} failed, "
+          f"{dt:.2f}s, {ok / dt:,.0f} sales/s, p50 {lat[len(lat) // 2]:.1f} ms, "
+          f"p99 {lat[int(len(lat) * 0.99)]:.1f} ms")
+    if args.batch:
+        print(f"till 0 (store 0) synced {results[0][0]} sales in batches of {args.batch} meanwhile")
+
+if __name__ == "__main__":
+    main()
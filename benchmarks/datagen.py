@@ -0,0 +1,113 @@
+# benchmarks/datagen.py
+"""
+Seeded synthetic multi-tenant data built against the real models.
+
+generate() writes N businesses, each with a manager login, M products and
+`days` of Sale/SaleItem/Purchase/PurchaseItem/StockMovement history, then
+rebuilds the derived tables (StockBalance, DailyProductSales, costs) the same way
+manage.py does. Same seed -> same data.
+"""
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from extensions import db
+from models import (Business, User, Product, Sale, SaleItem, Purchase, PurchaseItem,
+                    StockMovement)
+from inventory import reconcile_balances, rebuild_daily_sales, rebuild_valuation
+
+PASSWORD = "benchpw"
+
+def manager_email(b):
+    return f"manager{b}@bench.local"
+
+def _ids(model, rows):
+    stmt = insert(model).returning(model.id, sort_by_parameter_order=True)
+    return list(db.session.scalars(stmt, rows)) if rows else []
+
+def generate(businesses=3, products=200, days=365, sales_per_day=20, purchases_per_week=3,
+             max_lines=4, seed=42):
+    """Populate the current app's database. Returns a summary dict of row counts."""
+    rnd = random.Random(seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    start = now - timedelta(days=days)
+    counts = {"businesses": 0, "products": 0, "sales": 0, "sale_items": 0,
+              "purchases": 0, "movements": 0}
+    pw_hash = None
+
+    for b in range(businesses):
+        biz = Business(name=f"Bench Shop {b}", stock_policy="allow")  # synthetic history oversells
+        db.session.add(biz); db.session.flush()
+        u = User(email=manager_email(b), store_name=biz.name, role="manager", business_id=biz.id)
+        if pw_hash is None:
+            u.set_password(PASSWORD); pw_hash = u.password_hash
+        else:
+            u.password_hash = pw_hash
+        db.session.add(u); db.session.flush()
+        bid, uid = biz.id, u.id
+
+        pids = _ids(Product, [{
+            "user_id": uid, "business_id": bid, "sku": f"B{b}-SKU{i:05d}",
+            "name": f"Product {i} of shop {b}", "category": f"Cat {i % 12}",
+            "unit_price": round(rnd.uniform(50, 5000), 2),
+            "reorder_point": rnd.randint(0, 20),
+            "barcode": f"{b:02d}{i:011d}",
+        } for i in range(products)])
+        prices = {pid: rnd.uniform(50, 5000) for pid in pids}
+        # popularity skew: a few products sell far more often than the rest
+        weights = [1.0 / (k + 1) ** 0.8 for k in range(len(pids))]
+
+        movements = [{"user_id": uid, "business_id": bid, "product_id": pid, "qty": 500,
+                      "type": "IN", "source": "opening", "timestamp": start} for pid in pids]
+
+        for d in range(days):
+            day0 = start + timedelta(days=d)
+            n_sales = max(0, int(rnd.gauss(sales_per_day, sales_per_day / 4)))
+            stamps = sorted(day0 + timedelta(seconds=rnd.randint(8 * 3600, 20 * 3600))
+                            for _ in range(n_sales))
+            baskets = [rnd.choices(pids, weights, k=rnd.randint(1, max_lines)) for _ in stamps]
+            sale_ids = _ids(Sale, [{
+                "user_id": uid, "business_id": bid, "timestamp": ts,
+                "total_amount": sum(round(prices[p], 2) for p in basket),
+            } for ts, basket in zip(stamps, baskets)])
+            items = []
+            for sid, ts, basket in zip(sale_ids, stamps, baskets):
+                for p in basket:
+                    items.append({"sale_id": sid, "business_id": bid, "product_id": p,
+                                  "qty": 1, "unit_price": round(prices[p], 2)})
+                    movements.append({"user_id": uid, "business_id": bid, "product_id": p,
+                                      "qty": -1, "type": "OUT", "source": "sale", "timestamp": ts})
+            if items:
+                db.session.execute(insert(SaleItem), items)
+            counts["sales"] += len(sale_ids)
+            counts["sale_items"] += len(items)
+
+            if rnd.random() < purchases_per_week / 7:
+                ts = day0 + timedelta(hours=9)
+                lines = [(p, rnd.randint(10, 60), round(prices[p] * 0.7, 2))
+                         for p in rnd.sample(pids, min(len(pids), rnd.randint(3, 15)))]
+                (pur_id,) = _ids(Purchase, [{"user_id": uid, "business_id": bid, "timestamp": ts,
+                                              "total_cost": sum(q * c for _, q, c in lines)}])
+                db.session.execute(insert(PurchaseItem), [
+                    {"purchase_id": pur_id, "product_id": p, "qty": q, "unit_cost": c}
+                    for p, q, c in lines])
+                movements += [{"user_id": uid, "business_id": bid, "product_id": p, "qty": q,
+                               "type": "IN", "source": "purchase", "unit_cost": c, "timestamp": ts}
+                              for p, q, c in lines]
+                counts["purchases"] += 1
+
+            if len(movements) > 5000:
+                db.session.execute(insert(StockMovement), movements)
+                counts["movements"] += len(movements)
+                movements = []
+
+        if movements:
+            db.session.execute(insert(StockMovement), movements)
+            counts["movements"] += len(movements)
+        counts["businesses"] += 1
+        counts["products"] += len(pids)
+        db.session.commit()
+
+    reconcile_balances()
+    rebuild_daily_sales()
+    rebuild_valuation()
+    return counts
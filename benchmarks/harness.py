@@ -0,0 +1,157 @@
+# benchmarks/harness.py
+"""
+Drive every /api endpoint through the Flask test client against generated data.
+
+    python -m benchmarks.harness --businesses 3 --products 500 --days 365
+    python -m benchmarks.harness --db /tmp/bench.db --reuse --out before.json
+    python -m benchmarks.harness --reuse --db /tmp/bench.db --compare before.json
+
+Reports p50/p95/p99 latency, throughput and peak Python memory per endpoint
+and writes the run (parameters + results) as JSON.
+"""
+import argparse, json, os, platform, random, sys, tempfile, time, tracemalloc, uuid
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+def scenarios(pids, rnd, barcodes=()):
+    """(name, method, url, body factory) for each endpoint under test."""
+    def sale():
+        return {"items": [{"product_id": rnd.choice(pids), "qty": 1, "unit_price": 100.0}
+                          for _ in range(rnd.randint(1, 4))]}
+    def sync_batch():
+        return {"version": 2, "sales": [{"client_id": str(uuid.uuid4()), **sale()} for _ in range(20)]}
+    year_ago = (datetime.utcnow() - timedelta(days=365)).date().isoformat()
+    return [
+        ("stock", "get", "/api/stock", None),
+        ("valuation", "get", "/api/valuation", None),
+        ("products", "get", "/api/products", None),
+        ("catalog", "get", "/api/catalog", None),
+        ("lookup", "get", lambda: f"/api/products/lookup?barcode={rnd.choice(barcodes)}", None),
+        ("search", "get", lambda: f"/api/products/search?q=product%20{rnd.randrange(len(pids))}", None),
+        ("search_typo", "get", lambda: f"/api/products/search?q=prodcut%20{rnd.randrange(len(pids))}", None),
+        ("sales_list", "get", "/api/sales_list?limit=50", None),
+        ("activity", "get", "/api/activity?limit=50", None),
+        ("report_month", "get", f"/api/reports/sales?group_by=month&from={year_ago}", None),
+        ("report_product", "get", "/api/reports/sales?group_by=product&limit=20", None),
+        ("forecast_one", "get", lambda: f"/api/forecast/{rnd.choice(pids)}", None),
+        ("forecast_all", "get", "/api/forecast?all=1", None),
+        ("sales_post", "post", "/api/sales", sale),
+        ("sync_20", "post", "/api/sync", sync_batch),
+    ]
+
+def run_endpoint(client, method, url, body, iterations, warmup=3):
+    call = getattr(client, method)
+    def once():
+        u = url() if callable(url) else url
+        r = call(u, json=body()) if body else call(u)
+        r.get_data()
+        return r.status_code
+    for _ in range(warmup):
+        once()
+    latencies, errors = [], 0
+    t_all = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        if once() >= 400:
+            errors += 1
+        latencies.append((time.perf_counter() - t0) * 1000)
+    elapsed = time.perf_counter() - t_all
+    latencies.sort()
+    # peak memory from a separate traced pass; tracing would skew the timings above
+    tracemalloc.start()
+    for _ in range(3):
+        once()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "iterations": iterations, "errors": errors,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "mean_ms": round(sum(latencies) / len(latencies), 3),
+        "throughput_rps": round(iterations / elapsed, 1),
+        "peak_mem_kib": round(peak / 1024, 1),
+    }
+
+def compare(current, baseline_path):
+    with open(baseline_path) as fh:
+        base = json.load(fh)["results"]
+    print(f"\n{'endpoint':<14}{'p50 before':>12}{'p50 now':>10}{'p95 before':>12}{'p95 now':>10}{'change':>9}")
+    for name, r in current.items():
+        b = base.get(name)
+        if not b:
+            continue
+        change = (r["p50_ms"] - b["p50_ms"]) / b["p50_ms"] * 100 if b["p50_ms"] else 0
+        print(f"{name:<14}{b['p50_ms']:>12.2f}{r['p50_ms']:>10.2f}{b['p95_ms']:>12.2f}{r['p95_ms']:>10.2f}{change:>+8.0f}%")
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--businesses", type=int, default=3)
+    ap.add_argument("--products", type=int, default=200)
+    ap.add_argument("--days", type=int, default=365)
+    ap.add_argument("--sales-per-day", type=int, default=20)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--iterations", type=int, default=50)
+    ap.add_argument("--only", help="comma-separated scenario names")
+    ap.add_argument("--db", help="SQLite file to use (default: a fresh temp file)")
+    ap.add_argument("--reuse", action="store_true", help="skip generation if --db already has data")
+    ap.add_argument("--out", help="results JSON path (default: benchmarks/results/<timestamp>.json)")
+    ap.add_argument("--compare", help="earlier results JSON to diff against")
+    args = ap.parse_args()
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    sys.path.insert(0, ROOT)
+    from app import create_app
+    from extensions import db, create_schema
+    from models import Business, Product
+    from benchmarks.datagen import generate, manager_email, PASSWORD
+
+    app = create_app()
+    with app.app_context():
+        create_schema()
+        if not (args.reuse and Business.query.first()):
+            t0 = time.perf_counter()
+            counts = generate(args.businesses, args.products, args.days,
+                              args.sales_per_day, seed=args.seed)
+            print(f"generated {counts} in {time.perf_counter() - t0:.1f}s")
+        biz = Business.query.order_by(Business.id).first()
+        rows = db.session.query(Product.id, Product.barcode).filter(Product.business_id == biz.id).all()
+        pids, barcodes = [pid for pid, _ in rows], [bc for _, bc in rows]
+        b_index = int(biz.name.rsplit(" ", 1)[-1])
+
+    client = app.test_client()
+    client.post("/auth/login", data={"email": manager_email(b_index), "password": PASSWORD})
+
+    rnd = random.Random(args.seed)
+    wanted = set(args.only.split(",")) if args.only else None
+    results = {}
+    print(f"{'endpoint':<14}{'p50':>9}{'p95':>9}{'p99':>9}{'req/s':>9}{'peak KiB':>10}{'err':>5}")
+    for name, method, url, body in scenarios(pids, rnd, barcodes):
+        if wanted and name not in wanted:
+            continue
+        r = run_endpoint(client, method, url, body, args.iterations)
+        results[name] = r
+        print(f"{name:<14}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}"
+              f"{r['throughput_rps']:>9.1f}{r['peak_mem_kib']:>10.1f}{r['errors']:>5}")
+
+    out = args.out or os.path.join(ROOT, "benchmarks", "results",
+                                   datetime.utcnow().strftime("%Y%m%dT%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w") as fh:
+        json.dump({"params": vars(args), "python": platform.python_version(),
+                   "created_at": datetime.utcnow().isoformat(), "results": results}, fh, indent=2)
+    print(f"\nsaved {out}")
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+# benchmarks/line_items.py
+"""
+Time POST /api/sales and /api/purchases by invoice size against a throwaway
+SQLite file, and report the cost per line item.
+
+    python benchmarks/line_items.py --lines 1,10,50,200 --repeat 30
+"""
+import argparse, os, random, sys, tempfile, time
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lines", default="1,10,50,200")
+    ap.add_argument("--repeat", type=int, default=30)
+    ap.add_argument("--products", type=int, default=500)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from app import create_app
+    from extensions import create_schema
+
+    app = create_app()
+    with app.app_context():
+        create_schema()
+    c = app.test_client()
+    c.post("/auth/register", data={"email": "bench@example.com", "password": "benchpw",
+                                   "confirm_password": "benchpw", "store_name": "Bench"})
+    pids = [c.post("/api/products", json={"sku": f"SKU{i}", "name": f"Item {i}",
+                                          "opening_stock": 100000, "unit_cost": 10}).get_json()["id"]
+            for i in range(args.products)]
+
+    rnd = random.Random(args.seed)
+    print(f"{'endpoint':<16}{'lines':>6}{'p50 ms':>9}{'p95 ms':>9}{'µs/line':>9}")
+    for n in (int(x) for x in args.lines.split(",")):
+        for url, price_key in (("/api/sales", "unit_price"), ("/api/purchases", "unit_cost")):
+            times = []
+            for _ in range(args.repeat + 2):
+                body = {"items": [{"product_id": pid, "qty": rnd.randint(1, 3),
+                                   price_key: round(rnd.uniform(1, 50), 2)}
+                                  for pid in rnd.sample(pids, min(n, len(pids)))]}
+                t0 = time.perf_counter()
+                r = c.post(url, json=body)
+                times.append((time.perf_counter() - t0) * 1000)
+                assert r.status_code == 200, r.get_data(as_text=True)
+            times = sorted(times[2:])   # first two are warm-up
+            p50, p95 = times[len(times) // 2], times[int(len(times) * 0.95)]
+            print(f"{url:<16}{n:>6}{p50:>9.2f}{p95:>9.2f}{p50 * 1000 / n:>9.0f}")
+
+if __name__ == "__main__":
+    main()
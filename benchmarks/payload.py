@@ -0,0 +1,65 @@
+# benchmarks/payload.py
+"""
+Body size and server time of the big list endpoints per representation
+(rows / columnar JSON, MessagePack; identity / gzip / brotli) for one store.
+
+    python benchmarks/payload.py --products 10000 --repeat 10
+
+msgpack and brotli rows are skipped when those optional packages are missing.
+"""
+import argparse, os, statistics, sys, tempfile, time
+
+VARIANTS = [
+    # (name, query string, headers)
+    ("json rows", "", {}),
+    ("json rows + gzip", "", {"Accept-Encoding": "gzip"}),
+    ("json rows + br", "", {"Accept-Encoding": "br"}),
+    ("columnar", "?format=columnar", {}),
+    ("columnar + gzip", "?format=columnar", {"Accept-Encoding": "gzip"}),
+    ("columnar + br", "?format=columnar", {"Accept-Encoding": "br"}),
+    ("columnar msgpack", "?format=columnar", {"Accept": "application/msgpack"}),
+    ("columnar msgpack + br", "?format=columnar", {"Accept": "application/msgpack", "Accept-Encoding": "br"}),
+]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--products", type=int, default=10000)
+    ap.add_argument("--repeat", type=int, default=10)
+    ap.add_argument("--endpoints", default="/api/catalog,/api/products,/api/stock")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from app import create_app
+    from extensions import create_schema
+    import encoding
+
+    app = create_app()
+    with app.app_context():
+        create_schema()
+    c = app.test_client()
+    c.post("/auth/register", data={"email": "bench@example.com", "password": "benchpw",
+                                   "confirm_password": "benchpw", "store_name": "Bench"})
+    for i in range(args.products):
+        c.post("/api/products", json={"sku": f"SKU-{i:06d}", "name": f"Product {i} 500g pack",
+                                      "barcode": f"600{i:010d}", "unit_price": 10 + i % 90,
+                                      "reorder_point": i % 20, "opening_stock": i % 50, "unit_cost": 5})
+
+    print(f"{'endpoint':<14}{'representation':<24}{'bytes':>10}{'vs rows':>9}{'p50 ms':>9}")
+    for url in args.endpoints.split(","):
+        base = None
+        for name, qs, headers in VARIANTS:
+            if ("msgpack" in name and encoding.msgpack is None) or ("br" in name.split() and encoding.brotli is None):
+                continue
+            times = []
+            for _ in range(args.repeat + 1):
+                t0 = time.perf_counter()
+                r = c.get(url + qs, headers=headers)
+                size = len(r.get_data())
+                times.append((time.perf_counter() - t0) * 1000)
+            base = base or size
+            print(f"{url:<14}{name:<24}{size:>10}{size / base:>8.0%}{statistics.median(times[1:]):>9.1f}")
+
+if __name__ == "__main__":
+    main()
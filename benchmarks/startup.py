@@ -0,0 +1,55 @@
+# benchmarks/startup.py
+"""
+Cold-start times: a WSGI worker booting the app, and manage.py commands.
+
+    python benchmarks/startup.py --runs 7
+
+Every case runs in a fresh interpreter against a throwaway copy of a small
+database; the median wall time is reported. "import" cases also check that
+nothing opened the database file, by pointing DATABASE_URL at a directory
+that doesn't exist.
+"""
+import argparse, os, statistics, subprocess, sys, tempfile, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (name, argv); a case that should not touch the database gets a missing path
+CASES = [
+    ("import create_app", [sys.executable, "-c", "from app import create_app"], False),
+    ("worker boot", [sys.executable, "-c", "from app import create_app; create_app()"], False),
+    ("worker boot + GET /", [sys.executable, "-c",
+                             "from app import create_app; create_app().test_client().get('/')"], True),
+    ("manage.py --help", [sys.executable, "manage.py", "--help"], True),
+    ("manage.py reconcile-stock", [sys.executable, "manage.py", "reconcile-stock"], True),
+]
+
+def _run(argv, env):
+    t0 = time.perf_counter()
+    r = subprocess.run(argv, cwd=ROOT, env=env, capture_output=True, text=True)
+    dt = time.perf_counter() - t0
+    if r.returncode:
+        raise SystemExit(f"{' '.join(argv[1:])} failed:\n{r.stderr[-2000:]}")
+    return dt
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=5)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    db_url = f"sqlite:///{os.path.join(tmp, 'startup.db')}"
+    base = {**os.environ, "PYTHONPATH": ROOT, "JOB_RUNNER": "external"}
+    # build the schema once, the way a deployment would
+    subprocess.run([sys.executable, "manage.py", "init-db"], cwd=ROOT,
+                   env={**base, "DATABASE_URL": db_url}, check=True, capture_output=True)
+
+    print(f"{'case':<28}{'median':>9}{'min':>9}  database")
+    for name, argv, needs_db in CASES:
+        url = db_url if needs_db else f"sqlite:///{os.path.join(tmp, 'missing', 'none.db')}"
+        env = {**base, "DATABASE_URL": url}
+        times = [_run(argv, env) for _ in range(args.runs)]
+        print(f"{name:<28}{statistics.median(times) * 1000:>7.0f}ms{min(times) * 1000:>7.0f}ms  "
+              f"{'used' if needs_db else 'not touched'}")
+
+if __name__ == "__main__":
+    main()
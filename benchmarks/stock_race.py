@@ -0,0 +1,119 @@
+# benchmarks/stock_race.py
+"""
+Concurrency stress test for the stock guard: several tills race to sell the
+last units of a few products against one SQLite file.
+
+    python benchmarks/stock_race.py --tills 8 --products 5 --stock 40
+    python benchmarks/stock_race.py --policy allow
+
+Each till is a separate process that keeps POSTing one- or two-line sales
+until every product has been refused (409) or it has tried --attempts times.
+Afterwards the run is checked: with the "reject" policy exactly the opening
+stock is sold and no balance is negative; under either policy every balance
+equals the movement log and the units in 200 responses equal the units in
+SaleItem. Exits 1 if a check fails.
+"""
+import argparse, multiprocessing as mp, os, random, sys, tempfile, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _app(db_path):
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    sys.path.insert(0, ROOT)
+    from app import create_app
+    app = create_app()
+    app.config["PROPAGATE_EXCEPTIONS"] = False  # count failures as 500s instead of raising
+    return app
+
+def _setup(db_path, tills, products, stock, policy):
+    app = _app(db_path)
+    from extensions import create_schema
+    with app.app_context():
+        create_schema()
+    c = app.test_client()
+    c.post("/auth/register", data={"email": "owner@example.com", "password": "benchpw",
+                                   "confirm_password": "benchpw", "store_name": "Race"})
+    c.post("/admin/stock-policy", json={"stock_policy": policy})
+    pids = [c.post("/api/products", json={"sku": f"LAST{i}", "name": f"Last one {i}",
+                                          "opening_stock": stock}).get_json()["id"]
+            for i in range(products)]
+    for t in range(tills):
+        c.post("/admin/users", data={"email": f"till{t}@example.com", "password": "benchpw",
+                                     "role": "staff"})
+    return pids
+
+def _till(db_path, t, attempts, pids, start, out):
+    c = _app(db_path).test_client()
+    c.post("/auth/login", data={"email": f"till{t}@example.com", "password": "benchpw"})
+    rnd = random.Random(t)
+    sold, refused, failed, live = 0, 0, 0, set(pids)
+    start.wait()
+    for _ in range(attempts):
+        if not live:
+            break
+        items = [{"product_id": pid, "qty": rnd.randint(1, 2), "unit_price": 1.0}
+                 for pid in rnd.sample(sorted(live), min(len(live), rnd.randint(1, 2)))]
+        r = c.post("/api/sales", json={"items": items})
+        if r.status_code == 200:
+            sold += sum(it["qty"] for it in items)
+        elif r.status_code == 409:
+            refused += 1
+            live -= {s["product_id"] for s in r.get_json()["items"] if s["available"] <= 0}
+        else:
+            failed += 1
+    out.put((sold, refused, failed))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tills", type=int, default=8)
+    ap.add_argument("--products", type=int, default=5)
+    ap.add_argument("--stock", type=int, default=40, help="opening units per product")
+    ap.add_argument("--attempts", type=int, default=200, help="max sales tried per till")
+    ap.add_argument("--policy", choices=("reject", "allow"), default="reject")
+    args = ap.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), "race.db")
+    pids = _setup(db_path, args.tills, args.products, args.stock, args.policy)
+
+    ctx = mp.get_context("spawn")
+    start, out = ctx.Barrier(args.tills + 1), ctx.Queue()
+    procs = [ctx.Process(target=_till, args=(db_path, t, args.attempts, pids, start, out))
+             for t in range(args.tills)]
+    for p in procs:
+        p.start()
+    start.wait()
+    t0 = time.perf_counter()
+    results = [out.get() for _ in procs]
+    dt = time.perf_counter() - t0
+    for p in procs:
+        p.join()
+    sold, refused, failed = (sum(r[i] for r in results) for i in range(3))
+    print(f"{args.tills} tills, policy={args.policy}: {sold} units sold, {refused} sales refused, "
+          f"{failed} failed, {dt:.2f}s")
+
+    app = _app(db_path)
+    with app.app_context():
+        from sqlalchemy import func
+        from extensions import db
+        from models import StockBalance, SaleItem
+        from inventory import reconcile_balances
+        balances = dict(db.session.query(StockBalance.product_id, StockBalance.qty))
+        in_items = db.session.query(func.coalesce(func.sum(SaleItem.qty), 0)).scalar()
+        drift = reconcile_balances()
+        db.session.rollback()
+    opening = args.products * args.stock
+    checks = [
+        ("no request failed", failed == 0),
+        ("balances match the movement log", not drift),
+        ("units in 200 responses == units in SaleItem", sold == in_items),
+        ("balances == opening - sold", sum(balances.values()) == opening - sold),
+    ]
+    if args.policy == "reject":
+        checks += [("no negative balance", min(balances.values()) >= 0),
+                   ("every unit sold, none oversold", sold == opening)]
+    for name, passed in checks:
+        print(f"{'✅' if passed else '❌'} {name}")
+    sys.exit(0 if all(p for _, p in checks) else 1)
+
+if __name__ == "__main__":
+    main()
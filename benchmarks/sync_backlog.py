@@ -0,0 +1,56 @@
+# benchmarks/sync_backlog.py
+"""
+Time POST /api/sync for an offline backlog against a throwaway SQLite file.
+
+    python benchmarks/sync_backlog.py --records 5000
+"""
+import argparse, os, random, sys, tempfile, time, uuid
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--records", type=int, default=5000)
+    ap.add_argument("--products", type=int, default=200)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from app import create_app
+    from extensions import create_schema
+
+    app = create_app()
+    with app.app_context():
+        create_schema()
+    c = app.test_client()
+    c.post("/auth/register", data={"email": "bench@example.com", "password": "benchpw",
+                                   "confirm_password": "benchpw", "store_name": "Bench"})
+    pids = [c.post("/api/products", json={"sku": f"SKU{i}", "name": f"Item {i}",
+                                          "opening_stock": 1000}).get_json()["id"]
+            for i in range(args.products)]
+
+    rnd = random.Random(args.seed)
+    def lines(price_key):
+        return [{"product_id": rnd.choice(pids), "qty": rnd.randint(1, 5),
+                 price_key: round(rnd.uniform(1, 50), 2)} for _ in range(rnd.randint(1, 3))]
+    n_purchases = args.records // 5
+    payload = {
+        "version": 2,
+        "sales": [{"client_id": str(uuid.uuid4()), "items": lines("unit_price")}
+                  for _ in range(args.records - n_purchases)],
+        "purchases": [{"client_id": str(uuid.uuid4()), "items": lines("unit_cost")}
+                      for _ in range(n_purchases)],
+    }
+
+    for label in ("first", "retry"):
+        t0 = time.perf_counter()
+        r = c.post("/api/sync", json=payload)
+        dt = time.perf_counter() - t0
+        body = r.get_json() or {}
+        print(f"{label:>6}: HTTP {r.status_code} {args.records} records in {dt:.3f}s "
+              f"({args.records / dt:,.0f} rec/s) created={body.get('created')}")
+    stock = sum(row["stock"] for row in c.get("/api/stock").get_json())
+    print(f" stock: {stock} units on hand after both posts")
+
+if __name__ == "__main__":
+    main()
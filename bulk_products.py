@@ -0,0 +1,163 @@
+# bulk_products.py
+"""
+Catalog import/export in chunks.
+
+Rows come from a streamed CSV or JSONL file and are written CHUNK at a time:
+one SKU lookup per chunk, bulk INSERTs for products, opening-stock movements
+and balances, then a commit. Bad rows are reported and skipped.
+"""
+import csv, io, json, math
+from datetime import datetime
+from sqlalchemy import insert
+from extensions import db
+from models import Product, StockMovement, StockBalance
+from inventory import init_balances, bump_catalog_version
+from events import publish
+
+CHUNK = 500
+FIELDS = ["sku", "name", "category", "unit", "barcode", "reorder_point",
+          "unit_price", "expiry_date", "stock", "unit_cost"]
+
+def iter_csv(stream):
+    # decoded a line at a time: a line that isn't UTF-8 is yielded as its
+    # UnicodeDecodeError (and left out of the CSV) so the rest still imports
+    lines = iter(stream)
+    try:
+        header = next(lines, b"").decode("utf-8-sig")
+    except UnicodeDecodeError as e:
+        yield e     # no usable column names: nothing to import
+        return
+    undecodable = []
+
+    def text():
+        yield header
+        for raw in lines:
+            try:
+                yield raw.decode("utf-8")
+            except UnicodeDecodeError as e:
+                undecodable.append(e)
+                yield ""    # a blank line, which DictReader skips
+
+    for row in csv.DictReader(text()):
+        yield from undecodable
+        undecodable.clear()
+        yield row
+    yield from undecodable
+
+def iter_jsonl(stream):
+    # a malformed (or non-UTF-8) line is yielded as its exception so the import can report it and go on
+    for raw in stream:
+        raw = raw.strip()
+        if not raw:
+            continue
+        try:
+            yield json.loads(raw.decode("utf-8"))
+        except ValueError as e:     # UnicodeDecodeError included
+            yield e
+
+def _finite(value, field):
+    n = float(value)
+    if not math.isfinite(n):   # "inf" / "nan" parse as floats
+        raise ValueError(f"{field} must be a finite number")
+    return n
+
+def _clean(rec):
+    """Validate one input record -> (product columns, (opening qty, unit cost)). Raises ValueError."""
+    sku = str(rec.get("sku") or "").strip()
+    name = str(rec.get("name") or "").strip()
+    if not sku or not name:
+        raise ValueError("sku and name are required")
+    expiry = (str(rec.get("expiry_date") or "")).strip()
+    opening = int(_finite(rec.get("opening_stock") or rec.get("stock") or 0, "opening_stock"))
+    cost = rec.get("unit_cost")
+    cost = _finite(cost, "unit_cost") if cost not in (None, "") else None
+    return {
+        "sku": sku, "name": name,
+        "category": rec.get("category") or None,
+        "unit": rec.get("unit") or "unit",
+        "barcode": rec.get("barcode") or None,
+        "reorder_point": int(_finite(rec.get("reorder_point") or 0, "reorder_point")),
+        "unit_price": _finite(rec.get("unit_price") or 0, "unit_price"),
+        "expiry_date": datetime.strptime(expiry, "%Y-%m-%d").date() if expiry else None,
+    }, (max(opening, 0), cost)
+
+def _write_chunk(business_id, user_id, chunk, errors):
+    skus = [cols["sku"] for _, cols, _ in chunk]
+    existing = {s for (s,) in db.session.query(Product.sku)
+                .filter(Product.business_id == business_id, Product.sku.in_(skus))}
+    rows, seen = [], set()
+    for line_no, cols, opening in chunk:
+        if cols["sku"] in existing or cols["sku"] in seen:
+            errors.append({"row": line_no, "sku": cols["sku"], "error": "SKU already exists"})
+            continue
+        seen.add(cols["sku"])
+        rows.append((cols, opening))
+    if not rows:
+        return 0
+
+    ids = list(db.session.scalars(
+        insert(Product).returning(Product.id, sort_by_parameter_order=True),
+        [{"user_id": user_id, "business_id": business_id, **cols} for cols, _ in rows]))
+    opening = {pid: qty for pid, (_, (qty, _)) in zip(ids, rows)}
+    costs = {pid: cost for pid, (_, (_, cost)) in zip(ids, rows)}
+    now = datetime.utcnow()
+    movements = [{"user_id": user_id, "business_id": business_id, "product_id": pid, "qty": qty,
+                  "type": "IN", "source": "opening", "unit_cost": costs[pid], "timestamp": now}
+                 for pid, qty in opening.items() if qty > 0]
+    if movements:
+        db.session.execute(insert(StockMovement), movements)
+    init_balances(business_id, opening, costs)
+    bump_catalog_version(business_id)
+    publish(business_id, "resync", {})  # too many rows to push one by one
+    db.session.commit()
+    return len(ids)
+
+def import_products(records, business_id, user_id, chunk_size=CHUNK):
+    """
+    Import an iterable of dict records. Commits every chunk_size rows.
+    Returns {"created": n, "errors": [{"row", "sku", "error"}, ...]} (row is 1-based).
+    """
+    created, errors, chunk = 0, [], []
+    for line_no, rec in enumerate(records, start=1):
+        if isinstance(rec, Exception):
+            errors.append({"row": line_no, "sku": None, "error": f"unreadable row: {rec}"})
+            continue
+        if not isinstance(rec, dict):
+            errors.append({"row": line_no, "sku": None, "error": "expected an object"})
+            continue
+        try:
+            cols, opening = _clean(rec)
+        except (ValueError, TypeError) as e:
+            errors.append({"row": line_no, "sku": rec.get("sku"), "error": str(e)})
+            continue
+        chunk.append((line_no, cols, opening))
+        if len(chunk) >= chunk_size:
+            created += _write_chunk(business_id, user_id, chunk, errors)
+            chunk = []
+    if chunk:
+        created += _write_chunk(business_id, user_id, chunk, errors)
+    errors.sort(key=lambda e: e["row"])
+    return {"created": created, "errors": errors}
+
+def export_csv(business_id, chunk_size=CHUNK):
+    """Yield the catalog (with current stock) as CSV text, CHUNK products at a time."""
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(FIELDS)
+    last_id = 0
+    while True:
+        rows = (db.session.query(Product, StockBalance.qty, StockBalance.avg_cost)
+                .outerjoin(StockBalance, StockBalance.product_id == Product.id)
+                .filter(Product.business_id == business_id, Product.id > last_id)
+                .order_by(Product.id).limit(chunk_size).all())
+        for p, qty, cost in rows:
+            w.writerow([p.sku, p.name, p.category or "", p.unit or "", p.barcode or "",
+                        p.reorder_point or 0, p.unit_price or 0,
+                        p.expiry_date.isoformat() if p.expiry_date else "", int(qty or 0),
+                        round(cost, 4) if cost else ""])
+        yield buf.getvalue()
+        buf.seek(0); buf.truncate()
+        if len(rows) < chunk_size:
+            break
+        last_id = rows[-1][0].id
+        db.session.expunge_all()
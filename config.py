@@ -1,8 +1,75 @@
 import os
 from pathlib import Path
+from sqlalchemy.engine import make_url
 
 BASE_DIR = Path(__file__).resolve().parent
+
+def engine_options(uri):
+    """Pool settings by backend: SQLite has one writer, so a small pool + busy wait;
+    a server database gets a real pool with health checks."""
+    if uri.startswith("sqlite"):
+        # seconds the driver waits on a locked database before raising
+        connect_args = {"timeout": 30, "check_same_thread": False}
+        if make_url(uri).database in (None, "", ":memory:"):
+            return {"connect_args": connect_args}   # one shared connection (StaticPool): no pool to size
+        return {
+            "pool_size": int(os.environ.get("DB_POOL_SIZE", 8)),
+            "max_overflow": 4,
+            "pool_timeout": 30,
+            "connect_args": connect_args,
+        }
+    return {
+        "pool_size": int(os.environ.get("DB_POOL_SIZE", 10)),
+        "max_overflow": 20,
+        "pool_pre_ping": True,
+        "pool_recycle": 1800,
+    }
+
 class Config:
     SECRET_KEY = os.environ.get("SECRET_KEY", "dev-secret")
     SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL", f"sqlite:///{BASE_DIR/'app.db'}")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    # per-request timing, SQL counts and /admin/metrics (see profiling.py)
+    PROFILING = os.environ.get("PROFILING") == "1"
+    # identity cache behind load_user (see tenancy.py)
+    USER_CACHE_TTL = int(os.environ.get("USER_CACHE_TTL", 60))  # seconds
+    USER_CACHE_SIZE = 1024
+    # times a sale/purchase/sync is re-run after losing a balance version race (inventory.StaleBalance)
+    STOCK_WRITE_RETRIES = 3
+    # businesses whose product search index stays in memory (see search.py)
+    SEARCH_INDEX_SIZE = int(os.environ.get("SEARCH_INDEX_SIZE", 32))
+    # background jobs (see jobs.py): "external" leaves them to `python manage.py worker`;
+    # "thread" runs them inside the web process (local development: PythonAnywhere
+    # web workers don't run background threads)
+    JOB_RUNNER = os.environ.get("JOB_RUNNER", "external")
+    JOB_RESULT_TTL = 3600      # seconds an identical request re-uses a finished job
+    JOB_TIMEOUT = 600          # seconds before a running job is presumed dead and re-queued
+    JOB_MAX_ATTEMPTS = 3
+    JOB_KEEP_DAYS = 7
+    JOB_SPOOL_DIR = os.environ.get("JOB_SPOOL_DIR", str(BASE_DIR / "job_spool"))  # uploads waiting for a job
+    # /api/stream (server-sent events) is off unless LIVE_UPDATES=1: each open stream
+    # holds a worker thread (a threaded server only), so it ends after STREAM_MAX_SECONDS
+    # and the browser reconnects (Last-Event-ID). Otherwise the dashboard polls.
+    LIVE_UPDATES = os.environ.get("LIVE_UPDATES") == "1"
+    DASHBOARD_POLL_SECONDS = 60
+    STREAM_HEARTBEAT = 15      # seconds between keep-alives / cross-process version checks
+    STREAM_MAX_SECONDS = 300
+    # one SQLite file per business under SHARD_DIR (see extensions.ShardRouter); unset keeps
+    # everything in SQLALCHEMY_DATABASE_URI, which otherwise holds only users, businesses and jobs
+    SHARD_DIR = os.environ.get("SHARD_DIR")
+    SHARD_ENGINES = int(os.environ.get("SHARD_ENGINES", 64))   # shard engines kept open (LRU)
+    SHARD_ENGINE_OPTIONS = {**engine_options("sqlite:///shard.db"), "pool_size": int(os.environ.get("SHARD_POOL_SIZE", 2))}
+    # API bodies at least this big are brotli/gzip-compressed (see encoding.py)
+    COMPRESS_MIN_SIZE = 1024   # bytes
+    COMPRESS_LEVEL = 6         # gzip, 1-9
+    COMPRESS_BROTLI_QUALITY = 5  # 0-11; higher is much slower for a small gain
+    # applied on every new SQLite connection (see extensions.init_storage)
+    SQLITE_PRAGMAS = {
+        "journal_mode": "WAL",       # readers don't block the writer
+        "synchronous": "NORMAL",     # fsync at checkpoints, safe with WAL
+        "busy_timeout": 30000,       # ms to wait for the write lock
+        "cache_size": -32000,        # KiB (negative) of page cache per connection
+        "mmap_size": 268435456,      # 256 MiB memory-mapped reads
+        "temp_store": "MEMORY",
+    }
@@ -0,0 +1,87 @@
+# encoding.py
+"""
+Smaller bodies for the big list endpoints (/api/products, /api/stock, /api/catalog).
+
+- ?format=columnar (also for /api/changes) sends one array per field instead
+  of one object per row, so the keys aren't repeated for every product:
+      {"count": 2, "columns": {"id": [1, 2], "name": ["Rice 5kg", "Salt"], ...}}
+  The default (?format=rows) keeps the list-of-objects shape.
+- Accept: application/msgpack gets the same payload as MessagePack when the
+  optional `msgpack` package is installed, JSON otherwise.
+- init_compression: API bodies of COMPRESS_MIN_SIZE bytes or more are sent
+  brotli-compressed (optional `brotli` package) or gzipped, per Accept-Encoding.
+  Streamed responses (exports, /api/stream) are left alone. A compressed body
+  gets a weak ETag, so revalidation must compare weakly (see /api/catalog).
+"""
+import gzip
+from flask import request, jsonify, current_app
+
+try:
+    import msgpack
+except ImportError:     # optional: JSON only
+    msgpack = None
+try:
+    import brotli
+except ImportError:     # optional: gzip only
+    brotli = None
+
+FORMATS = ("rows", "columnar")
+MSGPACK = "application/msgpack"
+COMPRESSIBLE = ("application/json", MSGPACK)
+
+def list_format():
+    """The requested ?format=, or None when it isn't one of FORMATS."""
+    fmt = request.args.get("format", "rows")
+    return fmt if fmt in FORMATS else None
+
+def wants_msgpack():
+    return (msgpack is not None
+            and request.accept_mimetypes.best_match(["application/json", MSGPACK]) == MSGPACK)
+
+def variant(fmt):
+    """ETag suffix for the representation being sent; plain JSON rows keep the bare tag."""
+    return ("" if fmt == "rows" else f"-{fmt}") + ("-msgpack" if wants_msgpack() else "")
+
+def columnar(rows, fields):
+    return {"count": len(rows), "columns": {f: [r[f] for r in rows] for f in fields}}
+
+def rows_payload(rows, fields, fmt):
+    return columnar(rows, fields) if fmt == "columnar" else rows
+
+def respond(payload):
+    """`payload` as MessagePack when asked for (and available), JSON otherwise."""
+    if wants_msgpack():
+        resp = current_app.response_class(msgpack.packb(payload), mimetype=MSGPACK)
+    else:
+        resp = jsonify(payload)
+    resp.vary.add("Accept")
+    return resp
+
+def list_response(rows, fields, fmt):
+    """`rows` (dicts with `fields` keys) in the requested format and content type."""
+    return respond(rows_payload(rows, fields, fmt))
+
+def _compress(resp):
+    if (not request.path.startswith("/api/") or resp.status_code != 200
+            or resp.is_streamed or resp.direct_passthrough
+            or resp.mimetype not in COMPRESSIBLE or "Content-Encoding" in resp.headers):
+        return resp
+    resp.vary.add("Accept-Encoding")
+    body = resp.get_data()
+    if len(body) < current_app.config["COMPRESS_MIN_SIZE"]:
+        return resp
+    if brotli is not None and request.accept_encodings["br"]:
+        body, coding = brotli.compress(body, quality=current_app.config["COMPRESS_BROTLI_QUALITY"]), "br"
+    elif request.accept_encodings["gzip"]:
+        body, coding = gzip.compress(body, compresslevel=current_app.config["COMPRESS_LEVEL"]), "gzip"
+    else:
+        return resp
+    resp.set_data(body)
+    resp.headers["Content-Encoding"] = coding
+    tag, weak = resp.get_etag()
+    if tag and not weak:
+        resp.set_etag(tag, weak=True)   # same content, different bytes
+    return resp
+
+def init_compression(app):
+    app.after_request(_compress)
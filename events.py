@@ -0,0 +1,97 @@
+# events.py
+"""
+In-process pub/sub behind /api/stream (server-sent events).
+
+Write paths call publish(business_id, kind, data) inside their transaction.
+Events wait on the session and are delivered only after it commits, so a
+rolled-back write never reaches a screen. Each business keeps its last BACKLOG
+events, so a reconnecting EventSource can resume from Last-Event-ID.
+
+Only writes made by this process are seen here: /api/stream also re-reads the
+catalog version while idle and sends "resync" when another process (a worker,
+another web process) changed it.
+"""
+import itertools, json, os, queue, threading, time
+from collections import defaultdict, deque
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from extensions import db
+
+BACKLOG = 200
+QUEUE_SIZE = 1000
+ACTIVITY_MAX = 10   # the dashboard lists the last 10 movements
+_boot = f"{os.getpid():x}{int(time.time()):x}"   # event ids from a previous process can't resume
+_ids = itertools.count(1)
+_lock = threading.Lock()
+_backlog = defaultdict(lambda: deque(maxlen=BACKLOG))
+_subscribers = defaultdict(set)
+
+class Subscription:
+    def __init__(self, business_id):
+        self.business_id = business_id
+        self.queue = queue.Queue(QUEUE_SIZE)
+        self.missed = []        # backlog events after Last-Event-ID
+        self.resync = False     # client must refetch: unknown id, or it fell too far behind
+
+def publish(business_id, kind, data):
+    """Queue an event for the business; delivered when the current transaction commits."""
+    db.session.info.setdefault("pending_events", []).append((business_id, kind, data))
+
+def publish_movements(business_id, moved, timestamp):
+    """[(product_id, qty), ...] -> one "movement" event with the newest ACTIVITY_MAX."""
+    ts = timestamp.isoformat()
+    publish(business_id, "movement", {"items": [
+        {"product_id": pid, "qty": qty, "type": "IN" if qty > 0 else "OUT", "timestamp": ts}
+        for pid, qty in list(moved)[-ACTIVITY_MAX:]]})
+
+def publish_sales(business_id, timestamp, count, qty, revenue):
+    publish(business_id, "sales", {"day": timestamp.date().isoformat(), "count": count,
+                                   "qty": qty, "revenue": round(revenue, 2)})
+
+@event.listens_for(Session, "after_commit")
+def _deliver(session):
+    for business_id, kind, data in session.info.pop("pending_events", ()):
+        _broadcast(business_id, kind, data)
+
+@event.listens_for(Session, "after_rollback")
+def _discard(session):
+    session.info.pop("pending_events", None)
+
+def _broadcast(business_id, kind, data):
+    with _lock:
+        ev = (f"{_boot}-{next(_ids)}", kind, json.dumps(data))
+        _backlog[business_id].append(ev)
+        for sub in _subscribers[business_id]:
+            try:
+                sub.queue.put_nowait(ev)
+            except queue.Full:
+                sub.resync = True
+
+def subscribe(business_id, last_event_id=None):
+    sub = Subscription(business_id)
+    with _lock:
+        _subscribers[business_id].add(sub)
+        if last_event_id:
+            boot, _, n = last_event_id.partition("-")
+            events = list(_backlog[business_id])
+            if boot != _boot or not n.isdigit():
+                sub.resync = True
+            else:
+                seq = lambda e: int(e[0].rsplit("-", 1)[1])
+                sub.missed = [e for e in events if seq(e) > int(n)]
+                # backlog full and nothing in it old enough: events may have been evicted
+                if len(events) == BACKLOG and seq(events[0]) > int(n):
+                    sub.resync = True
+    return sub
+
+def unsubscribe(sub):
+    with _lock:
+        subs = _subscribers.get(sub.business_id)
+        if subs is not None:
+            subs.discard(sub)
+            if not subs:
+                del _subscribers[sub.business_id]
+
+def format_sse(ev):
+    eid, kind, payload = ev
+    return f"id: {eid}\nevent: {kind}\ndata: {payload}\n\n"
@@ -1,6 +1,140 @@
+import os, threading
+from collections import OrderedDict
+from flask import has_request_context
 from flask_sqlalchemy import SQLAlchemy
-from flask_login import LoginManager
-db = SQLAlchemy()
-login_manager = LoginManager()
+from flask_sqlalchemy.session import Session
+from flask_login import LoginManager, current_user
+from sqlalchemy import create_engine, event, inspect, Table
+from sqlalchemy.sql.util import find_tables
 # extensions.py
+
+# Optional sharded storage (SHARD_DIR): users, businesses and the job queue stay
+# in the control database (SQLALCHEMY_DATABASE_URI); every other table lives in
+# one SQLite file per business, so one busy store no longer holds the write lock
+# for all of them. RoutingSession picks the file per statement.
+CONTROL_TABLES = ("user", "business", "job")
+
+def tenant_tables():
+    return [t for t in db.metadata.sorted_tables if t.name not in CONTROL_TABLES]
+
+def control_tables():
+    return [t for t in db.metadata.sorted_tables if t.name in CONTROL_TABLES]
+
+def shard_path(directory, business_id):
+    return os.path.join(directory, f"business_{int(business_id)}.db")
+
+class ShardRouter:
+    """Engines for per-business SQLite files, the SHARD_ENGINES most recently used kept open."""
+    def __init__(self):
+        self.directory = None
+        self.size = 64
+        self.options = {}
+        self.hooks = []             # callables run on every new shard engine (pragmas, profiling)
+        self._engines = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.directory)
+
+    def configure(self, config):
+        self.directory = config.get("SHARD_DIR")
+        self.size = config.get("SHARD_ENGINES", 64)
+        self.options = dict(config.get("SHARD_ENGINE_OPTIONS") or {})
+        self.dispose()
+
+    def engine(self, business_id):
+        with self._lock:
+            engine = self._engines.get(business_id)
+            if engine is None:
+                engine = self._engines[business_id] = self._open(business_id)
+            self._engines.move_to_end(business_id)
+            while len(self._engines) > self.size:
+                # connections checked out by a running request stay usable until returned
+                self._engines.popitem(last=False)[1].dispose()
+            return engine
+
+    def _open(self, business_id):
+        os.makedirs(self.directory, exist_ok=True)
+        engine = create_engine(f"sqlite:///{shard_path(self.directory, business_id)}", **self.options)
+        for hook in self.hooks:
+            hook(engine)
+        db.metadata.create_all(engine, tables=tenant_tables())   # a new business starts empty
+        return engine
+
+    def dispose(self):
+        with self._lock:
+            while self._engines:
+                self._engines.popitem()[1].dispose()
+
+shards = ShardRouter()
+
+def _is_tenant(mapper, clause):
+    if mapper is not None:
+        tables = [inspect(mapper).local_table]
+    elif clause is not None:
+        tables = find_tables(clause, include_crud=True)
+    else:
+        return False
+    return any(isinstance(t, Table) and t.name not in CONTROL_TABLES for t in tables)
+
+class RoutingSession(Session):
+    """Sends statements on tenant tables to the current business's shard when sharding is on."""
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and shards.enabled and _is_tenant(mapper, clause):
+            return shards.engine(self._business_id())
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _business_id(self):
+        business_id = self.info.get("business_id")
+        if business_id is None and has_request_context() and current_user.is_authenticated:
+            business_id = current_user.business_id
+        if business_id is None:
+            raise RuntimeError("sharded storage: no business selected (see extensions.use_business)")
+        return business_id
+
+def use_business(business_id):
+    """
+    Route this session's tenant tables to `business_id` (jobs, CLI commands;
+    requests follow current_user). Switching to another business closes the
+    session first, so commit before switching: ids repeat across shards.
+    """
+    previous = db.session.info.get("business_id")
+    if shards.enabled and previous is not None and previous != business_id:
+        db.session.close()
+    db.session.info["business_id"] = business_id
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+login_manager = LoginManager()
 login_manager.login_view = "auth.login_form"
+
+def create_schema():
+    """Missing tables of the default database (only the control tables when sharded)."""
+    import models  # noqa: F401  every table registered on db.metadata
+    if shards.enabled:
+        db.metadata.create_all(db.engine, tables=control_tables())
+    else:
+        db.create_all()
+
+def _sqlite_pragmas(engine, pragmas):
+    if engine.dialect.name != "sqlite" or not pragmas:
+        return
+    in_memory = engine.url.database in (None, "", ":memory:")
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        for key, value in pragmas.items():
+            if key == "journal_mode" and in_memory:
+                continue
+            cur.execute(f"PRAGMA {key}={value}")
+        cur.close()
+
+def init_storage(app):
+    """Per-connection SQLite tuning (WAL, busy timeout, caches) from app.config['SQLITE_PRAGMAS'],
+    and per-business shard files when SHARD_DIR is set."""
+    pragmas = app.config.get("SQLITE_PRAGMAS") or {}
+    with app.app_context():
+        _sqlite_pragmas(db.engine, pragmas)
+    shards.configure(app.config)
+    shards.hooks = [lambda engine: _sqlite_pragmas(engine, pragmas)]
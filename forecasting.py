@@ -1,35 +1,57 @@
 from datetime import datetime, timedelta
-from collections import defaultdict
+from sqlalchemy import func
 from extensions import db
-from models import StockMovement
+from models import Product, DailyProductSales
 
-def forecast_demand(product_id: int, days: int = 30):
-    # Use OUT movements as demand
-    q = (StockMovement.query
-         .filter_by(product_id=product_id, type="OUT")
-         .order_by(StockMovement.timestamp.asc())
-         .all())
-    if not q:
-        return {"daily_rate": 0, "forecast": [0]*days, "suggested_reorder": 0}
+WINDOW_DAYS = 30      # moving-average window (full days before today)
+WEEKEND_WEIGHT = 1.15
+COVER_DAYS = 14       # suggested reorder covers the next 14 days...
+BUFFER = 1.10         # ...plus 10%
 
-    # Aggregate per day
-    by_day = defaultdict(int)
-    for m in q:
-        d = m.timestamp.date()
-        by_day[d] += abs(m.qty)
+def _window(today):
+    # full days before today, as DailyProductSales.day bounds
+    return today - timedelta(days=WINDOW_DAYS), today
 
-    # Moving average of last 30 days
-    today = datetime.utcnow().date()
-    window = [by_day.get(today - timedelta(days=i), 0) for i in range(1, 31)]
-    avg = sum(window) / max(len(window), 1)
+def _demand_totals(start, end, business_id=None, product_id=None):
+    # Units sold per product inside the window, from the daily rollup
+    # (at most WINDOW_DAYS small rows per product)
+    q = (db.session.query(DailyProductSales.product_id, func.sum(DailyProductSales.qty))
+         .filter(DailyProductSales.day >= start, DailyProductSales.day < end))
+    if product_id is not None:
+        q = q.filter(DailyProductSales.product_id == product_id)
+    if business_id is not None:
+        q = q.filter(DailyProductSales.business_id == business_id)
+    return {pid: float(total or 0) for pid, total in q.group_by(DailyProductSales.product_id).all()}
 
-    # Simple seasonality: weight weekends a bit higher for retail (heuristic)
-    forecast = []
-    for i in range(1, days+1):
-        day = today + timedelta(days=i)
-        w = 1.15 if day.weekday() in (5, 6) else 1.0
-        forecast.append(round(avg * w, 2))
+def _weekday_pattern(today, days):
+    # Simple seasonality: weight weekends a bit higher for retail (heuristic).
+    # The pattern is the same for every product, so it is computed once per call.
+    return [1 if (today + timedelta(days=i)).weekday() in (5, 6) else 0 for i in range(1, days + 1)]
 
-    # Suggested reorder = next 14 days coverage + 10% buffer
-    suggested = round(sum(forecast[:14]) * 1.10)
+def _project(total, pattern):
+    avg = total / WINDOW_DAYS
+    levels = (round(avg, 2), round(avg * WEEKEND_WEIGHT, 2))
+    forecast = [levels[k] for k in pattern]
+    suggested = round(sum(forecast[:COVER_DAYS]) * BUFFER)
     return {"daily_rate": round(avg, 2), "forecast": forecast, "suggested_reorder": suggested}
+
+def forecast_demand(product_id: int, days: int = 30):
+    # Units sold over the last WINDOW_DAYS as demand
+    today = datetime.utcnow().date()
+    totals = _demand_totals(*_window(today), product_id=product_id)
+    if not totals:
+        return {"daily_rate": 0, "forecast": [0]*days, "suggested_reorder": 0}
+    return _project(totals[product_id], _weekday_pattern(today, days))
+
+def forecast_business(business_id: int, days: int = 30):
+    """
+    forecast_demand for every product of a business: {product_id: forecast}.
+    One aggregate query for the whole catalog; products without recent
+    demand share a single zero forecast.
+    """
+    today = datetime.utcnow().date()
+    totals = _demand_totals(*_window(today), business_id=business_id)
+    pattern = _weekday_pattern(today, days)
+    zero = {"daily_rate": 0, "forecast": [0]*days, "suggested_reorder": 0}
+    pids = [pid for (pid,) in db.session.query(Product.id).filter(Product.business_id == business_id)]
+    return {pid: (_project(totals[pid], pattern) if pid in totals else zero) for pid in pids}
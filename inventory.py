@@ -0,0 +1,342 @@
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime, date
+from sqlalchemy import func, insert, update, select, or_, and_, bindparam
+from extensions import db
+from models import (Business, Product, StockMovement, StockBalance, CatalogVersion,
+                    Sale, SaleItem, DailyProductSales, StockCheckpoint, StockSnapshot)
+from events import publish
+from reports import invalidate_reports
+
+class InsufficientStock(Exception):
+    """A sale would take stock below zero under the business's "reject" policy."""
+    def __init__(self, shortages):
+        super().__init__(f"insufficient stock for {len(shortages)} product(s)")
+        self.shortages = shortages      # [{"product_id", "available", "requested"}, ...]
+
+class StaleBalance(Exception):
+    """A balance row changed between read and write; roll back and run the write again."""
+
+_sb = StockBalance.__table__
+# one executemany for every balance a write touches; a row only moves if its
+# version is still the one we read (and, with a floor, if it still holds enough)
+_MOVE = (_sb.update()
+         .where(_sb.c.id == bindparam("b_id"), _sb.c.version == bindparam("b_version"))
+         .values(qty=_sb.c.qty + bindparam("b_delta"), avg_cost=bindparam("b_avg_cost"),
+                 needs_reorder=bindparam("b_needs_reorder"), updated_at=bindparam("b_updated_at"),
+                 version=_sb.c.version + 1))
+_MOVE_FLOORED = _MOVE.where(_sb.c.qty + bindparam("b_delta") >= 0)
+
+def stock_policy(business_id):
+    return db.session.query(Business.stock_policy).filter(Business.id == business_id).scalar() or "reject"
+
+def retry_stale(write, attempts=3):
+    """Call write() (which commits) again after a StaleBalance rollback, up to `attempts` times."""
+    for attempt in range(attempts):
+        try:
+            return write()
+        except StaleBalance:
+            db.session.rollback()
+            if attempt == attempts - 1:
+                raise
+
+def _average_in(on_hand, avg, qty, unit_cost):
+    """Moving weighted-average cost after receiving `qty` units at `unit_cost`."""
+    if unit_cost is None or qty <= 0:
+        return avg
+    held = max(on_hand, 0) if avg else 0  # no known cost yet: take the receipt's
+    return (held * avg + qty * unit_cost) / (held + qty)
+
+def needs_reorder(qty, reorder_point, suggested_reorder):
+    """Out of stock, at or below the reorder point, or short of the forecast cover."""
+    rp = reorder_point or 0
+    return qty <= 0 or (rp > 0 and qty <= rp) or qty < (suggested_reorder or 0)
+
+def refresh_reorder_flags(business_id=None, product_ids=None):
+    """Set-based needs_reorder recompute (bulk inserts, reconcile, forecast refresh)."""
+    rp = func.coalesce(select(Product.reorder_point)
+                       .where(Product.id == StockBalance.product_id).scalar_subquery(), 0)
+    flag = or_(StockBalance.qty <= 0,
+               and_(rp > 0, StockBalance.qty <= rp),
+               StockBalance.qty < StockBalance.suggested_reorder)
+    # only rows whose flag flips, and updated_at kept: the flag isn't catalog
+    # data, so catalog_changes (/api/changes, /api/sync) mustn't resend the row
+    stmt = (update(StockBalance).where(StockBalance.needs_reorder != flag)
+            .values(needs_reorder=flag, updated_at=StockBalance.updated_at))
+    if business_id is not None:
+        stmt = stmt.where(StockBalance.business_id == business_id)
+    if product_ids is not None:
+        stmt = stmt.where(StockBalance.product_id.in_(list(product_ids)))
+    db.session.execute(stmt.execution_options(synchronize_session=False))
+
+def apply_stock_deltas(business_id, deltas, receipts=(), allow_negative=True):
+    """
+    Add {product_id: qty_delta} onto the StockBalance rows of a business and fold
+    costed receipts [(product_id, qty, unit_cost), ...] into their average cost.
+    Runs inside the caller's session so it commits (or rolls back) together
+    with the StockMovement rows it mirrors. Returns {product_id: avg_cost}
+    (0 = cost unknown) for every product touched.
+
+    With allow_negative=False a delta that would leave a balance below zero
+    raises InsufficientStock before anything is written. Each row is written
+    only if its version is unchanged since the read; otherwise StaleBalance is
+    raised and the caller retries the whole transaction (see retry_stale).
+    """
+    deltas = {pid: d for pid, d in deltas.items() if d}
+    receipts = [r for r in receipts if r[2] is not None and r[1] > 0]
+    pids = set(deltas) | {pid for pid, _, _ in receipts}
+    if not pids:
+        return {}
+    now = datetime.utcnow()
+    # plain rows in, one executemany out: no ORM objects per line item
+    rows, points = {}, {}
+    for row_id, pid, qty, avg, suggested, version, rp in (
+            db.session.query(StockBalance.id, StockBalance.product_id, StockBalance.qty,
+                             StockBalance.avg_cost, StockBalance.suggested_reorder,
+                             StockBalance.version, Product.reorder_point)
+            .join(Product, Product.id == StockBalance.product_id)
+            .filter(StockBalance.product_id.in_(list(pids)))):
+        rows[pid] = {"id": row_id, "qty": qty or 0, "avg_cost": avg or 0,
+                     "suggested": suggested or 0, "version": version or 0}
+        points[pid] = rp
+    missing = pids - set(rows)
+    if missing:
+        points.update(db.session.query(Product.id, Product.reorder_point)
+                      .filter(Product.id.in_(list(missing))).all())
+    for pid in missing:
+        rows[pid] = {"id": None, "qty": 0, "avg_cost": 0, "suggested": 0, "version": 0}
+    if not allow_negative:
+        short = [{"product_id": pid, "available": rows[pid]["qty"], "requested": -d}
+                 for pid, d in deltas.items() if d < 0 and rows[pid]["qty"] + d < 0]
+        if short:
+            raise InsufficientStock(short)
+    on_hand = {pid: r["qty"] for pid, r in rows.items()}
+    for pid, qty, cost in receipts:
+        r = rows[pid]
+        r["avg_cost"] = _average_in(on_hand[pid], r["avg_cost"], qty, cost)
+        on_hand[pid] += qty
+    for pid in rows:
+        rows[pid]["qty"] += deltas.get(pid, 0)
+    moves = [{"b_id": r["id"], "b_version": r["version"], "b_delta": deltas.get(pid, 0),
+              "b_avg_cost": r["avg_cost"], "b_updated_at": now,
+              "b_needs_reorder": needs_reorder(r["qty"], points.get(pid), r["suggested"])}
+             for pid, r in rows.items() if r["id"]]
+    if moves:
+        stmt = _MOVE if allow_negative else _MOVE_FLOORED
+        if db.session.execute(stmt, moves).rowcount != len(moves):
+            raise StaleBalance(business_id)
+    if missing:
+        db.session.execute(insert(StockBalance), [{
+            "business_id": business_id, "product_id": pid, "qty": rows[pid]["qty"],
+            "avg_cost": rows[pid]["avg_cost"], "suggested_reorder": 0, "updated_at": now,
+            "needs_reorder": needs_reorder(rows[pid]["qty"], points.get(pid), 0)} for pid in missing])
+    if deltas:
+        publish(business_id, "stock", {"items": [{"product_id": pid, "stock": rows[pid]["qty"]}
+                                                 for pid in deltas]})
+    return {pid: r["avg_cost"] for pid, r in rows.items()}
+
+def record_daily_sales(business_id, day, lines):
+    """
+    Fold sold lines [(product_id, qty, unit_price), ...] of one UTC day into
+    DailyProductSales, in the caller's transaction.
+    """
+    agg = defaultdict(lambda: [0, 0.0])
+    for pid, qty, price in lines:
+        agg[pid][0] += abs(qty)
+        agg[pid][1] += abs(qty) * (price or 0)
+    if not agg:
+        return
+    existing = {pid: (row_id, q, rev) for row_id, pid, q, rev in db.session.query(
+        DailyProductSales.id, DailyProductSales.product_id, DailyProductSales.qty, DailyProductSales.revenue)
+        .filter(DailyProductSales.day == day, DailyProductSales.product_id.in_(list(agg)))}
+    updates, inserts = [], []
+    for pid, (qty, revenue) in agg.items():
+        if pid in existing:
+            row_id, q, rev = existing[pid]
+            updates.append({"id": row_id, "qty": (q or 0) + qty, "revenue": (rev or 0) + revenue})
+        else:
+            inserts.append({"business_id": business_id, "product_id": pid,
+                            "day": day, "qty": qty, "revenue": revenue})
+    if updates:
+        db.session.execute(update(DailyProductSales), updates)
+    if inserts:
+        db.session.execute(insert(DailyProductSales), inserts)
+
+def rebuild_daily_sales(business_id=None):
+    """Recompute DailyProductSales from Sale/SaleItem history. Returns rows written."""
+    day = func.date(Sale.timestamp)
+    q = (db.session.query(Sale.business_id, SaleItem.product_id, day,
+                          func.sum(SaleItem.qty), func.sum(SaleItem.qty * SaleItem.unit_price))
+         .join(Sale, Sale.id == SaleItem.sale_id)
+         .filter(Sale.business_id.isnot(None))
+         .group_by(Sale.business_id, SaleItem.product_id, day))
+    old = DailyProductSales.query
+    if business_id is not None:
+        q = q.filter(Sale.business_id == business_id)
+        old = old.filter(DailyProductSales.business_id == business_id)
+    old.delete(synchronize_session=False)
+    rows = [{"business_id": bid, "product_id": pid,
+             "day": d if isinstance(d, date) else date.fromisoformat(d),
+             "qty": int(qty or 0), "revenue": float(rev or 0)}
+            for bid, pid, d, qty, rev in q.all()]
+    if rows:
+        db.session.execute(DailyProductSales.__table__.insert(), rows)
+    db.session.commit()
+    return len(rows)
+
+def init_balances(business_id, opening, costs=None):
+    """
+    Balance rows for new products ({product_id: opening_qty}); zero-stock products
+    get a row too, so they show up in catalog deltas. `costs` ({product_id:
+    unit_cost}) seeds the average cost of the opening stock.
+    """
+    now = datetime.utcnow()
+    costs = costs or {}
+    rows = [{"business_id": business_id, "product_id": pid, "qty": qty,
+             "avg_cost": costs.get(pid) or 0, "updated_at": now}
+            for pid, qty in opening.items()]
+    if rows:
+        db.session.execute(insert(StockBalance), rows)
+        refresh_reorder_flags(business_id, list(opening))
+
+def bump_catalog_version(business_id):
+    """Invalidate cached catalog snapshots of a business (same transaction as the write)."""
+    n = (CatalogVersion.query.filter_by(business_id=business_id)
+         .update({CatalogVersion.version: CatalogVersion.version + 1}, synchronize_session=False))
+    if not n:
+        db.session.add(CatalogVersion(business_id=business_id, version=1))
+
+def catalog_version(business_id):
+    v = (db.session.query(CatalogVersion.version)
+         .filter(CatalogVersion.business_id == business_id).scalar())
+    return v or 0
+
+def movement_deltas(movements):
+    """Collapse an iterable of (product_id, qty) pairs into {product_id: total}."""
+    out = defaultdict(int)
+    for pid, qty in movements:
+        out[pid] += qty
+    return out
+
+def catalog_changes(business_id, since):
+    """
+    (Product, stock) pairs whose balance row was written after `since` (UTC).
+    Product creation and every movement stamp StockBalance.updated_at.
+    """
+    return (db.session.query(Product, StockBalance.qty)
+            .join(StockBalance, StockBalance.product_id == Product.id)
+            .filter(StockBalance.business_id == business_id,
+                    StockBalance.updated_at > since)
+            .order_by(Product.name).all())
+
+def compacted_base(business_id=None):
+    """
+    {product_id: (qty, avg_cost)} at each business's newest compacted checkpoint:
+    the part of the movement log that compact_movements() folded away.
+    """
+    newest = (db.session.query(StockCheckpoint.business_id,
+                               func.max(StockCheckpoint.taken_at).label("taken_at"))
+              .filter(StockCheckpoint.compacted.is_(True))
+              .group_by(StockCheckpoint.business_id))
+    if business_id is not None:
+        newest = newest.filter(StockCheckpoint.business_id == business_id)
+    newest = newest.subquery()
+    rows = (db.session.query(StockSnapshot.product_id, StockSnapshot.qty, StockSnapshot.avg_cost)
+            .join(StockCheckpoint, StockCheckpoint.id == StockSnapshot.checkpoint_id)
+            .join(newest, and_(newest.c.business_id == StockCheckpoint.business_id,
+                               newest.c.taken_at == StockCheckpoint.taken_at)))
+    return {pid: (qty, avg or 0) for pid, qty, avg in rows}
+
+def reconcile_balances(business_id=None):
+    """
+    Rebuild StockBalance from the StockMovement log (plus its compacted checkpoint).
+    Returns a list of (product_id, stored_qty, actual_qty) for every row that drifted.
+    """
+    q = (db.session.query(Product.id, Product.business_id, func.coalesce(func.sum(StockMovement.qty), 0))
+         .outerjoin(StockMovement, StockMovement.product_id == Product.id)
+         .group_by(Product.id, Product.business_id))
+    if business_id is not None:
+        q = q.filter(Product.business_id == business_id)
+    base = compacted_base(business_id)
+    actual = {pid: (bid, int(total) + base.get(pid, (0, 0))[0]) for pid, bid, total in q.all()}
+
+    bq = StockBalance.query
+    if business_id is not None:
+        bq = bq.filter(StockBalance.business_id == business_id)
+    stored = {b.product_id: b for b in bq.all()}
+
+    drift = []
+    now = datetime.utcnow()
+    for pid, (bid, total) in actual.items():
+        b = stored.pop(pid, None)
+        if b is None:
+            if total:
+                drift.append((pid, None, total))
+            db.session.add(StockBalance(business_id=bid, product_id=pid, qty=total, updated_at=now))
+        elif b.qty != total or b.business_id != bid:
+            drift.append((pid, b.qty, total))
+            b.qty, b.business_id, b.updated_at = total, bid, now
+            b.version = (b.version or 0) + 1
+    # balances whose product no longer exists
+    for pid, b in stored.items():
+        drift.append((pid, b.qty, None))
+        db.session.delete(b)
+    touched = {actual[pid][0] if pid in actual else stored[pid].business_id for pid, _, _ in drift}
+    for bid in touched - {None}:
+        bump_catalog_version(bid)
+        publish(bid, "resync", {})
+    db.session.flush()
+    refresh_reorder_flags(business_id)
+    db.session.commit()
+    return drift
+
+def rebuild_valuation(business_id=None):
+    """
+    Replay the StockMovement log (from the compacted checkpoint, if any) into
+    StockBalance.avg_cost and fill in SaleItem.unit_cost where it is missing.
+    A one-off backfill: the write paths keep both current incrementally.
+    Returns (balances, sale_items) updated.
+    """
+    mq = (db.session.query(StockMovement.product_id, StockMovement.qty,
+                           StockMovement.unit_cost, StockMovement.timestamp)
+          .order_by(StockMovement.product_id, StockMovement.timestamp, StockMovement.id))
+    if business_id is not None:
+        mq = mq.filter(StockMovement.business_id == business_id)
+    # start from the compacted checkpoint, if older movements were folded into one
+    state = {pid: [qty, avg] for pid, (qty, avg) in compacted_base(business_id).items()}
+    history = defaultdict(lambda: ([], []))      # product_id -> (receipt stamps, avg after each)
+    for pid, qty, cost, ts in mq.yield_per(5000):
+        st = state.setdefault(pid, [0, 0.0])
+        if qty > 0 and cost is not None:
+            st[1] = _average_in(st[0], st[1], qty, cost)
+            stamps, avgs = history[pid]
+            stamps.append(ts); avgs.append(st[1])
+        st[0] += qty
+
+    bq = db.session.query(StockBalance.id, StockBalance.product_id)
+    if business_id is not None:
+        bq = bq.filter(StockBalance.business_id == business_id)
+    balances = [{"b_id": row_id, "b_avg_cost": state[pid][1]} for row_id, pid in bq if pid in state]
+    if balances:
+        db.session.execute(_sb.update().where(_sb.c.id == bindparam("b_id"))
+                           .values(avg_cost=bindparam("b_avg_cost"), version=_sb.c.version + 1,
+                                   updated_at=_sb.c.updated_at),   # cost isn't in catalog_changes
+                           balances)
+
+    iq = (db.session.query(SaleItem.id, SaleItem.product_id, Sale.timestamp)
+          .join(Sale, Sale.id == SaleItem.sale_id)
+          .filter(SaleItem.unit_cost.is_(None)))
+    if business_id is not None:
+        iq = iq.filter(Sale.business_id == business_id)
+    items = []
+    for item_id, pid, ts in iq.yield_per(5000):
+        stamps, avgs = history.get(pid, ((), ()))
+        k = bisect_left(stamps, ts)  # receipts strictly before the sale, like the live path
+        if k:
+            items.append({"id": item_id, "unit_cost": avgs[k - 1]})
+    for i in range(0, len(items), 5000):
+        db.session.execute(update(SaleItem), items[i:i + 5000])
+    if items:
+        invalidate_reports(business_id)   # cached closed periods carry the old (missing) costs
+    db.session.commit()
+    return len(balances), len(items)
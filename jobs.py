@@ -0,0 +1,219 @@
+# jobs.py
+"""
+Background jobs without a broker: a `job` table in the app database.
+
+A request enqueue()s the work and answers 202 with the job id. A worker claims
+the oldest queued row with one UPDATE ... RETURNING (two workers never get the
+same job), runs the registered handler in an app context and stores its JSON
+result on the row, in the same commit as the handler's own writes. With
+sharded storage the job table stays in the control database and the handler
+writes to the job's business shard; one commit covers both files, but not
+atomically.
+
+Jobs enqueued with a cache_key re-use a queued, running or recently finished
+job with that key instead of running again (identical catalog forecasts, a
+re-posted sync batch).
+
+Runners: by default `python manage.py worker` (JOB_RUNNER=external), or a
+daemon thread started in the web process on the first enqueue (JOB_RUNNER=thread,
+for local development: hosts like PythonAnywhere don't run web-process threads).
+"""
+import json, os, threading, traceback
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import update, select
+from extensions import db, use_business
+from models import Job
+from forecasting import forecast_business
+from sync import apply_sync
+from bulk_products import import_products, iter_csv, iter_jsonl
+from inventory import reconcile_balances, rebuild_daily_sales, rebuild_valuation
+from tenancy import TenantContext
+from alerts import refresh_suggestions
+from snapshots import take_checkpoints
+
+HANDLERS = {}
+_wake = threading.Event()
+_runner_lock = threading.Lock()
+_runner = None
+
+def handler(kind):
+    """Register fn(job, params) -> JSON-able result for a job kind."""
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+def enqueue(kind, business_id, user_id, params=None, cache_key=None, result_ttl=None, failed_backoff=None):
+    """
+    Queue a job (or re-use one, see the module docstring). result_ttl: seconds a
+    finished job is re-used (JOB_RESULT_TTL by default); failed_backoff: seconds
+    a failed one is returned as is before it may run again (by default never).
+    """
+    if kind not in HANDLERS:
+        raise ValueError(f"unknown job kind: {kind}")
+    cfg = current_app.config
+    if cache_key:
+        hit = (Job.query.filter(Job.cache_key == cache_key, Job.business_id == business_id)
+               .order_by(Job.id.desc()).first())
+        ttl = cfg.get("JOB_RESULT_TTL", 3600) if result_ttl is None else result_ttl
+        if hit and _reusable(hit, ttl, failed_backoff):
+            return hit
+    job = Job(kind=kind, business_id=business_id, user_id=user_id,
+              payload=json.dumps(params or {}), cache_key=cache_key)
+    db.session.add(job)
+    db.session.commit()
+    if cfg.get("JOB_RUNNER", "external") == "thread":
+        _start_runner(current_app._get_current_object())
+    _wake.set()
+    return job
+
+def _reusable(job, ttl, failed_backoff):
+    if job.finished_at is None:     # queued or running
+        return True
+    age = (datetime.utcnow() - job.finished_at).total_seconds()
+    if job.status == "failed":
+        return failed_backoff is not None and age < failed_backoff
+    return age < ttl
+
+def job_json(job, with_result=False):
+    out = {
+        "id": job.id, "kind": job.kind, "status": job.status,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+    if job.status == "failed":
+        lines = (job.error or "").strip().splitlines()
+        out["error"] = lines[-1] if lines else "failed"  # last traceback line
+    if with_result and job.status == "done":
+        out["result"] = json.loads(job.result) if job.result else None
+    return out
+
+def claim_next():
+    """Mark the oldest queued job running and return its id (None if the queue is empty)."""
+    oldest = (select(Job.id).where(Job.status == "queued")
+              .order_by(Job.id).limit(1).scalar_subquery())
+    stmt = (update(Job).where(Job.id == oldest, Job.status == "queued")
+            .values(status="running", started_at=datetime.utcnow(), attempts=Job.attempts + 1)
+            .returning(Job.id)
+            .execution_options(synchronize_session=False))
+    job_id = db.session.execute(stmt).scalar()
+    db.session.commit()
+    return job_id
+
+def run_job(job_id):
+    job = db.session.get(Job, job_id)
+    use_business(job.business_id)   # the handler's tables are in this business's shard
+    try:
+        result = HANDLERS[job.kind](job, json.loads(job.payload or "{}"))
+        job.result = json.dumps(result)
+        job.status = "done"
+    except Exception:
+        db.session.rollback()
+        job = db.session.get(Job, job_id)
+        job.status = "failed"
+        job.error = traceback.format_exc(limit=5)
+        current_app.logger.exception("job %s (%s) failed", job.id, job.kind)
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    return job.status
+
+def requeue_stale():
+    """Running jobs whose worker died: back to the queue, or failed after JOB_MAX_ATTEMPTS."""
+    cfg = current_app.config
+    cutoff = datetime.utcnow() - timedelta(seconds=cfg.get("JOB_TIMEOUT", 600))
+    stale = Job.query.filter(Job.status == "running", Job.started_at < cutoff).all()
+    for job in stale:
+        if job.attempts >= cfg.get("JOB_MAX_ATTEMPTS", 3):
+            job.status, job.error, job.finished_at = "failed", "timed out", datetime.utcnow()
+        else:
+            job.status = "queued"
+    db.session.commit()
+    return len(stale)
+
+def prune_jobs():
+    """Drop finished jobs older than JOB_KEEP_DAYS (and any upload they left behind)."""
+    cutoff = datetime.utcnow() - timedelta(days=current_app.config.get("JOB_KEEP_DAYS", 7))
+    old = Job.query.filter(Job.status.in_(("done", "failed")), Job.finished_at < cutoff).all()
+    for job in old:
+        path = json.loads(job.payload or "{}").get("path")
+        if path and os.path.exists(path):
+            os.remove(path)
+        db.session.delete(job)
+    db.session.commit()
+    return len(old)
+
+def work(app, threads=1, poll=1.0, once=False, stop=None):
+    """Run jobs on `threads` threads until `stop` is set (or, with once=True, the queue is empty)."""
+    stop = stop or threading.Event()
+    with app.app_context():
+        requeue_stale()
+        prune_jobs()
+
+    def loop():
+        while not stop.is_set():
+            with app.app_context():
+                job_id = claim_next()
+                if job_id is not None:
+                    run_job(job_id)
+                    continue
+            if once:
+                return
+            _wake.wait(poll)
+            _wake.clear()
+
+    pool = [threading.Thread(target=loop, name=f"job-worker-{i}", daemon=True)
+            for i in range(threads)]
+    for t in pool:
+        t.start()
+    try:
+        for t in pool:
+            while t.is_alive():
+                t.join(0.5)
+    except KeyboardInterrupt:
+        stop.set()
+        _wake.set()
+
+def _start_runner(app):
+    global _runner
+    with _runner_lock:
+        if _runner is None or not _runner.is_alive():
+            _runner = threading.Thread(target=work, args=(app,), name="job-runner", daemon=True)
+            _runner.start()
+
+# --- job kinds --------------------------------------------------------------
+
+@handler("forecast_all")
+def _forecast_all(job, params):
+    out = forecast_business(job.business_id, params.get("days", 30))
+    return [{"product_id": pid, **f} for pid, f in out.items()]
+
+@handler("sync")
+def _sync(job, params):
+    return apply_sync(TenantContext(job.user_id, job.business_id, None), params)
+
+@handler("import_products")
+def _import_products(job, params):
+    # the upload was spooled to disk by the request; kept on failure so a retry can re-read it
+    with open(params["path"], "rb") as fh:
+        records = iter_jsonl(fh) if params.get("format") == "jsonl" else iter_csv(fh)
+        report = import_products(records, job.business_id, job.user_id)
+    os.remove(params["path"])
+    return report
+
+@handler("rebuild")
+def _rebuild(job, params):
+    drift = reconcile_balances(job.business_id)
+    rollup_rows = rebuild_daily_sales(job.business_id)
+    balances, sale_items = rebuild_valuation(job.business_id)
+    return {"drifted_balances": len(drift), "rollup_rows": rollup_rows,
+            "costed_balances": balances, "costed_sale_items": sale_items}
+
+@handler("refresh_reorder")
+def _refresh_reorder(job, params):
+    return {"changed": refresh_suggestions(job.business_id)}
+
+@handler("snapshot")
+def _snapshot(job, params):
+    return {"checkpoints": take_checkpoints(job.business_id, params.get("period", "month"))}
@@ -1,12 +1,27 @@
 # manage.py
-import getpass
+import getpass, os
+from datetime import datetime, timedelta
+import click
+from flask import current_app
 from flask.cli import FlaskGroup
 from app import create_app
-from extensions import db
-from models import User
+from extensions import db, shards, use_business, create_schema
+from models import User, Business
+from tenancy import invalidate_user
+from jobs import work
+from inventory import reconcile_balances, rebuild_daily_sales, rebuild_valuation
+from bulk_products import import_products as bulk_import, iter_csv, iter_jsonl
+from snapshots import take_checkpoints, compact_movements, PERIODS
+from sharding import split_database
 
-app = create_app()
-cli = FlaskGroup(app)
+# the app is built once, only when a command runs; commands get an app context
+cli = FlaskGroup(create_app=create_app)
+
+@cli.command("init-db")
+def init_db():
+    """Create missing tables (after install, and after upgrades that add tables)."""
+    create_schema()
+    print("✅ Database schema is up to date.")
 
 @cli.command("create-user")
 def create_user():
@@ -41,7 +56,104 @@ def set_password():
     new_pw = getpass.getpass("New password: ")
     user.set_password(new_pw)
     db.session.commit()
+    invalidate_user(user.id)
     print("🔑 Password updated successfully.")
 
+def _per_business(fn):
+    """fn(None) once over every business, or fn(business_id) per shard when sharded."""
+    if not shards.enabled:
+        return [fn(None)]
+    out = []
+    for (bid,) in db.session.query(Business.id).order_by(Business.id).all():
+        use_business(bid)
+        out.append(fn(bid))
+    return out
+
+@cli.command("reconcile-stock")
+def reconcile_stock():
+    """Rebuild StockBalance from the StockMovement log and report drift."""
+    drift = [d for part in _per_business(reconcile_balances) for d in part]
+    if not drift:
+        print("✅ Stock balances match the movement log.")
+        return
+    for pid, stored, actual in drift:
+        print(f"⚠️  product {pid}: stored={stored} actual={actual}")
+    print(f"🔧 Fixed {len(drift)} balance(s).")
+
+@cli.command("backfill-rollups")
+def backfill_rollups():
+    """Rebuild the DailyProductSales rollup from sales history."""
+    n = sum(_per_business(rebuild_daily_sales))
+    print(f"✅ Wrote {n} daily product sales row(s).")
+
+@cli.command("rebuild-valuation")
+def rebuild_valuation_cmd():
+    """Recompute average costs from the movement log and fill missing sale COGS."""
+    done = _per_business(rebuild_valuation)
+    balances, items = sum(b for b, _ in done), sum(i for _, i in done)
+    print(f"✅ Average cost set on {balances} balance(s), COGS on {items} sale item(s).")
+
+@cli.command("snapshot")
+@click.option("--period", type=click.Choice(PERIODS), default="month", show_default=True)
+@click.option("--business", "business_id", type=int, help="Only this business id.")
+@click.option("--compact-days", type=int, help="Also delete movements older than the newest checkpoint this many days back.")
+def snapshot(period, business_id, compact_days):
+    """Write missing stock checkpoints (for /api/stock?as_of=) and optionally compact old movements."""
+    q = db.session.query(Business.id, Business.name).order_by(Business.id)
+    if business_id is not None:
+        q = q.filter(Business.id == business_id)
+    for bid, name in q.all():
+        use_business(bid)
+        n = take_checkpoints(bid, period)
+        deleted = 0
+        if compact_days is not None:
+            deleted = compact_movements(bid, datetime.utcnow() - timedelta(days=compact_days))
+        db.session.commit()
+        print(f"📸 {name}: {n} checkpoint(s) written, {deleted} movement(s) compacted")
+    print("✅ Snapshots up to date.")
+
+@cli.command("import-products")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--email", required=True, help="User whose business receives the products.")
+def import_products(path, email):
+    """Bulk-import products from a CSV or JSONL file."""
+    user = User.query.filter_by(email=email.strip().lower()).first()
+    if not user or not user.business_id:
+        print("❌ No such user (or user has no business).")
+        return
+    use_business(user.business_id)
+    with open(path, "rb") as fh:
+        records = iter_jsonl(fh) if path.endswith((".jsonl", ".ndjson")) else iter_csv(fh)
+        report = bulk_import(records, user.business_id, user.id)
+    for err in report["errors"]:
+        print(f"⚠️  row {err['row']} ({err['sku']}): {err['error']}")
+    print(f"✅ Imported {report['created']} product(s), {len(report['errors'])} error(s).")
+
+@cli.command("split-shards")
+@click.argument("out_dir", type=click.Path(file_okay=False))
+def split_shards(out_dir):
+    """Copy the shared database into one SQLite file per business under OUT_DIR (the source is only read)."""
+    if shards.enabled or db.engine.dialect.name != "sqlite":
+        print("❌ split-shards reads a single SQLite database; unset SHARD_DIR.")
+        return
+    out_dir = os.path.abspath(out_dir)
+    counts, orphans = split_database(db.engine.url.database, out_dir)
+    for bid, n in counts.items():
+        print(f"🗂️  business {bid}: {n} row(s)")
+    if orphans:
+        print(f"⚠️  {orphans} row(s) belong to no business and were left out")
+    print(f"✅ {len(counts)} shard(s) written. Start the app with\n"
+          f"   DATABASE_URL=sqlite:///{out_dir}/control.db SHARD_DIR={out_dir}")
+
+@cli.command("worker")
+@click.option("--threads", default=2, show_default=True, help="Jobs run at the same time.")
+@click.option("--poll", default=1.0, show_default=True, help="Seconds between queue checks.")
+@click.option("--once", is_flag=True, help="Exit when the queue is empty.")
+def worker(threads, poll, once):
+    """Run queued background jobs (forecasts, syncs, imports, rebuilds)."""
+    print(f"👷 Worker started with {threads} thread(s); Ctrl-C to stop.")
+    work(current_app._get_current_object(), threads=threads, poll=poll, once=once)
+    print("✅ Worker stopped.")
+
 if __name__ == "__main__":
     cli()
@@ -3,7 +3,7 @@
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
-from extensions import db, login_manager
+from extensions import db
 import pytz
 
 WAT = pytz.timezone("Africa/Lagos")
@@ -12,6 +12,8 @@ class Business(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(160), unique=True, nullable=False)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(WAT))
+    # "reject": a sale may not take stock below zero; "allow": balances may go negative
+    stock_policy = db.Column(db.String(10), nullable=False, default="reject")
 
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
@@ -34,10 +36,6 @@ class User(db.Model, UserMixin):
     @property
     def is_staff(self):   return (self.role or "").lower() == "staff"
 
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
-
 class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     # legacy scope
@@ -54,10 +52,17 @@ class Product(db.Model):
     expiry_date = db.Column(db.Date, nullable=True)
     unit_price = db.Column(db.Float, default=0)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(WAT))
+    __table_args__ = (
+        db.Index("ix_product_business_sku", "business_id", "sku"),
+        db.Index("ix_product_business_expiry", "business_id", "expiry_date"),  # /api/alerts expiring
+        db.Index("ix_product_business_barcode", "business_id", "barcode"),  # /api/products/lookup
+    )
 
 class StockMovement(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, index=True, nullable=False)  # legacy
+    # denormalized from Product so tenant-scoped movement queries skip the join
+    business_id = db.Column(db.Integer, db.ForeignKey("business.id"))
     product_id = db.Column(db.Integer, db.ForeignKey("product.id"), nullable=False, index=True)
     qty = db.Column(db.Integer, nullable=False)
     type = db.Column(db.String(10), nullable=False)  # IN, OUT, ADJUST
@@ -65,6 +70,11 @@ class StockMovement(db.Model):
     unit_cost = db.Column(db.Float, nullable=True)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     product = db.relationship("Product", backref="movements")
+    __table_args__ = (
+        db.Index("ix_stock_movement_product_type_ts", "product_id", "type", "timestamp"),
+        db.Index("ix_stock_movement_business_product_ts", "business_id", "product_id", "timestamp"),
+        db.Index("ix_stock_movement_business_ts", "business_id", "timestamp"),
+    )
 
 class Supplier(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -98,12 +108,106 @@ class Sale(db.Model):
     business_id = db.Column(db.Integer, db.ForeignKey("business.id"), index=True)  # NEW
     total_amount = db.Column(db.Float, default=0)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    # newest-first history per tenant (keyset pagination in /api/sales_list)
+    __table_args__ = (db.Index("ix_sale_business_ts", "business_id", "timestamp"),)
 
 class SaleItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    sale_id = db.Column(db.Integer, db.ForeignKey("sale.id"), nullable=False)
+    sale_id = db.Column(db.Integer, db.ForeignKey("sale.id"), nullable=False, index=True)
+    business_id = db.Column(db.Integer, db.ForeignKey("business.id"))  # denormalized from Sale
     product_id = db.Column(db.Integer, db.ForeignKey("product.id"), nullable=False)
     qty = db.Column(db.Integer, nullable=False)
     unit_price = db.Column(db.Float, nullable=False)
+    unit_cost = db.Column(db.Float)  # weighted-average cost when sold (COGS); NULL if unknown
     sale = db.relationship("Sale", backref="items")
     product = db.relationship("Product")
+    __table_args__ = (db.Index("ix_sale_item_business_product", "business_id", "product_id"),)
+
+class StockBalance(db.Model):
+    # running on-hand quantity per product, maintained alongside StockMovement
+    id = db.Column(db.Integer, primary_key=True)
+    business_id = db.Column(db.Integer, db.ForeignKey("business.id"), index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey("product.id"), nullable=False, unique=True)
+    qty = db.Column(db.Integer, nullable=False, default=0)
+    avg_cost = db.Column(db.Float, nullable=False, default=0)  # moving weighted average of receipts
+    suggested_reorder = db.Column(db.Integer, nullable=False, default=0)  # forecast, refreshed daily (alerts.py)
+    needs_reorder = db.Column(db.Boolean, nullable=False, default=False)  # kept current on every movement
+    version = db.Column(db.Integer, nullable=False, default=0)  # bumped on every qty/cost write (optimistic lock)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    __table_args__ = (db.Index("ix_stock_balance_business_reorder", "business_id", "needs_reorder"),)
+
+class CatalogVersion(db.Model):
+    # bumped on every product or stock movement write; used as the /api/catalog ETag
+    business_id = db.Column(db.Integer, db.ForeignKey("business.id"), primary_key=True, autoincrement=False)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class SyncReceipt(db.Model):
+    # idempotency index for /api/sync: one row per client-generated record id
+    id = db.Column(db.Integer, primary_key=True)
+    business_id = db.Column(db.Integer, db.ForeignKey("business.id"), nullable=False)
+    client_id = db.Column(db.String(64), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # product, sale, purchase
+    server_id = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (db.UniqueConstraint("business_id", "client_id"),)
+
+class DailyProductSales(db.Model):
+    # per-product daily sales rollup (UTC day), maintained with each sale
+    id = db.Column(db.Integer, primary_key=True)
+    business_id = db.Column(db.Integer, db.ForeignKey("business.id"), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey("product.id"), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    qty = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    __table_args__ = (
+        db.UniqueConstraint("product_id", "day"),
+        db.Index("ix_daily_product_sales_business_day", "business_id", "day"),
+    )
+
+class Job(db.Model):
+    # background work queue (see jobs.py); claimed by `manage.py worker` or the in-process runner
+    id = db.Column(db.Integer, primary_key=True)
+    business_id = db.Column(db.Integer, db.ForeignKey("business.id"))
+    user_id = db.Column(db.Integer)
+    kind = db.Column(db.String(40), nullable=False)
+    status = db.Column(db.String(10), nullable=False, default="queued")  # queued, running, done, failed
+    payload = db.Column(db.Text)           # JSON
+    result = db.Column(db.Text)            # JSON, kept for re-use by identical requests
+    error = db.Column(db.Text)
+    cache_key = db.Column(db.String(160))
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    __table_args__ = (
+        db.Index("ix_job_status_id", "status", "id"),
+        db.Index("ix_job_business_created", "business_id", "created_at"),
+        db.Index("ix_job_cache_key", "cache_key"),
+    )
+
+class StockCheckpoint(db.Model):
+    # stock of a business just before taken_at (a UTC day/month boundary), see snapshots.py
+    id = db.Column(db.Integer, primary_key=True)
+    business_id = db.Column(db.Integer, db.ForeignKey("business.id"), nullable=False)
+    taken_at = db.Column(db.DateTime, nullable=False)
+    compacted = db.Column(db.Boolean, nullable=False, default=False)  # older movements deleted
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (db.UniqueConstraint("business_id", "taken_at"),)
+
+class StockSnapshot(db.Model):
+    # one product's on-hand qty and average cost at a checkpoint; absent = 0
+    id = db.Column(db.Integer, primary_key=True)
+    checkpoint_id = db.Column(db.Integer, db.ForeignKey("stock_checkpoint.id"), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey("product.id"), nullable=False)
+    qty = db.Column(db.Integer, nullable=False, default=0)
+    avg_cost = db.Column(db.Float, nullable=False, default=0)
+    __table_args__ = (db.UniqueConstraint("checkpoint_id", "product_id"),)
+
+class ReportCache(db.Model):
+    # aggregates of one closed date range (rows as JSON), see reports.py
+    id = db.Column(db.Integer, primary_key=True)
+    business_id = db.Column(db.Integer, db.ForeignKey("business.id"), nullable=False)
+    key = db.Column(db.String(80), nullable=False)   # "<kind>:<from>:<to>"
+    payload = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (db.UniqueConstraint("business_id", "key"),)
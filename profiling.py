@@ -0,0 +1,121 @@
+# profiling.py
+"""
+Opt-in request profiling (PROFILING=1).
+
+Per request: wall time, SQL query count and SQL time, gathered with SQLAlchemy
+cursor events. Responses get a Server-Timing header (db vs. the rest), and
+per-endpoint histograms are kept in memory for /admin/metrics. The same SQL
+text repeated N1_THRESHOLD+ times in one request (a lazy load in a loop,
+e.g. SaleItem.product or Purchase.supplier) is flagged as an N+1.
+"""
+import threading, time
+from collections import Counter
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from extensions import db, shards
+
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+N1_THRESHOLD = 5
+
+_lock = threading.Lock()
+_stats = {}
+
+def _new_stats():
+    return {
+        "count": 0,
+        "wall_ms": [0] * (len(BUCKETS_MS) + 1),
+        "sql_ms": [0] * (len(BUCKETS_MS) + 1),
+        "queries": [0] * (len(BUCKETS_MS) + 1),  # same buckets, counted in queries
+        "total_wall_ms": 0.0, "total_sql_ms": 0.0, "total_queries": 0,
+        "n_plus_one": Counter(),
+    }
+
+def _bucket(value):
+    for i, edge in enumerate(BUCKETS_MS):
+        if value <= edge:
+            return i
+    return len(BUCKETS_MS)
+
+def _record(endpoint, wall_ms, sql_ms, queries, suspects):
+    with _lock:
+        s = _stats.setdefault(endpoint, _new_stats())
+        s["count"] += 1
+        s["wall_ms"][_bucket(wall_ms)] += 1
+        s["sql_ms"][_bucket(sql_ms)] += 1
+        s["queries"][_bucket(queries)] += 1
+        s["total_wall_ms"] += wall_ms
+        s["total_sql_ms"] += sql_ms
+        s["total_queries"] += queries
+        s["n_plus_one"].update(suspects)
+
+def snapshot():
+    """Aggregates per endpoint, JSON-ready."""
+    edges = list(BUCKETS_MS) + [None]  # None = overflow bucket
+    hist = lambda counts: [{"le": e, "count": c} for e, c in zip(edges, counts)]
+    out = {}
+    with _lock:
+        for ep, s in sorted(_stats.items()):
+            n = s["count"] or 1
+            out[ep] = {
+                "count": s["count"],
+                "avg_wall_ms": round(s["total_wall_ms"] / n, 2),
+                "avg_sql_ms": round(s["total_sql_ms"] / n, 2),
+                "avg_queries": round(s["total_queries"] / n, 2),
+                "wall_ms": hist(s["wall_ms"]),
+                "sql_ms": hist(s["sql_ms"]),
+                "queries": hist(s["queries"]),
+                "n_plus_one": [{"sql": sql, "requests": c} for sql, c in s["n_plus_one"].most_common(10)],
+            }
+    return out
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+def init_profiling(app):
+    if not app.config.get("PROFILING"):
+        return
+
+    # the start time rides on the statement's execution context: one that raises
+    # never reaches _after, and a per-connection stack would keep its entry
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._prof_started = time.perf_counter()
+
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_prof_started", None)
+        if started is not None and has_request_context() and "prof_start" in g:
+            g.prof_sql_s += time.perf_counter() - started
+            g.prof_statements[statement] += 1
+
+    def _instrument(engine):
+        event.listen(engine, "before_cursor_execute", _before)
+        event.listen(engine, "after_cursor_execute", _after)
+
+    with app.app_context():
+        _instrument(db.engine)
+    shards.hooks.append(_instrument)   # per-business engines are opened later
+
+    @app.before_request
+    def _start():
+        g.prof_start = time.perf_counter()
+        g.prof_sql_s = 0.0
+        g.prof_statements = Counter()
+
+    @app.after_request
+    def _finish(resp):
+        if "prof_start" not in g:
+            return resp
+        wall_ms = (time.perf_counter() - g.prof_start) * 1000
+        sql_ms = g.prof_sql_s * 1000
+        queries = sum(g.prof_statements.values())
+        suspects = [" ".join(sql.split())[:200] for sql, n in g.prof_statements.items()
+                    if n >= N1_THRESHOLD]
+        resp.headers["Server-Timing"] = (
+            f'db;dur={sql_ms:.1f};desc="{queries} queries", '
+            f'app;dur={max(wall_ms - sql_ms, 0):.1f};desc="python + serialization", '
+            f'total;dur={wall_ms:.1f}')
+        _record(request.endpoint or request.path, wall_ms, sql_ms, queries, suspects)
+        if suspects:
+            app.logger.warning("possible N+1 on %s: %s", request.path, suspects)
+        return resp
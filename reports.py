@@ -0,0 +1,140 @@
+# reports.py
+"""
+Sales reports: sales, units, revenue and cost per day, week, month, product or
+category over a date range, aggregated in SQL over Sale/SaleItem (sale by
+(business_id, timestamp), lines by sale_id, category by the product's key).
+
+A range is cut into calendar-month segments. Sales are stamped with server time
+when written, so a segment that ended more than SETTLE ago can't change any more:
+its rows are stored in ReportCache the first time they are computed and read
+back from there afterwards. Only the open segment (this month) is aggregated on
+every request. Day, week and month reports share the cached per-day rows.
+rebuild_valuation fills in missing sale costs, so it drops the business's
+cached reports (invalidate_reports).
+
+Days are UTC days, like DailyProductSales; weeks start on Monday.
+"""
+import json
+from datetime import datetime, timedelta
+from sqlalchemy import func, case, insert
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models import Product, Sale, SaleItem, ReportCache
+
+GROUPS = ("day", "week", "month", "product", "category")
+SORTS = ("revenue", "qty", "margin")
+SETTLE = timedelta(minutes=5)   # a sale stamped just before midnight may commit just after
+
+def _midnight(d):
+    return datetime(d.year, d.month, d.day)
+
+def _next_month(d):
+    return d.replace(year=d.year + d.month // 12, month=d.month % 12 + 1, day=1)
+
+def _segments(start, end):
+    """[start, end) cut at month starts -> [(from, to), ...]."""
+    out = []
+    while start < end:
+        stop = min(_next_month(start), end)
+        out.append((start, stop))
+        start = stop
+    return out
+
+def _aggregate(business_id, kind, start, end):
+    """[[key, sales, qty, revenue, cost, uncosted qty], ...] for sales in [start, end)."""
+    key = {"day": func.date(Sale.timestamp), "product": SaleItem.product_id,
+           "category": Product.category}[kind]
+    q = (db.session.query(key, func.count(func.distinct(Sale.id)), func.sum(SaleItem.qty),
+                          func.sum(SaleItem.qty * SaleItem.unit_price),
+                          func.sum(SaleItem.qty * SaleItem.unit_cost),
+                          func.sum(case((SaleItem.unit_cost.is_(None), SaleItem.qty), else_=0)))
+         .select_from(Sale).join(SaleItem, SaleItem.sale_id == Sale.id)
+         .filter(Sale.business_id == business_id,
+                 Sale.timestamp >= _midnight(start), Sale.timestamp < _midnight(end)))
+    if kind == "category":
+        q = q.join(Product, Product.id == SaleItem.product_id)
+    return [[k if kind != "day" or isinstance(k, str) else k.isoformat(),
+             int(n or 0), int(qty or 0), float(rev or 0), float(cost or 0), int(uncosted or 0)]
+            for k, n, qty, rev, cost, uncosted in q.group_by(key)]
+
+def _rows(business_id, kind, start, end):
+    """Aggregate rows of every segment of [start, end), closed ones through the cache."""
+    now = datetime.utcnow()
+    segments = _segments(start, end)
+    keys = {seg: f"{kind}:{seg[0].isoformat()}:{seg[1].isoformat()}"
+            for seg in segments if _midnight(seg[1]) + SETTLE <= now}
+    cached = {}
+    if keys:
+        cached = dict(db.session.query(ReportCache.key, ReportCache.payload)
+                      .filter(ReportCache.business_id == business_id,
+                              ReportCache.key.in_(list(keys.values()))))
+    out, fresh = [], []
+    for seg in segments:
+        key = keys.get(seg)
+        if key in cached:
+            out += json.loads(cached[key])
+            continue
+        rows = _aggregate(business_id, kind, *seg)
+        out += rows
+        if key:
+            fresh.append({"business_id": business_id, "key": key,
+                          "payload": json.dumps(rows), "created_at": now})
+    if fresh:
+        try:
+            db.session.execute(insert(ReportCache), fresh)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()   # another request cached the same segment first
+    return out
+
+def _bucket(day, group_by):
+    if group_by == "week":
+        return (day - timedelta(days=day.weekday())).isoformat()
+    return day.isoformat()[:7] if group_by == "month" else day.isoformat()
+
+def _merge(rows, label=lambda k: k):
+    totals = {}
+    for k, *vals in rows:
+        acc = totals.setdefault(label(k), [0, 0, 0.0, 0.0, 0])
+        for i, v in enumerate(vals):
+            acc[i] += v
+    return totals
+
+def _metrics(vals):
+    sales, qty, revenue, cost, uncosted = vals
+    return {"sales": sales, "qty": qty, "revenue": round(revenue, 2), "cost": round(cost, 2),
+            "margin": round(revenue - cost, 2), "uncosted_qty": uncosted}
+
+def sales_report(business_id, group_by, start, end, sort="revenue", limit=None):
+    """
+    Sales of `business_id` on the UTC days [start, end) grouped by one of GROUPS.
+    Periods come oldest first; products and categories by `sort`, descending,
+    at most `limit` of them (rows_total counts them all).
+    """
+    days = _rows(business_id, "day", start, end)
+    total = _merge(days, lambda k: None).get(None, [0, 0, 0.0, 0.0, 0])
+    if group_by in ("day", "week", "month"):
+        merged = _merge(days, lambda k: _bucket(datetime.fromisoformat(k).date(), group_by))
+        rows = [{"period": k, **_metrics(v)} for k, v in sorted(merged.items())]
+    else:
+        merged = _merge(_rows(business_id, group_by, start, end))
+        rows = [{group_by: k, **_metrics(v)} for k, v in merged.items()]
+        rows.sort(key=lambda r: (-r[sort], str(r[group_by])))
+    out = {"group_by": group_by, "from": start.isoformat(),
+           "to": (end - timedelta(days=1)).isoformat(), "totals": _metrics(total),
+           "rows_total": len(rows), "rows": rows[:limit] if limit else rows}
+    if group_by == "product":
+        ids = [r["product"] for r in out["rows"]]
+        names = {pid: (sku, name) for pid, sku, name in
+                 db.session.query(Product.id, Product.sku, Product.name).filter(Product.id.in_(ids))}
+        for r in out["rows"]:
+            r["product_id"] = r.pop("product")
+            r["sku"], r["name"] = names.get(r["product_id"], (None, None))
+    return out
+
+def invalidate_reports(business_id=None):
+    """Drop cached report segments (all businesses when business_id is None). The caller commits."""
+    q = ReportCache.query
+    if business_id is not None:
+        q = q.filter(ReportCache.business_id == business_id)
+    q.delete(synchronize_session=False)
@@ -1,8 +1,11 @@
 # routes_admin.py
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
 from flask_login import current_user
-from models import User, db
-from utils import role_required
+from models import User, Business, db
+from utils import role_required, admin_required
+from tenancy import current_tenant, invalidate_user
+from inventory import stock_policy
+import profiling
 
 admin_bp = Blueprint("admin", __name__, url_prefix="/admin")
 
@@ -12,7 +15,7 @@ def manager_required(view):
 @admin_bp.get("/users")
 @manager_required
 def users_list():
-    users = User.query.filter_by(business_id=current_user.business_id).order_by(User.email).all()
+    users = current_tenant.scope(User).order_by(User.email).all()
     return render_template("admin_users.html", users=users)
 
 @admin_bp.get("/users/new")
@@ -38,10 +41,35 @@ def users_create():
         email=email,
         store_name=current_user.store_name,
         role=("manager" if role == "manager" else "staff"),
-        business_id=current_user.business_id
+        business_id=current_tenant.business_id
     )
     u.set_password(password)
     db.session.add(u)
     db.session.commit()
+    invalidate_user(u.id)  # SQLite may hand out a deleted user's id again
     flash(f"Created {u.role} {email}", "success")
     return redirect(url_for("admin.users_list"))
+
+@admin_bp.get("/stock-policy")
+@manager_required
+def stock_policy_get():
+    return jsonify({"stock_policy": stock_policy(current_tenant.business_id)})
+
+@admin_bp.post("/stock-policy")
+@manager_required
+def stock_policy_set():
+    # "reject": sales can't oversell (409); "allow": balances may go negative
+    data = request.get_json(silent=True) or request.form
+    policy = (data.get("stock_policy") or "").strip().lower()
+    if policy not in ("reject", "allow"):
+        return jsonify({"error": "stock_policy must be 'reject' or 'allow'"}), 400
+    Business.query.filter_by(id=current_tenant.business_id).update({"stock_policy": policy})
+    db.session.commit()
+    return jsonify({"stock_policy": policy})
+
+@admin_bp.get("/metrics")
+@admin_required
+def metrics():
+    # request/SQL histograms per endpoint; empty unless PROFILING=1
+    return jsonify({"enabled": bool(current_app.config.get("PROFILING")),
+                    "endpoints": profiling.snapshot()})
@@ -1,96 +1,487 @@
-from flask import Blueprint, request, jsonify
-from flask_login import login_required, current_user
-from datetime import datetime
-from sqlalchemy import func
+from flask import Blueprint, request, jsonify, make_response, Response, stream_with_context, url_for, current_app
+from flask_login import login_required
+from datetime import datetime, timedelta
+import io, json, hashlib, os, shutil, uuid
+from sqlalchemy import func, or_, and_
 from extensions import db
-from models import Product, StockMovement, Sale, SaleItem, Purchase, PurchaseItem
-from forecasting import forecast_demand
-from sqlalchemy.orm import joinedload
+from models import (Product, StockMovement, StockBalance, Sale, SaleItem,
+                    DailyProductSales, Job)
+from forecasting import forecast_demand, forecast_business
+from inventory import (init_balances, bump_catalog_version, catalog_version, catalog_changes,
+                       stock_policy, retry_stale, InsufficientStock, StaleBalance)
+from sync import apply_sync, write_documents, parse_cursor, SYNC_SLACK, _record_error
+from bulk_products import import_products, iter_csv, iter_jsonl, export_csv
+from sqlalchemy.orm import selectinload
+from tenancy import current_tenant
+from jobs import enqueue, job_json
+import time, queue
+import events
+from alerts import reorder_alerts, expiry_alerts
+from search import search_products
+from snapshots import stock_as_of, CompactedHistory, PERIODS
+from reports import sales_report, GROUPS, SORTS
+from encoding import list_format, list_response, rows_payload, respond, variant, FORMATS
 
 api_bp = Blueprint("api", __name__, url_prefix="/api")
 
+MAX_PAGE = 200      # hard cap for ?limit= on list endpoints
+EXPORT_CHUNK = 500  # rows per keyset page when streaming an export
+MAX_REPORT_DAYS = 3660  # widest /api/reports/sales range
+STALE_RETRY_AFTER = 1   # seconds a client waits after losing every balance retry
+REFRESH_BACKOFF = 900   # seconds before a failed reorder-suggestion refresh is queued again
+
+@api_bp.errorhandler(StaleBalance)
+def _stale_balance(e):
+    # retry_stale gave up (sales, purchases, sync): nothing was written, try again shortly
+    db.session.rollback()
+    resp = jsonify({"error": "Stock is being updated, please retry"})
+    resp.status_code = 409
+    resp.headers["Retry-After"] = str(STALE_RETRY_AFTER)
+    return resp
+
+def _page_limit(default):
+    try:
+        n = int(request.args.get("limit", default))
+    except (TypeError, ValueError):
+        n = default
+    return min(max(n, 1), MAX_PAGE)
+
+def _bounded_int(value, default, lo, hi):
+    # query/body integer clamped to [lo, hi]; default when absent, None when it isn't a number
+    if value is None or value == "":
+        return default
+    try:
+        return min(max(int(value), lo), hi)
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+def _encode_cursor(ts, row_id):
+    return f"{ts.isoformat()}_{row_id}"
+
+def _decode_cursor(value):
+    # "<iso timestamp>_<id>" -> (datetime, int); None if absent or malformed
+    try:
+        ts, row_id = (value or "").rsplit("_", 1)
+        return datetime.fromisoformat(ts), int(row_id)
+    except ValueError:
+        return None
+
+def _keyset(q, ts_col, id_col, cursor):
+    # newest first; rows strictly after the cursor in (timestamp, id) order
+    if cursor:
+        ts, row_id = cursor
+        q = q.filter(or_(ts_col < ts, and_(ts_col == ts, id_col < row_id)))
+    return q.order_by(ts_col.desc(), id_col.desc())
+
+def _paged(items, next_key):
+    # list body stays the same shape; the next page's cursor rides in a header
+    resp = jsonify(items)
+    if next_key:
+        resp.headers["X-Next-Cursor"] = next_key
+    return resp
+
+PRODUCT_FIELDS = ("id", "sku", "name", "unit", "barcode", "reorder_point",
+                  "unit_price", "expiry_date", "created_at")
+CATALOG_FIELDS = PRODUCT_FIELDS + ("stock",)
+STOCK_FIELDS = ("product_id", "name", "sku", "stock", "reorder_point")
+# a bad ?cursor= is refused: restarting at page 1 would append duplicates to "load more"
+CURSOR_ERROR = {"error": "cursor must be the X-Next-Cursor of an earlier page"}
+FORMAT_ERROR = {"error": "format must be one of " + ", ".join(FORMATS)}
+
+def _product_json(p):
+    return {
+        "id": p.id, "sku": p.sku, "name": p.name, "unit": p.unit,
+        "barcode": p.barcode, "reorder_point": p.reorder_point,
+        "unit_price": p.unit_price,
+        "expiry_date": p.expiry_date.isoformat() if p.expiry_date else None,
+        "created_at": p.created_at.isoformat() if p.created_at else None
+    }
+
 @api_bp.get("/stock")
 @login_required
 def stock_balances():
-    # sum movements but only for products in this business
-    rows = (db.session.query(StockMovement.product_id, func.sum(StockMovement.qty))
-            .join(Product, Product.id == StockMovement.product_id)
-            .filter(Product.business_id == current_user.business_id)
-            .group_by(StockMovement.product_id).all())
-    totals = {pid: int(total or 0) for pid, total in rows}
-    products = Product.query.filter_by(business_id=current_user.business_id).all()
-    return jsonify([{
+    fmt = list_format()
+    if not fmt:
+        return jsonify(FORMAT_ERROR), 400
+    as_of = request.args.get("as_of")
+    if as_of:
+        # ?as_of=2026-10-01 (start of that UTC day) or a full ISO timestamp
+        try:
+            at = datetime.fromisoformat(as_of)
+        except ValueError:
+            return jsonify({"error": "as_of must be an ISO date or timestamp"}), 400
+        try:
+            totals = stock_as_of(current_tenant.business_id, at)
+        except CompactedHistory as e:
+            return jsonify({"error": str(e)}), 400
+    else:
+        # maintained balances (one row per product), see inventory.apply_stock_deltas
+        rows = (db.session.query(StockBalance.product_id, StockBalance.qty)
+                .filter(StockBalance.business_id == current_tenant.business_id).all())
+        totals = {pid: int(qty or 0) for pid, qty in rows}
+    products = current_tenant.scope(Product).all()
+    return list_response([{
         "product_id": p.id, "name": p.name, "sku": p.sku,
         "stock": totals.get(p.id, 0), "reorder_point": p.reorder_point
-    } for p in products])
+    } for p in products], STOCK_FIELDS, fmt)
+
+@api_bp.get("/valuation")
+@login_required
+def valuation():
+    # on-hand value at moving weighted-average cost, read straight off the balance rows
+    rows = (db.session.query(Product.id, Product.sku, Product.name, StockBalance.qty, StockBalance.avg_cost)
+            .join(StockBalance, StockBalance.product_id == Product.id)
+            .filter(StockBalance.business_id == current_tenant.business_id)
+            .order_by(Product.name).all())
+    items = [{
+        "product_id": pid, "sku": sku, "name": name, "qty": int(qty or 0),
+        "avg_cost": round(cost or 0, 4),
+        "value": round(max(qty or 0, 0) * (cost or 0), 2),
+    } for pid, sku, name, qty, cost in rows]
+    return jsonify({
+        "method": "weighted_average",
+        "total_value": round(sum(i["value"] for i in items), 2),
+        "uncosted_products": sum(1 for i in items if i["qty"] > 0 and not i["avg_cost"]),
+        "items": items,
+    })
+
+@api_bp.get("/alerts")
+@login_required
+def alerts():
+    """Products to reorder (stock, reorder point, forecast) and in-stock items expiring within ?days=."""
+    bid = current_tenant.business_id
+    days = _bounded_int(request.args.get("days"), 30, 0, 365)
+    if days is None:
+        return jsonify({"error": "days must be an integer"}), 400
+    limit = _page_limit(100)
+    # forecast suggestions change once a day; the first request of the day refreshes them
+    # off-thread and later ones re-use that job (a failed one is retried every REFRESH_BACKOFF)
+    today = datetime.utcnow().date()
+    job = enqueue("refresh_reorder", bid, current_tenant.user_id,
+                  cache_key=f"refresh_reorder:{bid}:{today}",
+                  result_ttl=86400, failed_backoff=REFRESH_BACKOFF)
+    reorder_total, reorder = reorder_alerts(bid, limit)
+    expiring_total, expiring = expiry_alerts(bid, days, limit)
+    return jsonify({
+        "forecast_as_of": today.isoformat() if job.status == "done" else None,
+        "reorder_total": reorder_total, "reorder": reorder,
+        "expiring_total": expiring_total, "expiring": expiring,
+    })
+
+@api_bp.get("/stream")
+@login_required
+def stream():
+    """
+    Server-sent events for the caller's business: stock, movement, sales and
+    product deltas as they commit, plus "resync" when the client should refetch.
+    Off unless LIVE_UPDATES is set (the dashboard polls /api/changes instead).
+    """
+    cfg = current_app.config
+    if not cfg.get("LIVE_UPDATES"):
+        return jsonify({"error": "live updates are off"}), 404
+    bid = current_tenant.business_id
+    heartbeat, max_seconds = cfg.get("STREAM_HEARTBEAT", 15), cfg.get("STREAM_MAX_SECONDS", 300)
+    sub = events.subscribe(bid, request.headers.get("Last-Event-ID"))
+
+    def generate():
+        try:
+            yield "retry: 3000\n\n"
+            version = catalog_version(bid)
+            db.session.close()  # don't hold a pooled connection for the life of the stream
+            if sub.resync:
+                sub.resync = False
+                yield "event: resync\ndata: {}\n\n"
+            for ev in sub.missed:
+                yield events.format_sse(ev)
+            deadline = time.monotonic() + max_seconds
+            delivered = False
+            while time.monotonic() < deadline:
+                try:
+                    ev = sub.queue.get(timeout=heartbeat)
+                except queue.Empty:
+                    # idle: one primary-key read notices writes made by other processes
+                    current = catalog_version(bid)
+                    db.session.close()
+                    if current != version and not delivered:
+                        yield "event: resync\ndata: {}\n\n"
+                    version, delivered = current, False
+                    yield ": keep-alive\n\n"
+                    continue
+                delivered = True
+                yield events.format_sse(ev)
+                if sub.resync:  # queue overflowed: this client missed events
+                    sub.resync = False
+                    yield "event: resync\ndata: {}\n\n"
+        finally:
+            events.unsubscribe(sub)
+
+    resp = Response(stream_with_context(generate()), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"  # nginx: don't buffer the stream
+    return resp
 
 @api_bp.post("/sales")
 @login_required
 def create_sale():
-    data = request.json or {}
-    items = data.get("items", [])
-    pids = [i["product_id"] for i in items]
+    items, error = _document_items("sales")
+    if error:
+        return error
+    try:
+        sale_id = _write_document("sales", items, stock_policy(current_tenant.business_id) == "allow")
+    except InsufficientStock as e:
+        db.session.rollback()
+        return jsonify({"error": "Insufficient stock", "items": e.shortages}), 409
+    return jsonify({"sale_id": sale_id})
 
-    # validate products belong to this business
-    owned = {p.id for p in Product.query.filter(
+def _document_items(kind):
+    # (items, None), or (None, 400 response) before anything is written: the same
+    # shape rules as /api/sync records, then every product must be this business's
+    data = request.json or {}
+    if not isinstance(data, dict):
+        return None, (jsonify({"error": "expected a JSON object"}), 400)
+    items = data.get("items")
+    problem = _record_error(kind, {"items": items})
+    if problem:
+        return None, (jsonify({"error": problem}), 400)
+    pids = {i["product_id"] for i in items}
+    owned = {pid for (pid,) in db.session.query(Product.id).filter(
         Product.id.in_(pids),
-        Product.business_id == current_user.business_id
-    ).all()}
-    if not set(pids).issubset(owned):
-        return jsonify({"error":"One or more items are invalid"}), 400
-
-    sale = Sale(
-        user_id=current_user.id,
-        business_id=current_user.business_id,
-        total_amount=sum(i["qty"]*i["unit_price"] for i in items)
-    )
-    db.session.add(sale); db.session.flush()
+        Product.business_id == current_tenant.business_id
+    )}
+    if pids - owned:
+        return None, (jsonify({"error": "One or more items are invalid"}), 400)
+    return items, None
 
-    for it in items:
-        db.session.add(SaleItem(sale_id=sale.id, product_id=it["product_id"],
-                                qty=it["qty"], unit_price=it["unit_price"]))
-        db.session.add(StockMovement(user_id=current_user.id, product_id=it["product_id"],
-                                     qty=-abs(it["qty"]), type="OUT", source="sale"))
-    db.session.commit()
-    return jsonify({"sale_id": sale.id})
+def _write_document(kind, items, allow_negative=True):
+    # one INSERT each for the header, its lines and their movements; the balance
+    # UPDATE is conditional on the row versions read, so a lost race re-runs it all
+    def write():
+        now = datetime.utcnow()
+        (doc_id,), moved = write_documents(current_tenant, kind, [{"items": items}], now, allow_negative)
+        bump_catalog_version(current_tenant.business_id)
+        events.publish_movements(current_tenant.business_id, moved, now)
+        db.session.commit()
+        return doc_id
+    return retry_stale(write, current_app.config.get("STOCK_WRITE_RETRIES", 3))
+
+def _sales_page(business_id, cursor, limit):
+    q = (Sale.query
+         .filter(Sale.business_id == business_id)
+         .options(selectinload(Sale.items).selectinload(SaleItem.product)))
+    return _keyset(q, Sale.timestamp, Sale.id, cursor).limit(limit).all()
+
+def _sale_json(s):
+    items = s.items or []
+    # COGS/margin only when every line has a known cost
+    known = all(i.unit_cost is not None for i in items)
+    cogs = round(sum((i.qty or 0) * i.unit_cost for i in items), 2) if known else None
+    return {
+        "id": s.id,
+        "timestamp": s.timestamp.isoformat(),
+        "total_amount": float(s.total_amount or 0),
+        "cogs": cogs,
+        "margin": round(float(s.total_amount or 0) - cogs, 2) if known else None,
+        "items": [{
+            "product_id": i.product_id,
+            "name": (i.product.name if i.product else ""),
+            "qty": int(i.qty or 0),
+            "unit_price": float(i.unit_price or 0),
+            "unit_cost": i.unit_cost,
+        } for i in items]
+    }
 
 @api_bp.get("/sales_list")
 @login_required
 def sales_list():
-    sales = (Sale.query
-             .filter_by(business_id=current_user.business_id)
-             .options(joinedload(Sale.items).joinedload(SaleItem.product))
-             .order_by(Sale.timestamp.desc())
-             .limit(int(request.args.get("limit", 50)))
-             .all())
-    out = []
-    for s in sales:
-        out.append({
-            "id": s.id,
-            "timestamp": s.timestamp.isoformat(),
-            "total_amount": float(s.total_amount or 0),
-            "items": [{
-                "product_id": i.product_id,
-                "name": (i.product.name if i.product else ""),
-                "qty": int(i.qty or 0),
-                "unit_price": float(i.unit_price or 0),
-            } for i in (s.items or [])]
-        })
-    return jsonify(out), 200
+    # keyset pagination: pass the X-Next-Cursor header back as ?cursor=
+    limit = _page_limit(50)
+    cursor = _decode_cursor(request.args.get("cursor"))
+    if request.args.get("cursor") and cursor is None:
+        return jsonify(CURSOR_ERROR), 400
+    # fetch one extra row to learn whether another page exists
+    sales = _sales_page(current_tenant.business_id, cursor, limit + 1)
+    next_key = _encode_cursor(sales[limit - 1].timestamp, sales[limit - 1].id) if len(sales) > limit else None
+    return _paged([_sale_json(s) for s in sales[:limit]], next_key), 200
+
+@api_bp.get("/sales_list/export")
+@login_required
+def sales_export():
+    """Full sales history as one JSON array, streamed page by page (constant memory)."""
+    bid = current_tenant.business_id
+
+    def generate():
+        yield "["
+        cursor, first = None, True
+        while True:
+            page = _sales_page(bid, cursor, EXPORT_CHUNK)
+            for s in page:
+                yield ("" if first else ",") + json.dumps(_sale_json(s))
+                first = False
+            if len(page) < EXPORT_CHUNK:
+                break
+            cursor = (page[-1].timestamp, page[-1].id)
+            db.session.expunge_all()  # keep the identity map from growing
+        yield "]"
+
+    resp = Response(stream_with_context(generate()), mimetype="application/json")
+    resp.headers["Content-Disposition"] = "attachment; filename=sales.json"
+    return resp
+
+@api_bp.get("/sales_summary")
+@login_required
+def sales_summary():
+    # units/revenue per day for the last N days (today included), from the daily rollup
+    days = _bounded_int(request.args.get("days"), 7, 1, 365)
+    if days is None:
+        return jsonify({"error": "days must be an integer"}), 400
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    rows = (db.session.query(DailyProductSales.day, func.sum(DailyProductSales.qty),
+                             func.sum(DailyProductSales.revenue))
+            .filter(DailyProductSales.business_id == current_tenant.business_id,
+                    DailyProductSales.day >= since)
+            .group_by(DailyProductSales.day)
+            .order_by(DailyProductSales.day).all())
+    by_day = [{"day": d.isoformat(), "qty": int(q or 0), "revenue": float(r or 0)} for d, q, r in rows]
+    return jsonify({
+        "days": days,
+        "qty": sum(r["qty"] for r in by_day),
+        "revenue": round(sum(r["revenue"] for r in by_day), 2),
+        "by_day": by_day,
+    })
+
+def _day_arg(name, default):
+    value = request.args.get(name)
+    return datetime.fromisoformat(value).date() if value else default
+
+@api_bp.get("/reports/sales")
+@login_required
+def sales_report_api():
+    """
+    ?group_by=day|week|month|product|category&from=2026-01-01&to=2026-03-31 (UTC days,
+    inclusive; default the last 30). Products/categories: ?sort=revenue|qty|margin&limit=.
+    """
+    group_by = request.args.get("group_by", "day")
+    sort = request.args.get("sort", "revenue")
+    if group_by not in GROUPS or sort not in SORTS:
+        return jsonify({"error": "group_by must be one of " + ", ".join(GROUPS)
+                                 + "; sort one of " + ", ".join(SORTS)}), 400
+    try:
+        to = _day_arg("to", datetime.utcnow().date())
+        start = _day_arg("from", to - timedelta(days=29))
+    except ValueError:
+        return jsonify({"error": "from and to must be ISO dates"}), 400
+    if start > to or (to - start).days >= MAX_REPORT_DAYS:
+        return jsonify({"error": f"from must be on or before to, at most {MAX_REPORT_DAYS} days apart"}), 400
+    limit = _page_limit(50) if group_by == "product" else None
+    return jsonify(sales_report(current_tenant.business_id, group_by, start,
+                                to + timedelta(days=1), sort, limit))
 
 @api_bp.get("/products")
 @login_required
 def list_products():
+    fmt = list_format()
+    if not fmt:
+        return jsonify(FORMAT_ERROR), 400
     products = (Product.query
-        .filter(Product.business_id == current_user.business_id)
+        .filter(Product.business_id == current_tenant.business_id)
         .order_by(Product.name).all())
-    return jsonify([{
-        "id": p.id, "sku": p.sku, "name": p.name, "unit": p.unit,
-        "barcode": p.barcode, "reorder_point": p.reorder_point,
-        "unit_price": p.unit_price,
-        "expiry_date": p.expiry_date.isoformat() if p.expiry_date else None,
-        "created_at": p.created_at.isoformat() if p.created_at else None
-    } for p in products])
+    return list_response([_product_json(p) for p in products], PRODUCT_FIELDS, fmt)
+
+def _with_stock(ids):
+    # products in the order of `ids`, each with its stock balance
+    rows = (db.session.query(Product, StockBalance.qty)
+            .outerjoin(StockBalance, StockBalance.product_id == Product.id)
+            .filter(Product.business_id == current_tenant.business_id, Product.id.in_(ids)).all())
+    found = {p.id: {**_product_json(p), "stock": int(qty or 0)} for p, qty in rows}
+    return [found[i] for i in ids if i in found]
+
+@api_bp.get("/products/lookup")
+@login_required
+def lookup_product():
+    """Exact barcode (scanner) or SKU match, for the till."""
+    barcode = (request.args.get("barcode") or "").strip()
+    sku = (request.args.get("sku") or "").strip()
+    if not barcode and not sku:
+        return jsonify({"error": "barcode or sku is required"}), 400
+    q = db.session.query(Product.id).filter(Product.business_id == current_tenant.business_id)
+    q = q.filter(Product.barcode == barcode) if barcode else q.filter(Product.sku == sku)
+    ids = [pid for (pid,) in q.order_by(Product.id).limit(_page_limit(10))]
+    return jsonify(_with_stock(ids))
+
+@api_bp.get("/products/search")
+@login_required
+def search_products_api():
+    """Prefix and one-typo matches on product name and SKU, best first."""
+    q = (request.args.get("q") or "").strip()
+    if not q:
+        return jsonify([])
+    return jsonify(_with_stock(search_products(current_tenant.business_id, q, _page_limit(10))))
+
+@api_bp.get("/catalog")
+@login_required
+def catalog_snapshot():
+    """
+    Products joined with their stock balance in one response.
+    The ETag is the business's catalog version, so an unchanged catalog
+    costs one primary-key lookup and a 304. ?format=columnar and msgpack
+    bodies get their own tag; compressed ones a weak tag (hence contains_weak).
+    """
+    fmt = list_format()
+    if not fmt:
+        return jsonify(FORMAT_ERROR), 400
+    bid = current_tenant.business_id
+    etag = f"cat-{bid}-{catalog_version(bid)}{variant(fmt)}"
+    if request.if_none_match.contains_weak(etag):
+        resp = make_response("", 304)
+        resp.set_etag(etag)
+        return resp
+
+    resp = list_response(_catalog_rows(bid), CATALOG_FIELDS, fmt)
+    resp.set_etag(etag)
+    return resp
+
+def _catalog_rows(business_id, since=None):
+    # every product with its stock, or (since=) those whose balance row was written after it
+    if since is not None:
+        rows = catalog_changes(business_id, since)
+    else:
+        rows = (db.session.query(Product, StockBalance.qty)
+                .outerjoin(StockBalance, StockBalance.product_id == Product.id)
+                .filter(Product.business_id == business_id)
+                .order_by(Product.name).all())
+    return [{**_product_json(p), "stock": int(qty or 0)} for p, qty in rows]
+
+@api_bp.get("/changes")
+@login_required
+def catalog_delta():
+    """
+    Catalog rows (as /api/catalog) changed since ?since=, the cursor of an
+    earlier response, for clients keeping a local copy (static/api.js).
+    Without `since` the whole catalog comes back ("full": true). Products are
+    never deleted and every product or stock write stamps the balance row, so
+    changes are upserts by id. The cursor carries the catalog version: while
+    it's unchanged the answer is empty without a scan.
+    """
+    fmt = list_format()
+    if not fmt:
+        return jsonify(FORMAT_ERROR), 400
+    since = None
+    if request.args.get("since"):
+        since = _decode_cursor(request.args["since"])
+        if since is None:
+            return jsonify({"error": "since must be the cursor of an earlier /api/changes response"}), 400
+    bid = current_tenant.business_id
+    now = datetime.utcnow()
+    version = catalog_version(bid)
+    if since is None:
+        rows = _catalog_rows(bid)
+    elif since[1] == version:
+        rows = []
+    else:
+        rows = _catalog_rows(bid, since[0] - SYNC_SLACK)
+    return respond({"business_id": bid, "version": version, "full": since is None,
+                    "cursor": _encode_cursor(now, version),
+                    "changes": rows_payload(rows, CATALOG_FIELDS, fmt)})
 
 @api_bp.post("/products")
 @login_required
@@ -98,18 +489,17 @@ def create_product():
     data = request.json or {}
     unit_price = float(data.get("unit_price") or 0)
     opening_stock = int(data.get("opening_stock") or 0)
+    unit_cost = float(data["unit_cost"]) if data.get("unit_cost") not in (None, "") else None
     expiry_date = data.get("expiry_date")
 
     # per-business SKU uniqueness (soft)
-    exists = (Product.query
-              .filter_by(business_id=current_user.business_id, sku=data["sku"])
-              .first())
+    exists = current_tenant.scope(Product).filter_by(sku=data["sku"]).first()
     if exists:
         return jsonify({"error":"SKU already exists"}), 400
 
     p = Product(
-        user_id=current_user.id,                          # legacy link
-        business_id=current_user.business_id,             # tenant
+        user_id=current_tenant.user_id,                          # legacy link
+        business_id=current_tenant.business_id,             # tenant
         sku=data["sku"], name=data["name"],
         category=data.get("category"), unit=data.get("unit","unit"),
         barcode=data.get("barcode"), reorder_point=data.get("reorder_point",0),
@@ -120,107 +510,192 @@ def create_product():
 
     if opening_stock > 0:
         db.session.add(StockMovement(
-            user_id=current_user.id,
+            user_id=current_tenant.user_id, business_id=current_tenant.business_id,
             product_id=p.id, qty=opening_stock,
-            type="IN", source="opening"
+            type="IN", source="opening", unit_cost=unit_cost
         ))
+    init_balances(current_tenant.business_id, {p.id: max(opening_stock, 0)}, {p.id: unit_cost})
 
+    bump_catalog_version(current_tenant.business_id)
+    events.publish(current_tenant.business_id, "product",
+                   {**_product_json(p), "stock": max(opening_stock, 0)})
+    if opening_stock > 0:
+        events.publish_movements(current_tenant.business_id, [(p.id, opening_stock)], datetime.utcnow())
     db.session.commit()
     return jsonify({"id": p.id}), 201
 
 
+@api_bp.post("/products/import")
+@login_required
+def import_products_api():
+    """
+    Bulk catalog import. Body is CSV or JSONL (raw, or a multipart 'file'),
+    streamed and written in chunks. Returns a per-row error report.
+    """
+    upload = request.files.get("file")
+    stream = upload.stream if upload else request.stream
+    if isinstance(stream, io.RawIOBase):
+        stream = io.BufferedReader(stream)     # read by line below: not a byte at a time
+    name = (upload.filename if upload else "") or ""
+    fmt = request.args.get("format") or (
+        "jsonl" if name.endswith((".jsonl", ".ndjson")) or "ndjson" in (request.mimetype or "")
+        else "csv")
+    if _wants_async():
+        # spool the upload so the worker can read it after this request is gone
+        spool = current_app.config["JOB_SPOOL_DIR"]
+        os.makedirs(spool, exist_ok=True)
+        path = os.path.join(spool, f"{uuid.uuid4().hex}.{fmt}")
+        with open(path, "wb") as fh:
+            shutil.copyfileobj(stream, fh)
+        return _accepted(enqueue("import_products", current_tenant.business_id, current_tenant.user_id,
+                                 {"path": path, "format": fmt}))
+    records = iter_jsonl(stream) if fmt == "jsonl" else iter_csv(stream)
+    report = import_products(records, current_tenant.business_id, current_tenant.user_id)
+    return jsonify(report), (201 if report["created"] else 200)
+
+@api_bp.get("/products/export")
+@login_required
+def export_products_api():
+    resp = Response(stream_with_context(export_csv(current_tenant.business_id)), mimetype="text/csv")
+    resp.headers["Content-Disposition"] = "attachment; filename=products.csv"
+    return resp
+
+
 @api_bp.post("/purchases")
 @login_required
 def create_purchase():
-    data = request.json or {}
-    items = data.get("items", [])
-    pids = [i["product_id"] for i in items]
-    owned = {p.id for p in Product.query.filter(
-        Product.id.in_(pids),
-        Product.business_id == current_user.business_id
-    ).all()}
-    if not set(pids).issubset(owned):
-        return jsonify({"error":"One or more items are invalid"}), 400
-
-    purchase = Purchase(
-        user_id=current_user.id,
-        business_id=current_user.business_id,
-        total_cost=sum(i["qty"]*i["unit_cost"] for i in items)
-    )
-    db.session.add(purchase); db.session.flush()
-    for it in items:
-        db.session.add(PurchaseItem(purchase_id=purchase.id, product_id=it["product_id"],
-                                    qty=it["qty"], unit_cost=it["unit_cost"]))
-        db.session.add(StockMovement(user_id=current_user.id, product_id=it["product_id"],
-                                     qty=abs(it["qty"]), type="IN", source="purchase",
-                                     unit_cost=it["unit_cost"]))
-    db.session.commit()
-    return jsonify({"purchase_id": purchase.id})
+    items, error = _document_items("purchases")
+    if error:
+        return error
+    return jsonify({"purchase_id": _write_document("purchases", items)})
 
 @api_bp.get("/activity")
 @login_required
 def recent_activity():
-    limit = int(request.args.get("limit", 10))
+    limit = _page_limit(10)
+    cursor = _decode_cursor(request.args.get("cursor"))
+    if request.args.get("cursor") and cursor is None:
+        return jsonify(CURSOR_ERROR), 400
     q = (db.session.query(StockMovement, Product)
          .join(Product, StockMovement.product_id == Product.id)
-         .filter(Product.business_id == current_user.business_id)
-         .order_by(StockMovement.timestamp.desc())
-         .limit(limit)
-         .all())
+         .filter(StockMovement.business_id == current_tenant.business_id))
+    rows = _keyset(q, StockMovement.timestamp, StockMovement.id, cursor).limit(limit + 1).all()
     out = []
-    for mv, p in q:
+    for mv, p in rows[:limit]:
         out.append({
             "timestamp": mv.timestamp.isoformat(),
             "sku": p.sku, "name": p.name,
             "type": mv.type, "qty": mv.qty
         })
-    return jsonify(out)
+    next_key = None
+    if len(rows) > limit:
+        mv = rows[limit - 1][0]
+        next_key = _encode_cursor(mv.timestamp, mv.id)
+    return _paged(out, next_key)
 
 
 @api_bp.get("/forecast/<int:product_id>")
 @login_required
 def product_forecast(product_id):
+    current_tenant.scope(Product).filter_by(id=product_id).first_or_404()
     return jsonify(forecast_demand(product_id))
 
+@api_bp.get("/forecast")
+@login_required
+def business_forecast():
+    # whole catalog in one pass (?all=1); per product use /forecast/<id>
+    if request.args.get("all") not in ("1", "true"):
+        return jsonify({"error": "pass all=1 or use /api/forecast/<product_id>"}), 400
+    days = _bounded_int(request.args.get("days"), 30, 1, 90)
+    if days is None:
+        return jsonify({"error": "days must be an integer"}), 400
+    if _wants_async():
+        return _accepted(_forecast_job(days))
+    out = forecast_business(current_tenant.business_id, days)
+    return jsonify([{"product_id": pid, **f} for pid, f in out.items()])
+
 @api_bp.post("/sync")
 @login_required
 def sync_batch():
     """
-    Accepts {sales: [...], purchases: [...], products: [...]} created offline.
-    Idempotency key is recommended in production; omitted here for brevity.
+    Accepts {version, since, sales: [...], purchases: [...], products: [...]} created offline.
+    Records carrying a client_id (UUID) are applied at most once per business;
+    the response's cursor is sent back as `since` to pull only what changed.
     """
     payload = request.json or {}
-    created = {"sales": 0, "purchases": 0, "products": 0}
-
-    for p in payload.get("products", []):
-        if not Product.query.filter_by(sku=p["sku"]).first():
-            db.session.add(Product(sku=p["sku"], name=p["name"],
-                                   barcode=p.get("barcode"), reorder_point=p.get("reorder_point",0)))
-            created["products"] += 1
-
-    for s in payload.get("sales", []):
-        items = s["items"]
-        sale = Sale(total_amount=sum(i["qty"]*i["unit_price"] for i in items))
-        db.session.add(sale); db.session.flush()
-        for it in items:
-            db.session.add(SaleItem(sale_id=sale.id, product_id=it["product_id"],
-                                    qty=it["qty"], unit_price=it["unit_price"]))
-            db.session.add(StockMovement(product_id=it["product_id"], qty=-abs(it["qty"]),
-                                         type="OUT", source="sale"))
-        created["sales"] += 1
-
-    for p in payload.get("purchases", []):
-        items = p["items"]
-        purchase = Purchase(total_cost=sum(i["qty"]*i["unit_cost"] for i in items))
-        db.session.add(purchase); db.session.flush()
-        for it in items:
-            db.session.add(PurchaseItem(purchase_id=purchase.id, product_id=it["product_id"],
-                                        qty=it["qty"], unit_cost=it["unit_cost"]))
-            db.session.add(StockMovement(product_id=it["product_id"], qty=abs(it["qty"]),
-                                         type="IN", source="purchase", unit_cost=it["unit_cost"]))
-        created["purchases"] += 1
+    if not isinstance(payload, dict):
+        return jsonify({"error": "expected a JSON object"}), 400
+    if _wants_async():
+        # large offline backlogs: applied by a worker; pull changes with a later sync
+        key = "sync:" + hashlib.sha1(request.get_data()).hexdigest()
+        return _accepted(enqueue("sync", current_tenant.business_id, current_tenant.user_id,
+                                 payload, cache_key=key))
+    now = datetime.utcnow()
 
-    db.session.commit()
-    return jsonify({"created": created})
+    def write():
+        # offline sales already happened: recorded under any stock policy
+        out = apply_sync(current_tenant, payload)
+        db.session.commit()
+        return out
+    result = retry_stale(write, current_app.config.get("STOCK_WRITE_RETRIES", 3))
 
+    since = parse_cursor(payload.get("since"))
+    if since is not None:
+        rows = catalog_changes(current_tenant.business_id, since - SYNC_SLACK)
+        result["changes"] = [{**_product_json(p), "stock": int(qty or 0)} for p, qty in rows]
+    result["cursor"] = now.isoformat()
+    return jsonify(result)
 
+def _wants_async():
+    return request.args.get("async") in ("1", "true")
+
+def _accepted(job):
+    # 202 + where to poll; a re-used job may already be done
+    resp = jsonify(job_json(job))
+    resp.status_code = 202
+    resp.headers["Location"] = url_for("api.get_job", job_id=job.id)
+    return resp
+
+def _forecast_job(days):
+    # same catalog version + day + horizon -> same answer, so re-use the job
+    bid = current_tenant.business_id
+    key = f"forecast_all:{bid}:{days}:{catalog_version(bid)}:{datetime.utcnow().date()}"
+    return enqueue("forecast_all", bid, current_tenant.user_id, {"days": days}, cache_key=key)
+
+@api_bp.post("/jobs")
+@login_required
+def create_job():
+    """
+    Start background work: {"kind": "forecast_all", "days": 30}, or for managers
+    {"kind": "rebuild"} / {"kind": "snapshot", "period": "month"}.
+    """
+    data = request.json or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "expected a JSON object"}), 400
+    kind = data.get("kind")
+    if kind == "forecast_all":
+        days = _bounded_int(data.get("days"), 30, 1, 90)
+        if days is None:
+            return jsonify({"error": "days must be an integer"}), 400
+        return _accepted(_forecast_job(days))
+    if kind in ("rebuild", "snapshot"):
+        if (current_tenant.role or "").lower() != "manager":
+            return jsonify({"error": "managers only"}), 403
+        params = {"period": data.get("period", "month")} if kind == "snapshot" else None
+        if params and params["period"] not in PERIODS:
+            return jsonify({"error": "period must be day or month"}), 400
+        return _accepted(enqueue(kind, current_tenant.business_id, current_tenant.user_id, params))
+    return jsonify({"error": "kind must be forecast_all, rebuild or snapshot"}), 400
+
+@api_bp.get("/jobs")
+@login_required
+def list_jobs():
+    jobs = (current_tenant.scope(Job).order_by(Job.created_at.desc())
+            .limit(_page_limit(20)).all())
+    return jsonify([job_json(j) for j in jobs])
+
+@api_bp.get("/jobs/<int:job_id>")
+@login_required
+def get_job(job_id):
+    job = current_tenant.scope(Job).filter_by(id=job_id).first_or_404()
+    return jsonify(job_json(job, with_result=True))
@@ -0,0 +1,140 @@
+# scripts/check_query_plans.py
+"""
+Query-plan regression check for the /api endpoints.
+
+Builds a throwaway SQLite database from models.py, calls every endpoint through
+the Flask test client, captures each SQL statement it issues and runs
+EXPLAIN QUERY PLAN on it. Any full table scan ("SCAN <table>") is reported and
+the script exits non-zero, so it can gate CI:
+
+    python scripts/check_query_plans.py
+"""
+import os, sys, tempfile
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'plans.db')}"
+os.environ["JOB_RUNNER"] = "external"  # jobs run by the "worker" step below, not a background thread
+
+from sqlalchemy import event, update, func
+from app import create_app
+from extensions import db, create_schema
+from jobs import claim_next, run_job, requeue_stale, prune_jobs
+from snapshots import take_checkpoints, compact_movements
+from inventory import reconcile_balances, rebuild_valuation
+from models import StockMovement
+
+# (method, url, json body); run in order, later calls rely on earlier writes
+ENDPOINTS = [
+    ("post", "/api/products", {"sku": "A-1", "name": "Apple", "opening_stock": 10, "unit_price": 5}),
+    ("post", "/api/products", {"sku": "B-1", "name": "Banana", "reorder_point": 3}),
+    ("post", "/api/sales", {"items": [{"product_id": 1, "qty": 2, "unit_price": 5}]}),
+    ("post", "/api/purchases", {"items": [{"product_id": 2, "qty": 6, "unit_cost": 1}]}),
+    ("post", "/api/sync", {"version": 2, "since": "2000-01-01T00:00:00",
+                           "products": [{"client_id": "p-1", "sku": "C-1", "name": "Cherry"}],
+                           "sales": [{"client_id": "s-1", "items": [{"product_id": 1, "qty": 1, "unit_price": 5}]}]}),
+    ("get", "/api/stock", None),
+    ("get", "/api/valuation", None),
+    ("get", "/api/alerts?days=30", None),
+    ("get", "/api/catalog", None),
+    ("get", "/api/changes", None),
+    ("get", "/api/changes?since=2000-01-01T00:00:00_0", None),
+    ("get", "/api/products", None),
+    ("get", "/api/products/lookup?barcode=0001", None),
+    ("get", "/api/products/lookup?sku=A-1", None),
+    ("get", "/api/products/search?q=aple", None),
+    ("get", "/api/sales_list?limit=1", None),
+    ("get", "/api/sales_list?limit=1&cursor=2999-01-01T00:00:00_999", None),
+    ("get", "/api/sales_list/export", None),
+    ("get", "/api/activity?limit=1", None),
+    ("get", "/api/activity?limit=1&cursor=2999-01-01T00:00:00_999", None),
+    ("get", "/api/sales_summary?days=7", None),
+    ("get", "/api/reports/sales?group_by=week", None),
+    ("get", "/api/reports/sales?group_by=product", None),
+    ("get", "/api/reports/sales?group_by=category", None),
+    ("get", "/api/forecast/1", None),
+    ("get", "/api/forecast?all=1", None),
+    ("post", "/api/jobs", {"kind": "forecast_all"}),
+    ("worker", "claim + run one job", None),
+    ("get", "/api/jobs", None),
+    ("get", "/api/jobs/1", None),
+    ("get", "/api/stock?as_of=2999-01-01", None),
+    # move history two days back, checkpoint the settled days, fold the movements
+    # into them, then read through them
+    ("snapshot", "checkpoint + compact + reconcile", None),
+    ("get", "/api/stock?as_of=2999-01-01T00:00:00", None),
+]
+
+def full_scans(conn, statement, params):
+    cur = conn.cursor()
+    cur.execute("EXPLAIN QUERY PLAN " + statement, params)
+    # detail column, e.g. "SCAN product" / "SEARCH product USING INDEX ..."
+    details = [row[3] for row in cur.fetchall()]
+    return [d for d in details if d.startswith("SCAN ")
+            and not d.startswith(("SCAN CONSTANT ROW", "SCAN (subquery", "SCAN anon_"))]
+
+def main():
+    app = create_app()
+    with app.app_context():
+        create_schema()
+    client = app.test_client()
+    client.post("/auth/register", data={"email": "plans@example.com", "password": "planspw",
+                                        "confirm_password": "planspw", "store_name": "Plans"})
+
+    captured = []
+    with app.app_context():
+        engine = db.engine
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "WITH")):
+            captured.append((statement, parameters))
+
+    failures = 0
+    event.listen(engine, "before_cursor_execute", capture)
+    raw = engine.raw_connection()
+    try:
+        for method, url, body in ENDPOINTS:
+            captured.clear()
+            if method == "worker":
+                with app.app_context():
+                    run_job(claim_next())
+                    requeue_stale()
+                    prune_jobs()
+                status_code = 200
+            elif method == "snapshot":
+                with app.app_context():
+                    # only boundaries SETTLE in the past are checkpointed
+                    db.session.execute(update(StockMovement).where(StockMovement.business_id == 1)
+                                       .values(timestamp=func.datetime(StockMovement.timestamp, "-2 days")))
+                    tomorrow = datetime.utcnow() + timedelta(days=1)
+                    take_checkpoints(1, "day", until=tomorrow)
+                    compact_movements(1, tomorrow)
+                    reconcile_balances(1)
+                    rebuild_valuation(1)
+                    db.session.commit()
+                status_code = 200
+            else:
+                resp = getattr(client, method)(url, json=body) if body is not None else getattr(client, method)(url)
+                _ = resp.get_data()  # drain streamed responses
+                status_code = resp.status_code
+            bad = []
+            for statement, params in captured:
+                for d in full_scans(raw, statement, params):
+                    bad.append((d, " ".join(statement.split())[:160]))
+            status = "ok " if not bad and status_code < 400 else "FAIL"
+            print(f"{status} {method.upper():4} {url} -> {status_code} ({len(captured)} queries)")
+            for d, sql in bad:
+                print(f"       {d}\n         {sql}")
+            failures += bool(bad) or status_code >= 400
+    finally:
+        raw.close()
+        event.remove(engine, "before_cursor_execute", capture)
+
+    if failures:
+        print(f"❌ {failures} endpoint(s) issue full table scans or failed")
+        sys.exit(1)
+    print("✅ every endpoint query uses an index")
+
+if __name__ == "__main__":
+    main()
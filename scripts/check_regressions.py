@@ -0,0 +1,292 @@
+# scripts/check_regressions.py
+"""
+Behaviour checks for bugs that were fixed once and must stay fixed.
+
+Each check gets its own store in a throwaway SQLite database and drives it
+through the Flask test client (or the module it is about). A failing check is
+reported and the script exits non-zero, so it can gate CI like
+check_query_plans.py:
+
+    python scripts/check_regressions.py
+"""
+import os, sys, tempfile, traceback
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'regressions.db')}"
+os.environ["JOB_RUNNER"] = "external"
+
+from sqlalchemy import update
+from app import create_app
+from config import Config, engine_options
+from extensions import db, create_schema, use_business
+from models import User, Product, StockMovement, StockBalance, Job
+from inventory import reconcile_balances, init_balances, bump_catalog_version, StaleBalance
+import snapshots
+import routes_api
+
+CHECKS = []
+
+def check(fn):
+    CHECKS.append(fn)
+    return fn
+
+def _store(app, name):
+    """A logged-in test client for a new store, and its business id."""
+    client = app.test_client()
+    client.post("/auth/register", data={"email": f"{name}@example.com", "password": "checkpw",
+                                        "confirm_password": "checkpw", "store_name": name})
+    with app.app_context():
+        bid = User.query.filter_by(email=f"{name}@example.com").one().business_id
+    return client, bid
+
+def _frozen_utcnow(at):
+    class Frozen(datetime):
+        @classmethod
+        def utcnow(cls):
+            return at
+    return Frozen
+
+@check
+def late_movement_lands_in_checkpoint(app):
+    # a sale stamped just before midnight commits after the 00:02 snapshot run;
+    # the midnight checkpoint must still include it (snapshots.SETTLE)
+    client, bid = _store(app, "late")
+    pid = client.post("/api/products", json={"sku": "L-1", "name": "Late", "opening_stock": 10}).get_json()["id"]
+    midnight = datetime.combine(datetime.utcnow().date() + timedelta(days=1), datetime.min.time())
+    real = snapshots.datetime
+    try:
+        with app.app_context():
+            use_business(bid)
+            snapshots.datetime = _frozen_utcnow(midnight + timedelta(minutes=2))
+            snapshots.take_checkpoints(bid, "day")
+            db.session.commit()
+        client.post("/api/sales", json={"items": [{"product_id": pid, "qty": 3, "unit_price": 1}]})
+        with app.app_context():
+            use_business(bid)
+            db.session.execute(update(StockMovement)
+                               .where(StockMovement.business_id == bid, StockMovement.source == "sale")
+                               .values(timestamp=midnight - timedelta(seconds=2)))
+            snapshots.datetime = _frozen_utcnow(midnight + timedelta(minutes=10))
+            snapshots.take_checkpoints(bid, "day")
+            db.session.commit()
+    finally:
+        snapshots.datetime = real
+    with app.app_context():
+        use_business(bid)
+        cp = snapshots.checkpoint_at(bid, midnight)
+        assert cp is not None and cp.taken_at == midnight, "no checkpoint at midnight"
+        assert snapshots.stock_as_of(bid, midnight) == {pid: 7}, snapshots.stock_as_of(bid, midnight)
+        # folding the movements into the checkpoint must not lose the sale
+        snapshots.compact_movements(bid, midnight)
+        db.session.commit()
+        assert reconcile_balances(bid) == [], "balances drifted after compaction"
+        assert StockBalance.query.filter_by(product_id=pid).one().qty == 7
+
+@check
+def bad_cursor_is_refused(app):
+    # an undecodable ?cursor= used to restart at page 1, duplicating rows under "load more"
+    client, _ = _store(app, "cursor")
+    pid = client.post("/api/products", json={"sku": "C-1", "name": "Cursor", "opening_stock": 10}).get_json()["id"]
+    for _ in range(3):
+        client.post("/api/sales", json={"items": [{"product_id": pid, "qty": 1, "unit_price": 1}]})
+    for url in ("/api/sales_list?limit=2", "/api/activity?limit=2"):
+        first = client.get(url)
+        assert first.status_code == 200 and first.headers.get("X-Next-Cursor"), url
+        nxt = client.get(f"{url}&cursor={first.headers['X-Next-Cursor']}")
+        assert nxt.status_code == 200, url
+        seen = [r.get("id", r.get("timestamp")) for r in first.get_json() + nxt.get_json()]
+        assert len(seen) == len(set(seen)), f"{url}: pages overlap"
+        for bad in ("garbage", "2026-01-01T00:00:00_x", "_1"):
+            resp = client.get(f"{url}&cursor={bad}")
+            assert resp.status_code == 400, f"{url}&cursor={bad} -> {resp.status_code}"
+
+@check
+def malformed_document_is_refused(app):
+    # sales/purchases with missing, non-integer or negative quantities used to 500
+    # or be written with totals that disagree with the stock movements
+    client, _ = _store(app, "docs")
+    pid = client.post("/api/products", json={"sku": "D-1", "name": "Doc", "opening_stock": 10}).get_json()["id"]
+    for url, price in (("/api/sales", "unit_price"), ("/api/purchases", "unit_cost")):
+        for body in ([1], {}, {"items": [{"product_id": pid}]},
+                     {"items": [{"product_id": pid, "qty": "2", price: 1}]},
+                     {"items": [{"product_id": pid, "qty": -2, price: 1}]}):
+            resp = client.post(url, json=body)
+            assert resp.status_code == 400, f"{url} {body} -> {resp.status_code}"
+        assert client.post(url, json={"items": [{"product_id": pid, "qty": 1, price: 1}]}).status_code == 200, url
+    stock = {p["product_id"]: p["stock"] for p in client.get("/api/stock").get_json()}
+    assert stock[pid] == 10, stock
+
+@check
+def lost_balance_race_is_retryable(app):
+    # a write that lost every retry_stale attempt used to surface as a 500
+    client, _ = _store(app, "stale")
+    pid = client.post("/api/products", json={"sku": "S-1", "name": "Stale", "opening_stock": 10}).get_json()["id"]
+    def stale(*args, **kwargs):
+        raise StaleBalance()
+    real = routes_api.write_documents, routes_api.apply_sync
+    routes_api.write_documents = routes_api.apply_sync = stale
+    try:
+        for url, body in (("/api/sales", {"items": [{"product_id": pid, "qty": 1, "unit_price": 1}]}),
+                          ("/api/purchases", {"items": [{"product_id": pid, "qty": 1, "unit_cost": 1}]}),
+                          ("/api/sync", {"sales": []})):
+            resp = client.post(url, json=body)
+            assert resp.status_code == 409 and resp.headers.get("Retry-After"), f"{url} -> {resp.status_code}"
+    finally:
+        routes_api.write_documents, routes_api.apply_sync = real
+    assert client.post("/api/sales", json={"items": [{"product_id": pid, "qty": 1, "unit_price": 1}]}).status_code == 200
+
+@check
+def undecodable_import_line_is_reported(app):
+    # a non-UTF-8 line used to 500 mid-import, after earlier chunks were committed
+    client, _ = _store(app, "latin")
+    good = b"".join(f"U-{i},Item {i},1\n".encode() for i in range(3))
+    bad = "U-X,Caf\xe9,1\n".encode("latin-1")
+    for fmt, body in (("csv", b"sku,name,stock\n" + good + bad + b"U-Z,Last,1\n"),
+                      ("jsonl", b'{"sku": "J-1", "name": "One"}\n' + bad + b'{"sku": "J-2", "name": "Two"}\n')):
+        resp = client.post(f"/api/products/import?format={fmt}", data=body, content_type="text/plain")
+        assert resp.status_code == 201, f"{fmt} -> {resp.status_code}"
+        report = resp.get_json()
+        assert [e["row"] for e in report["errors"]] == ([4] if fmt == "csv" else [2]), report
+        assert report["created"] == (4 if fmt == "csv" else 2), report
+
+@check
+def alerts_refresh_runs_once_a_day(app):
+    # GET /api/alerts re-ran the forecast once JOB_RESULT_TTL had passed, and
+    # queued a new refresh on every request while the last one had failed
+    client, bid = _store(app, "alerts")
+    def refreshes():
+        with app.app_context():
+            return Job.query.filter_by(business_id=bid, kind="refresh_reorder").all()
+    for status, ago, expected in (("done", timedelta(hours=5), 1), ("failed", timedelta(minutes=1), 1),
+                                  ("failed", timedelta(hours=1), 2)):
+        assert client.get("/api/alerts").status_code == 200
+        with app.app_context():
+            job = Job.query.filter_by(business_id=bid, kind="refresh_reorder").order_by(Job.id.desc()).first()
+            job.status, job.finished_at = status, datetime.utcnow() - ago
+            db.session.commit()
+        assert client.get("/api/alerts").status_code == 200
+        assert len(refreshes()) == expected, f"{status} {ago} ago: {len(refreshes())} refresh jobs"
+
+@check
+def malformed_sync_record_is_rejected(app):
+    # one malformed offline record used to fail the whole /api/sync batch with a 500
+    client, _ = _store(app, "sync")
+    pid = client.post("/api/products", json={"sku": "Y-1", "name": "Sync", "opening_stock": 10}).get_json()["id"]
+    assert client.post("/api/sync", json=[{"sales": []}]).status_code == 400
+    resp = client.post("/api/sync", json={
+        "products": [{"sku": "", "name": "No SKU"}],
+        "sales": ["not a record",
+                  {"client_id": "bad-qty", "items": [{"product_id": pid, "qty": "2", "unit_price": 1}]},
+                  {"client_id": "ok", "items": [{"product_id": pid, "qty": 2, "unit_price": 1}]}],
+        "purchases": {"items": []},
+    })
+    assert resp.status_code == 200, resp.status_code
+    rejected = resp.get_json()["rejected"]
+    assert len(rejected) == 4 and {"client_id": "bad-qty", "error": "items[0].qty must be a positive integer"} in rejected, rejected
+    stock = {p["product_id"]: p["stock"] for p in client.get("/api/stock").get_json()}
+    assert stock[pid] == 8, stock
+
+@check
+def non_integer_days_is_refused(app):
+    # ?days=abc raised ValueError -> 500
+    client, _ = _store(app, "days")
+    for url in ("/api/forecast?all=1&days=abc", "/api/sales_summary?days=abc", "/api/alerts?days=abc"):
+        resp = client.get(url)
+        assert resp.status_code == 400, f"{url} -> {resp.status_code}"
+    assert client.get("/api/forecast?all=1&days=14").status_code == 200
+    assert client.get("/api/sales_summary?days=30").status_code == 200
+    assert client.get("/api/alerts?days=14").status_code == 200
+
+@check
+def in_memory_database_starts(app):
+    # sqlite:// (one-off scripts, experiments) failed in create_app: StaticPool takes no pool sizing
+    saved = Config.SQLALCHEMY_DATABASE_URI, Config.SQLALCHEMY_ENGINE_OPTIONS
+    Config.SQLALCHEMY_DATABASE_URI, Config.SQLALCHEMY_ENGINE_OPTIONS = "sqlite://", engine_options("sqlite://")
+    try:
+        mem = create_app()
+    finally:
+        Config.SQLALCHEMY_DATABASE_URI, Config.SQLALCHEMY_ENGINE_OPTIONS = saved
+    with mem.app_context():
+        create_schema()
+    client, _ = _store(mem, "memory")
+    pid = client.post("/api/products", json={"sku": "M-1", "name": "Memory", "opening_stock": 4}).get_json()["id"]
+    assert client.post("/api/sales", json={"items": [{"product_id": pid, "qty": 1, "unit_price": 1}]}).status_code == 200
+    assert [p["stock"] for p in client.get("/api/stock").get_json()] == [3]
+
+@check
+def bad_job_body_is_refused(app):
+    # POST /api/jobs with a non-object body or "days": "abc" raised -> 500
+    client, _ = _store(app, "jobs")
+    for body in ([1], "forecast_all", {"kind": "forecast_all", "days": "abc"}, {"kind": "nope"}):
+        resp = client.post("/api/jobs", json=body)
+        assert resp.status_code == 400, f"{body} -> {resp.status_code}"
+    assert client.post("/api/jobs", json={"kind": "forecast_all", "days": 7}).status_code == 202
+
+@check
+def late_committed_product_is_searchable(app):
+    # the search index caught up by id > last seen id, so a product committed
+    # after one with a higher id (concurrent writers) was never indexed
+    client, bid = _store(app, "search")
+    first = client.post("/api/products", json={"sku": "Q-1", "name": "Quince"}).get_json()["id"]
+    with app.app_context():
+        use_business(bid)
+        uid = User.query.filter_by(email="search@example.com").one().id
+        db.session.add(Product(id=first + 5, user_id=uid, business_id=bid, sku="Q-5", name="Quinoa"))
+        init_balances(bid, {first + 5: 0})
+        bump_catalog_version(bid)
+        db.session.commit()
+    assert {p["sku"] for p in client.get("/api/products/search?q=qui").get_json()} == {"Q-1", "Q-5"}
+    with app.app_context():     # commits now, with the lower id
+        use_business(bid)
+        db.session.add(Product(id=first + 2, user_id=uid, business_id=bid, sku="Q-2", name="Quiche"))
+        init_balances(bid, {first + 2: 0})
+        bump_catalog_version(bid)
+        db.session.commit()
+    found = {p["sku"] for p in client.get("/api/products/search?q=qui").get_json()}
+    assert found == {"Q-1", "Q-2", "Q-5"}, found
+
+@check
+def failed_statement_leaves_no_profiling_state(app):
+    # with PROFILING on, a statement that raised left its start time on the
+    # connection, so every pooled connection grew a stack of them
+    saved = Config.PROFILING
+    Config.PROFILING = True
+    try:
+        prof = create_app()
+    finally:
+        Config.PROFILING = saved
+    client, _ = _store(prof, "profiling")
+    with prof.app_context():
+        with db.engine.connect() as conn:
+            for _ in range(3):
+                try:
+                    conn.exec_driver_sql("SELECT * FROM no_such_table")
+                except Exception:
+                    conn.rollback()
+            conn.exec_driver_sql("SELECT 1")
+            assert not conn.info.get("query_start"), conn.info
+    resp = client.get("/api/stock")
+    assert resp.status_code == 200 and "db;dur=" in resp.headers.get("Server-Timing", ""), resp.headers
+
+def main():
+    app = create_app()
+    with app.app_context():
+        create_schema()
+    failures = 0
+    for fn in CHECKS:
+        try:
+            fn(app)
+            print(f"ok   {fn.__name__}")
+        except Exception:
+            failures += 1
+            print(f"FAIL {fn.__name__}")
+            print("       " + traceback.format_exc().strip().replace("\n", "\n       "))
+    if failures:
+        print(f"❌ {failures} of {len(CHECKS)} regression check(s) failed")
+        sys.exit(1)
+    print(f"✅ all {len(CHECKS)} regression checks pass")
+
+if __name__ == "__main__":
+    main()
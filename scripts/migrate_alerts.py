@@ -0,0 +1,54 @@
+# scripts/migrate_alerts.py
+# Adds the reorder-alert columns on stock_balance, the alert indexes declared
+# in models.py, and computes needs_reorder for existing rows. Safe to re-run.
+from sqlalchemy import text
+from app import create_app
+from extensions import db
+from inventory import refresh_reorder_flags
+
+app = create_app()
+
+COLUMNS = {
+    # (table, column): DDL type
+    ("stock_balance", "suggested_reorder"): "INTEGER NOT NULL DEFAULT 0",
+    ("stock_balance", "needs_reorder"): "BOOLEAN NOT NULL DEFAULT 0",
+}
+
+INDEXES = {
+    # name: (table, columns)
+    "ix_stock_balance_business_reorder": ("stock_balance", "business_id, needs_reorder"),
+    "ix_product_business_expiry": ("product", "business_id, expiry_date"),
+}
+
+def column_exists(table: str, column: str) -> bool:
+    rows = db.session.execute(text(f"PRAGMA table_info({table});")).fetchall()
+    return any(r[1] == column for r in rows)  # r[1] is the column name
+
+def index_exists(name: str) -> bool:
+    row = db.session.execute(
+        text("SELECT name FROM sqlite_master WHERE type='index' AND name=:n"),
+        {"n": name},
+    ).fetchone()
+    return bool(row)
+
+with app.app_context():
+    for (tbl, col), ddl in COLUMNS.items():
+        if not column_exists(tbl, col):
+            db.session.execute(text(f"ALTER TABLE {tbl} ADD COLUMN {col} {ddl};"))
+            print(f"✅ added {tbl}.{col}")
+    db.session.commit()  # commit DDL before proceeding
+
+    for name, (tbl, cols) in INDEXES.items():
+        if index_exists(name):
+            continue
+        db.session.execute(text(f"CREATE INDEX {name} ON {tbl} ({cols});"))
+        print(f"✅ created {name} on {tbl}({cols})")
+    db.session.commit()
+
+    refresh_reorder_flags()
+    db.session.commit()
+    print("✅ flagged products that need reordering (forecast suggestions fill in on first /api/alerts of the day)")
+
+    db.session.execute(text("ANALYZE;"))
+    db.session.commit()
+    print("🎉 migration complete")
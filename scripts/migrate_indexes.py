@@ -0,0 +1,33 @@
+# scripts/migrate_indexes.py
+# Adds the performance indexes declared in models.py to an existing app.db
+# (db.create_all only creates indexes for tables it creates). Safe to re-run.
+from sqlalchemy import text
+from app import create_app
+from extensions import db
+
+app = create_app()
+
+INDEXES = {
+    # name: (table, columns)
+    "ix_sale_business_ts": ("sale", "business_id, timestamp"),
+    "ix_stock_movement_product_type_ts": ("stock_movement", "product_id, type, timestamp"),
+}
+
+def index_exists(name: str) -> bool:
+    row = db.session.execute(
+        text("SELECT name FROM sqlite_master WHERE type='index' AND name=:n"),
+        {"n": name},
+    ).fetchone()
+    return bool(row)
+
+with app.app_context():
+    for name, (tbl, cols) in INDEXES.items():
+        if index_exists(name):
+            continue
+        db.session.execute(text(f"CREATE INDEX {name} ON {tbl} ({cols});"))
+        print(f"✅ created {name} on {tbl}({cols})")
+    db.session.commit()
+
+    db.session.execute(text("ANALYZE;"))
+    db.session.commit()
+    print("🎉 indexes up to date")
@@ -0,0 +1,29 @@
+# scripts/migrate_search.py
+# Adds the (business_id, barcode) index behind /api/products/lookup. Safe to re-run.
+from sqlalchemy import text
+from app import create_app
+from extensions import db
+
+app = create_app()
+
+INDEXES = {
+    # name: (table, columns)
+    "ix_product_business_barcode": ("product", "business_id, barcode"),
+}
+
+def index_exists(name: str) -> bool:
+    row = db.session.execute(
+        text("SELECT name FROM sqlite_master WHERE type='index' AND name=:n"),
+        {"n": name},
+    ).fetchone()
+    return bool(row)
+
+with app.app_context():
+    for name, (tbl, cols) in INDEXES.items():
+        if index_exists(name):
+            continue
+        db.session.execute(text(f"CREATE INDEX {name} ON {tbl} ({cols});"))
+        print(f"✅ created {name} on {tbl}({cols})")
+    db.session.execute(text("ANALYZE;"))
+    db.session.commit()
+    print("🎉 migration complete")
@@ -0,0 +1,34 @@
+# scripts/migrate_stock_guard.py
+# Adds business.stock_policy and the stock_balance.version counter used by the
+# conditional stock UPDATE. Safe to re-run.
+from sqlalchemy import text
+from app import create_app
+from extensions import db
+
+app = create_app()
+
+COLUMNS = {
+    # (table, column): DDL type
+    ("business", "stock_policy"): "VARCHAR(10) NOT NULL DEFAULT 'reject'",
+    ("stock_balance", "version"): "INTEGER NOT NULL DEFAULT 0",
+}
+
+def column_exists(table: str, column: str) -> bool:
+    rows = db.session.execute(text(f"PRAGMA table_info({table});")).fetchall()
+    return any(r[1] == column for r in rows)  # r[1] is the column name
+
+with app.app_context():
+    for (tbl, col), ddl in COLUMNS.items():
+        if not column_exists(tbl, col):
+            db.session.execute(text(f"ALTER TABLE {tbl} ADD COLUMN {col} {ddl};"))
+            print(f"✅ added {tbl}.{col}")
+    db.session.commit()
+
+    # businesses already below zero can't sell those products until stock is
+    # received or counted; POST /admin/stock-policy {"stock_policy": "allow"} opts out
+    rows = db.session.execute(text(
+        "SELECT b.name, COUNT(*) FROM stock_balance sb JOIN business b ON b.id = sb.business_id "
+        "WHERE sb.qty < 0 AND b.stock_policy = 'reject' GROUP BY b.id")).fetchall()
+    for name, n in rows:
+        print(f"⚠️  {name}: {n} product(s) below zero; sales of them are now rejected")
+    print("🎉 migration complete")
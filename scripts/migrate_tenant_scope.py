@@ -0,0 +1,63 @@
+# scripts/migrate_tenant_scope.py
+# Denormalizes business_id onto stock_movement and sale_item and adds the
+# tenant-scoped composite indexes declared in models.py. Safe to re-run.
+from sqlalchemy import text
+from app import create_app
+from extensions import db
+
+app = create_app()
+
+INDEXES = {
+    # name: (table, columns)
+    "ix_stock_movement_business_product_ts": ("stock_movement", "business_id, product_id, timestamp"),
+    "ix_stock_movement_business_ts": ("stock_movement", "business_id, timestamp"),
+    "ix_stock_movement_product_type_ts": ("stock_movement", "product_id, type, timestamp"),
+    "ix_sale_item_sale_id": ("sale_item", "sale_id"),
+    "ix_sale_item_business_product": ("sale_item", "business_id, product_id"),
+    "ix_product_business_sku": ("product", "business_id, sku"),
+}
+
+def column_exists(table: str, column: str) -> bool:
+    rows = db.session.execute(text(f"PRAGMA table_info({table});")).fetchall()
+    return any(r[1] == column for r in rows)  # r[1] is the column name
+
+def index_exists(name: str) -> bool:
+    row = db.session.execute(
+        text("SELECT name FROM sqlite_master WHERE type='index' AND name=:n"),
+        {"n": name},
+    ).fetchone()
+    return bool(row)
+
+with app.app_context():
+    # 1) Add business_id columns if missing
+    for tbl in ("stock_movement", "sale_item"):
+        if not column_exists(tbl, "business_id"):
+            db.session.execute(text(f"ALTER TABLE {tbl} ADD COLUMN business_id INTEGER REFERENCES business(id);"))
+            print(f"✅ added {tbl}.business_id")
+    db.session.commit()  # commit DDL before proceeding
+
+    # 2) Backfill from the owning rows
+    db.session.execute(text("""
+        UPDATE stock_movement
+           SET business_id = (SELECT business_id FROM product WHERE product.id = stock_movement.product_id)
+         WHERE business_id IS NULL
+    """))
+    db.session.execute(text("""
+        UPDATE sale_item
+           SET business_id = (SELECT business_id FROM sale WHERE sale.id = sale_item.sale_id)
+         WHERE business_id IS NULL
+    """))
+    db.session.commit()
+    print("✅ backfilled business_id on stock_movement and sale_item")
+
+    # 3) Composite indexes
+    for name, (tbl, cols) in INDEXES.items():
+        if index_exists(name):
+            continue
+        db.session.execute(text(f"CREATE INDEX {name} ON {tbl} ({cols});"))
+        print(f"✅ created {name} on {tbl}({cols})")
+    db.session.commit()
+
+    db.session.execute(text("ANALYZE;"))
+    db.session.commit()
+    print("🎉 migration complete")
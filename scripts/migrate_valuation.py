@@ -0,0 +1,31 @@
+# scripts/migrate_valuation.py
+# Adds the cost columns used by the valuation engine (stock_balance.avg_cost,
+# sale_item.unit_cost) and backfills them by replaying stock_movement once.
+# Safe to re-run: only sale items still missing a cost are filled in.
+from sqlalchemy import text
+from app import create_app
+from extensions import db
+from inventory import rebuild_valuation
+
+app = create_app()
+
+COLUMNS = {
+    # (table, column): DDL type
+    ("stock_balance", "avg_cost"): "FLOAT NOT NULL DEFAULT 0",
+    ("sale_item", "unit_cost"): "FLOAT",
+}
+
+def column_exists(table: str, column: str) -> bool:
+    rows = db.session.execute(text(f"PRAGMA table_info({table});")).fetchall()
+    return any(r[1] == column for r in rows)  # r[1] is the column name
+
+with app.app_context():
+    for (tbl, col), ddl in COLUMNS.items():
+        if not column_exists(tbl, col):
+            db.session.execute(text(f"ALTER TABLE {tbl} ADD COLUMN {col} {ddl};"))
+            print(f"✅ added {tbl}.{col}")
+    db.session.commit()  # commit DDL before proceeding
+
+    balances, items = rebuild_valuation()
+    print(f"✅ average cost set on {balances} balance(s), COGS on {items} sale item(s)")
+    print("🎉 migration complete")
@@ -0,0 +1,169 @@
+# search.py
+"""
+Product search for the POS picker: prefix and typo-tolerant matching on name
+and SKU without shipping the catalog to the browser. Scanned barcodes are exact
+lookups on the (business_id, barcode) index instead (/api/products/lookup).
+
+Each business gets an in-process ProductIndex. Every normalized word is kept in
+a sorted list, so a bisect range is a prefix match (what a trie walk gives,
+without a node per character). One-typo matches use symmetric deletes: a word
+and a query within one edit share a variant with at most one character removed,
+so a dict of those variants finds the candidates and a distance check confirms.
+A multi-word query scores its rarest word first and checks the others only
+against those products.
+Only alphabetic words get typo matches; one digit off in a SKU or barcode is
+another product.
+
+Products are never renamed or deleted, so an index only ever adds rows. Each
+search reads the catalog version (one primary-key read, bumped with every
+product or stock write, in any process); when it has moved, the index re-reads
+the products whose balance row was stamped since its last catch-up, less
+SYNC_SLACK, as /api/changes does. Ids alone aren't enough: a product can commit
+after one with a higher id. invalidate_search() forces a full rebuild;
+SEARCH_INDEX_SIZE businesses are kept (LRU).
+"""
+import heapq, re, threading
+from bisect import bisect_left
+from collections import OrderedDict, defaultdict
+from datetime import datetime
+from extensions import db
+from models import Product, StockBalance
+from inventory import catalog_version
+from sync import SYNC_SLACK
+
+FUZZY_MIN = 4       # shorter words only match by prefix; one typo in "tea" is another word
+_WORD = re.compile(r"\w+")
+_lock = threading.Lock()
+_indexes = OrderedDict()        # business_id -> ProductIndex
+_settings = {"size": 32}
+
+def words(text):
+    return _WORD.findall((text or "").casefold())
+
+def _deletes(word):
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+def _within_one_edit(a, b):
+    # Levenshtein distance <= 1, plus one adjacent swap ("cofee", "cfoee")
+    if a == b:
+        return True
+    la, lb = len(a), len(b)
+    if abs(la - lb) > 1:
+        return False
+    i = 0
+    while i < min(la, lb) and a[i] == b[i]:
+        i += 1
+    if la == lb:
+        return a[i + 1:] == b[i + 1:] or (a[i:i + 2] == b[i:i + 2][::-1] and a[i + 2:] == b[i + 2:])
+    return a[i + 1:] == b[i:] if la > lb else a[i:] == b[i + 1:]
+
+class ProductIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None                 # catalog version the index is current with
+        self.synced_at = None               # when it last caught up (UTC)
+        self.postings = defaultdict(set)    # word -> product ids
+        self.sorted_words = []
+        self.variants = defaultdict(set)    # word with one char deleted -> words
+        self.doc_words = {}                 # product id -> its words
+        self.names = {}                     # product id -> casefolded name (tie-break order)
+        self.skus = {}                      # casefolded sku -> product ids
+
+    def add(self, rows):
+        new_words = False
+        for pid, sku, name in rows:
+            self.names[pid] = (name or "").casefold()
+            self.skus.setdefault((sku or "").casefold(), set()).add(pid)
+            doc = self.doc_words[pid] = tuple({*words(name), *words(sku)})
+            for w in doc:
+                if w not in self.postings:
+                    new_words = True
+                    if len(w) >= FUZZY_MIN and w.isalpha():
+                        for v in _deletes(w):
+                            self.variants[v].add(w)
+                self.postings[w].add(pid)
+        if new_words:
+            self.sorted_words = sorted(self.postings)
+
+    def _prefixed(self, term):
+        i = bisect_left(self.sorted_words, term)
+        while i < len(self.sorted_words) and self.sorted_words[i].startswith(term):
+            yield self.sorted_words[i]
+            i += 1
+
+    def _matches(self, term):
+        """{word: 3 exact, 2 prefix, 1 one typo away} for one query word."""
+        out = {w: 3 if w == term else 2 for w in self._prefixed(term)}
+        if len(term) >= FUZZY_MIN and term.isalpha():
+            near = set(self.variants.get(term, ()))
+            for v in _deletes(term):
+                near.add(v)
+                near |= self.variants.get(v, set())
+            for w in near:
+                if w not in out and w in self.postings and _within_one_edit(term, w):
+                    out[w] = 1
+        return out
+
+    def search(self, query, limit):
+        terms = words(query)
+        if not terms:
+            return []
+        with self.lock:
+            matched = [self._matches(t) for t in terms]
+            # rarest query word first; the others are checked against its products only
+            matched.sort(key=lambda m: sum(len(self.postings[w]) for w in m))
+            total = {}
+            for w, s in matched[0].items():
+                for pid in self.postings[w]:
+                    if total.get(pid, 0) < s:
+                        total[pid] = s
+            for m in matched[1:]:   # every query word must match
+                scored = {}
+                for pid, s in total.items():
+                    best = max((m.get(w, 0) for w in self.doc_words[pid]), default=0)
+                    if best:
+                        scored[pid] = s + best
+                total = scored
+                if not total:
+                    return []
+            for pid in self.skus.get(query.strip().casefold(), ()):
+                if pid in total:
+                    total[pid] += 10     # typed or scanned the whole SKU
+            return heapq.nsmallest(limit, total, key=lambda pid: (-total[pid], self.names[pid], pid))
+
+def _catch_up(business_id, index):
+    version, now = catalog_version(business_id), datetime.utcnow()   # before the rows: a later write moves it again
+    if version == index.version:
+        return
+    q = db.session.query(Product.id, Product.sku, Product.name).filter(Product.business_id == business_id)
+    if index.synced_at is not None:
+        q = (q.join(StockBalance, StockBalance.product_id == Product.id)
+             .filter(StockBalance.business_id == business_id,
+                     StockBalance.updated_at > index.synced_at - SYNC_SLACK))
+    rows = q.order_by(Product.id).all()
+    with index.lock:
+        index.add(rows)
+        index.version, index.synced_at = version, now
+
+def search_products(business_id, query, limit=10):
+    """Product ids matching `query`, best first."""
+    with _lock:
+        index = _indexes.get(business_id)
+        if index is None:
+            index = _indexes[business_id] = ProductIndex()
+        _indexes.move_to_end(business_id)
+        while len(_indexes) > _settings["size"]:
+            _indexes.popitem(last=False)
+    _catch_up(business_id, index)
+    return index.search(query, limit)
+
+def invalidate_search(business_id=None):
+    """Drop one business's index, or all of them when business_id is None."""
+    with _lock:
+        if business_id is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(business_id, None)
+
+def init_search(app):
+    _settings["size"] = app.config.get("SEARCH_INDEX_SIZE", 32)
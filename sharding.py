@@ -0,0 +1,71 @@
+# sharding.py
+"""
+Split a shared SQLite app.db into per-business shards (`python manage.py split-shards`).
+
+The source file is only read. OUT_DIR receives control.db (users, businesses,
+jobs) and one business_<id>.db per business holding that business's rows of
+every other table, ids unchanged. Stop the app while splitting, then point it
+at the result:
+
+    DATABASE_URL=sqlite:///OUT_DIR/control.db SHARD_DIR=OUT_DIR
+
+Rows are copied inside SQLite (ATTACH + INSERT ... SELECT), one shard at a time.
+"""
+import os, sqlite3
+from sqlalchemy import create_engine
+from extensions import db, tenant_tables, control_tables, shard_path
+import models  # noqa: F401  every table registered on db.metadata
+
+# tables without a business_id column follow their parent row
+PARENTS = {"purchase_item": ("purchase_id", "purchase"),
+           "stock_snapshot": ("checkpoint_id", "stock_checkpoint")}
+
+def _create(path, tables):
+    engine = create_engine(f"sqlite:///{path}")
+    db.metadata.create_all(engine, tables=tables)
+    engine.dispose()
+
+def _copy(conn, table, where="", params=()):
+    cols = ", ".join(f'"{c.name}"' for c in table.columns)
+    return conn.execute(f'INSERT INTO shard."{table.name}" ({cols}) '
+                        f'SELECT {cols} FROM main."{table.name}" {where}', params).rowcount
+
+def _into(conn, path, tables, rows_of):
+    """Create `path` with `tables` and fill each from rows_of(table) -> (where, params)."""
+    _create(path, tables)
+    conn.execute("ATTACH DATABASE ? AS shard", (path,))
+    try:
+        conn.execute("BEGIN")
+        copied = sum(_copy(conn, t, *rows_of(t)) for t in tables)
+        conn.execute("COMMIT")
+    finally:
+        conn.execute("DETACH DATABASE shard")
+    return copied
+
+def _business_rows(business_id):
+    def rows_of(table):
+        if table.name in PARENTS:
+            fk, parent = PARENTS[table.name]
+            return f'WHERE "{fk}" IN (SELECT id FROM main."{parent}" WHERE business_id = ?)', (business_id,)
+        return "WHERE business_id = ?", (business_id,)
+    return rows_of
+
+def split_database(source, out_dir):
+    """
+    Copy the SQLite file `source` into shards under out_dir.
+    Returns ({business_id: rows copied}, tenant rows that belong to no business).
+    """
+    control = os.path.join(out_dir, "control.db")
+    if os.path.exists(control):
+        raise FileExistsError(f"{control} already exists")
+    os.makedirs(out_dir, exist_ok=True)
+    conn = sqlite3.connect(source, isolation_level=None)
+    try:
+        _into(conn, control, control_tables(), lambda t: ("", ()))
+        counts = {}
+        for (bid,) in conn.execute("SELECT id FROM business ORDER BY id").fetchall():
+            counts[bid] = _into(conn, shard_path(out_dir, bid), tenant_tables(), _business_rows(bid))
+        total = sum(conn.execute(f'SELECT COUNT(*) FROM "{t.name}"').fetchone()[0] for t in tenant_tables())
+    finally:
+        conn.close()
+    return counts, total - sum(counts.values())
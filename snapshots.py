@@ -0,0 +1,135 @@
+# snapshots.py
+"""
+Point-in-time stock: checkpoints of every product's on-hand quantity and
+average cost at a UTC day or month boundary.
+
+stock_as_of(ts) starts from the newest checkpoint at or before ts and adds only
+the movements since, so the cost is one checkpoint read plus a
+(business_id, timestamp) index range, however long the history is.
+
+Checkpoints are written by `python manage.py snapshot` or the "snapshot" job.
+Each one is the previous checkpoint plus the movements in between, replayed
+like inventory.rebuild_valuation. Movements are stamped with server time when
+they are written, so a boundary in the past doesn't move once it's taken; it is
+only taken SETTLE after it passed (as reports.py closes periods), because a
+movement stamped just before it may commit just after.
+
+compact_movements() deletes the movements older than a checkpoint, which then
+stands in for them (reconcile_balances and rebuild_valuation start from it).
+Stock before that checkpoint can only be read at the older checkpoints
+themselves.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import func, insert
+from extensions import db
+from models import StockMovement, StockCheckpoint, StockSnapshot
+from inventory import _average_in
+from reports import SETTLE
+
+PERIODS = ("day", "month")
+
+class CompactedHistory(ValueError):
+    """The movements needed to answer an as-of query were compacted away."""
+
+def _next_boundary(ts, period):
+    if period == "day":
+        return datetime(ts.year, ts.month, ts.day) + timedelta(days=1)
+    return datetime(ts.year + ts.month // 12, ts.month % 12 + 1, 1)
+
+def boundaries(after, until, period):
+    """UTC day/month starts strictly after `after`, up to and including `until`."""
+    out, ts = [], _next_boundary(after, period)
+    while ts <= until:
+        out.append(ts)
+        ts = _next_boundary(ts, period)
+    return out
+
+def checkpoint_at(business_id, at):
+    """Newest checkpoint taken at or before `at` (None if there is none)."""
+    return (StockCheckpoint.query
+            .filter(StockCheckpoint.business_id == business_id, StockCheckpoint.taken_at <= at)
+            .order_by(StockCheckpoint.taken_at.desc()).first())
+
+def _compacted_before(business_id):
+    return (db.session.query(func.max(StockCheckpoint.taken_at))
+            .filter(StockCheckpoint.business_id == business_id,
+                    StockCheckpoint.compacted.is_(True)).scalar())
+
+def _snapshot_rows(checkpoint):
+    return {pid: [qty, avg] for pid, qty, avg in
+            db.session.query(StockSnapshot.product_id, StockSnapshot.qty, StockSnapshot.avg_cost)
+            .filter(StockSnapshot.checkpoint_id == checkpoint.id)}
+
+def take_checkpoints(business_id, period="month", until=None):
+    """
+    Write every missing `period` checkpoint after the newest one, up to `until`
+    (default and latest: SETTLE ago). Returns the number of checkpoints written;
+    the caller commits.
+    """
+    settled = datetime.utcnow() - SETTLE
+    until = min(until, settled) if until else settled
+    last = checkpoint_at(business_id, until)
+    if last is not None:
+        start, state = last.taken_at, _snapshot_rows(last)
+    else:
+        first = (db.session.query(func.min(StockMovement.timestamp))
+                 .filter(StockMovement.business_id == business_id).scalar())
+        if first is None:
+            return 0
+        start, state = first, {}
+    todo = boundaries(start, until, period)
+    if not todo:
+        return 0
+
+    window_start, written = start, 0
+    for boundary in todo:
+        # one index range per window, replayed in the order rebuild_valuation uses
+        for pid, qty, cost in (db.session.query(StockMovement.product_id, StockMovement.qty,
+                                                StockMovement.unit_cost)
+                               .filter(StockMovement.business_id == business_id,
+                                       StockMovement.timestamp >= window_start,
+                                       StockMovement.timestamp < boundary)
+                               .order_by(StockMovement.timestamp, StockMovement.id)):
+            st = state.setdefault(pid, [0, 0.0])
+            if qty > 0 and cost is not None:
+                st[1] = _average_in(st[0], st[1], qty, cost)
+            st[0] += qty
+        cp_id = db.session.execute(insert(StockCheckpoint).returning(StockCheckpoint.id), [{
+            "business_id": business_id, "taken_at": boundary, "compacted": False,
+            "created_at": datetime.utcnow()}]).scalar()
+        rows = [{"checkpoint_id": cp_id, "product_id": pid, "qty": qty, "avg_cost": avg}
+                for pid, (qty, avg) in state.items() if qty or avg]
+        if rows:
+            db.session.execute(insert(StockSnapshot), rows)
+        window_start, written = boundary, written + 1
+    return written
+
+def stock_as_of(business_id, at):
+    """{product_id: qty} just before `at`. Raises CompactedHistory if that history is gone."""
+    cp = checkpoint_at(business_id, at)
+    horizon = _compacted_before(business_id)
+    if horizon is not None and at < horizon and (cp is None or cp.taken_at != at):
+        raise CompactedHistory(f"movements before {horizon.isoformat()} have been compacted")
+    totals = {pid: qty for pid, (qty, _) in _snapshot_rows(cp).items()} if cp else {}
+    q = (db.session.query(StockMovement.product_id, func.sum(StockMovement.qty))
+         .filter(StockMovement.business_id == business_id, StockMovement.timestamp < at))
+    if cp is not None:
+        q = q.filter(StockMovement.timestamp >= cp.taken_at)
+    for pid, qty in q.group_by(StockMovement.product_id):
+        totals[pid] = totals.get(pid, 0) + int(qty or 0)
+    return totals
+
+def compact_movements(business_id, before):
+    """
+    Delete movements older than the newest checkpoint at or before `before`
+    and mark that checkpoint compacted. Returns movements deleted; the caller commits.
+    """
+    cp = checkpoint_at(business_id, before)
+    if cp is None:
+        return 0
+    deleted = (StockMovement.query
+               .filter(StockMovement.business_id == business_id,
+                       StockMovement.timestamp < cp.taken_at)
+               .delete(synchronize_session=False))
+    cp.compacted = True
+    return deleted
@@ -0,0 +1,125 @@
+// Loaded in <head>, before the page scripts that call it on load.
+
+// Columnar bodies ({count, columns: {field: [values]}}) back to a list of objects.
+function fromColumns({count, columns}){
+  const fields = Object.keys(columns);
+  const rows = new Array(count);
+  for(let i=0; i<count; i++){
+    const row = {};
+    for(const f of fields) row[f] = columns[f][i];
+    rows[i] = row;
+  }
+  return rows;
+}
+
+// List endpoints (/api/catalog, /api/products, /api/stock) in ?format=columnar:
+// one array per field on the wire, back to a list of objects here.
+async function fetchRows(url){
+  const res = await fetch(url + (url.includes('?') ? '&' : '?') + 'format=columnar');
+  if(!res.ok) throw new Error(`${url}: HTTP ${res.status}`);
+  return fromColumns(await res.json());
+}
+
+// --- Local catalog (IndexedDB) ---
+// Products with their stock are kept on the device, so pages render at once
+// (and offline) and then pull only what changed from /api/changes.
+// Its own database: app.js's write queue ('stockwise') stays at version 1.
+const CATALOG_DB = 'kurmistock-catalog';
+let catalogDb = null, catalogRefresh = null;
+
+function idbRequest(req){
+  return new Promise((resolve, reject)=>{ req.onsuccess=()=>resolve(req.result); req.onerror=()=>reject(req.error); });
+}
+function idbDone(tx){
+  return new Promise((resolve, reject)=>{ tx.oncomplete=()=>resolve(); tx.onerror=tx.onabort=()=>reject(tx.error); });
+}
+function openCatalogDb(){
+  catalogDb ??= new Promise((resolve, reject)=>{
+    const req = indexedDB.open(CATALOG_DB, 1);
+    req.onupgradeneeded = ()=>{
+      req.result.createObjectStore('products', {keyPath:'id'});
+      req.result.createObjectStore('meta');   // 'state' -> {cursor, business_id}
+    };
+    req.onsuccess = ()=>resolve(req.result);
+    req.onerror = ()=>reject(req.error);
+  });
+  return catalogDb;
+}
+
+async function readCatalog(){
+  const db = await openCatalogDb();
+  const rows = await idbRequest(db.transaction('products').objectStore('products').getAll());
+  return rows.sort((a, b)=>a.name < b.name ? -1 : a.name > b.name ? 1 : 0);   // as /api/catalog
+}
+
+async function clearCatalog(){
+  const db = await openCatalogDb();
+  const tx = db.transaction(['products', 'meta'], 'readwrite');
+  tx.objectStore('products').clear();
+  tx.objectStore('meta').clear();
+  return idbDone(tx);
+}
+
+async function pullChanges(){
+  const db = await openCatalogDb();
+  const state = await idbRequest(db.transaction('meta').objectStore('meta').get('state'));
+  const since = state?.cursor ? `&since=${encodeURIComponent(state.cursor)}` : '';
+  const res = await fetch(`/api/changes?format=columnar${since}`);
+  if(!res.ok) throw new Error(`/api/changes: HTTP ${res.status}`);
+  const out = await res.json();
+  if(state && state.business_id !== out.business_id){
+    // another store signed in on this device: start over
+    await clearCatalog();
+    return pullChanges();
+  }
+  const changes = fromColumns(out.changes);
+  const tx = db.transaction(['products', 'meta'], 'readwrite');
+  const store = tx.objectStore('products');
+  if(out.full) store.clear();
+  for(const p of changes) store.put(p);
+  tx.objectStore('meta').put({cursor: out.cursor, business_id: out.business_id}, 'state');
+  await idbDone(tx);
+  return changes;
+}
+
+// One /api/changes request at a time; callers arriving meanwhile share it.
+function refreshCatalog(){
+  catalogRefresh ??= pullChanges().finally(()=>{ catalogRefresh = null; });
+  return catalogRefresh;
+}
+
+// The catalog sorted by name. With a local copy it is returned straight away
+// and refreshed in the background: onUpdate(rows) gets the new list if anything
+// changed (nothing happens while offline). Without one, waits for the server.
+async function loadCatalog(onUpdate){
+  let rows;
+  try{
+    rows = await readCatalog();
+  }catch(_){
+    return fetchRows('/api/catalog');   // no IndexedDB (e.g. private browsing)
+  }
+  if(!rows.length) return freshCatalog();
+  refreshCatalog().then(async changes=>{
+    if(changes.length && onUpdate) onUpdate(await readCatalog());
+  }).catch(()=>{});
+  return rows;
+}
+
+// The catalog after pulling the server's changes (e.g. right after a write).
+async function freshCatalog(){
+  try{
+    await refreshCatalog();
+    return await readCatalog();
+  }catch(_){
+    return fetchRows('/api/catalog');
+  }
+}
+
+// Sign-out: drop this store's catalog and cached assets, then submit the form.
+function handleLogout(e){
+  e.preventDefault();
+  const form = e.target;
+  navigator.serviceWorker?.controller?.postMessage('CLEAR_CACHES');
+  clearCatalog().catch(()=>{}).finally(()=>form.submit());
+  return false;
+}
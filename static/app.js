@@ -32,10 +32,19 @@ let dbPromise = new Promise((resolve, reject)=>{
   req.onerror = ()=>reject(req.error);
 });
 
+function newClientId(){
+  if (self.crypto?.randomUUID) return crypto.randomUUID();
+  return 'xxxxxxxx-xxxx-4xxx-yxxx-xxxxxxxxxxxx'.replace(/[xy]/g, c=>{
+    const r = Math.random()*16|0;
+    return (c==='x' ? r : (r&0x3|0x8)).toString(16);
+  });
+}
+
 async function queueOperation(kind, payload){
   const db = await dbPromise;
   const tx = db.transaction(STORE, 'readwrite');
-  tx.objectStore(STORE).add({kind, payload, createdAt: Date.now()});
+  // client_id lets the server drop records it has already applied (safe retries)
+  tx.objectStore(STORE).add({kind, payload: {client_id: newClientId(), ...payload}, createdAt: Date.now()});
   return tx.complete;
 }
 
@@ -51,23 +60,30 @@ async function readAll(){
     };
   });
 }
-async function clearAll(){
+async function removeKeys(keys){
   const db = await dbPromise;
   const tx = db.transaction(STORE, 'readwrite');
-  tx.objectStore(STORE).clear();
+  const store = tx.objectStore(STORE);
+  for(const k of keys) store.delete(k);
   return tx.complete;
 }
 
+localStorage.removeItem('kurmistock.syncCursor');   // left by older versions: survived sign-out
+
 async function syncNow(){
   const items = await readAll();
-  if(!items.length) return;
-  // naive grouping: send as-is
-  const payload = {products:[], sales:[], purchases:[]};
+  const payload = {version: 2, products:[], sales:[], purchases:[]};
   for(const it of items){
     payload[it.kind+'s']?.push(it.payload);
   }
   const res = await fetch('/api/sync',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify(payload)});
-  if(res.ok) await clearAll();
+  if(!res.ok || !(res.headers.get('content-type')||'').includes('application/json')) return;
+  const out = await res.json();
+  // only drop what was sent; anything queued meanwhile waits for the next sync
+  await removeKeys(items.map(it=>it._key));
+  // changed products come from /api/changes, on the local catalog's own cursor (cleared at sign-out)
+  refreshCatalog().catch(()=>{});
+  if(out.rejected?.length) showToast('Some offline records were rejected', `${out.rejected.length} not applied`, 'err');
 }
 
 document.getElementById('syncBtn')?.addEventListener('click', syncNow);
@@ -1,6 +1,7 @@
-const CACHE = 'kurmistock-static-v3';
+const CACHE = 'kurmistock-static-v6';
 const ASSETS = [
   '/static/app.js',
+  '/static/api.js',
   '/static/styles.css',
   '/static/manifest.webmanifest',
   '/static/icons/icon-192.png',
@@ -0,0 +1,239 @@
+# sync.py
+"""
+Offline sync protocol (version 2).
+
+Every record may carry a client-generated `client_id` (UUID). Ids already seen
+for the business are skipped, so a retried upload never double-counts stock.
+Rows are written with bulk INSERTs (headers via RETURNING, lines via
+executemany) and the balances are updated once per record kind; sales take
+their COGS from the average cost before this batch's purchases land.
+"""
+import math
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from extensions import db
+from models import Product, StockMovement, Sale, SaleItem, Purchase, PurchaseItem, SyncReceipt
+from inventory import (apply_stock_deltas, movement_deltas, init_balances,
+                       bump_catalog_version, record_daily_sales)
+from events import publish, publish_movements, publish_sales
+
+SYNC_VERSION = 2
+# balance stamps are taken before commit, so re-send a few seconds of overlap
+SYNC_SLACK = timedelta(seconds=5)
+CHUNK = 500  # stay well under SQLite's bound-parameter limit
+
+def parse_cursor(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+def _client_id(r):
+    cid = r.get("client_id") if isinstance(r, dict) else None
+    return cid if isinstance(cid, str) else None
+
+def _is_int(v):
+    return isinstance(v, int) and not isinstance(v, bool)
+
+def _record_error(kind, r):
+    """Why a record can't be written as sent (shape only; product ownership is checked later), or None."""
+    if not isinstance(r, dict):
+        return "records must be objects"
+    if r.get("client_id") is not None and not isinstance(r["client_id"], str):
+        return "client_id must be a string"
+    if kind == "products":
+        if not all(isinstance(r.get(k), str) and r[k] for k in ("sku", "name")):
+            return "sku and name are required"
+        if r.get("reorder_point") is not None and not _is_int(r["reorder_point"]):
+            return "reorder_point must be an integer"
+        return None
+    price_key = DOCUMENTS[kind][2]
+    items = r.get("items")
+    if not isinstance(items, list) or not items:
+        return "items must be a non-empty list"
+    for n, it in enumerate(items):
+        if not isinstance(it, dict):
+            return f"items[{n}] must be an object"
+        if not _is_int(it.get("product_id")):
+            return f"items[{n}].product_id must be an integer"
+        if not _is_int(it.get("qty")) or it["qty"] <= 0:
+            return f"items[{n}].qty must be a positive integer"
+        price = it.get(price_key)
+        if not isinstance(price, (int, float)) or isinstance(price, bool) or not math.isfinite(price) or price < 0:
+            return f"items[{n}].{price_key} must be a number >= 0"
+    return None
+
+def _chunks(seq, n=CHUNK):
+    for i in range(0, len(seq), n):
+        yield seq[i:i + n]
+
+def _seen_client_ids(business_id, client_ids):
+    seen = set()
+    for part in _chunks(list(client_ids)):
+        seen.update(cid for (cid,) in db.session.query(SyncReceipt.client_id)
+                    .filter(SyncReceipt.business_id == business_id,
+                            SyncReceipt.client_id.in_(part)))
+    return seen
+
+def _insert_returning_ids(model, rows):
+    if not rows:
+        return []
+    stmt = insert(model).returning(model.id, sort_by_parameter_order=True)
+    return list(db.session.scalars(stmt, rows))
+
+def _bulk_insert(model, rows):
+    if rows:
+        db.session.execute(insert(model), rows)
+
+# kind -> (header, line model, price key, stock sign, header total column, movement source)
+DOCUMENTS = {
+    "sales": (Sale, SaleItem, "unit_price", -1, "total_amount", "sale"),
+    "purchases": (Purchase, PurchaseItem, "unit_cost", 1, "total_cost", "purchase"),
+}
+
+def write_documents(tenant, kind, docs, now, allow_negative=True):
+    """
+    Insert validated sales or purchases ([{"items": [...]}, ...]) with one INSERT
+    per table, and move stock once for the whole batch. The caller commits.
+    Returns (header ids in input order, [(product_id, signed qty), ...]).
+    allow_negative=False: raises InsufficientStock instead of overselling.
+    """
+    header, line, price_key, sign, total_col, source = DOCUMENTS[kind]
+    bid = tenant.business_id
+    ids = _insert_returning_ids(header, [{
+        "user_id": tenant.user_id, "business_id": bid, "timestamp": now,
+        total_col: sum(i["qty"] * i[price_key] for i in r["items"]),
+    } for r in docs])
+
+    fk = "sale_id" if header is Sale else "purchase_id"
+    lines, movements, moved = [], [], []
+    for r, hid in zip(docs, ids):
+        for it in r["items"]:
+            qty = sign * abs(it["qty"])
+            line_row = {fk: hid, "product_id": it["product_id"],
+                        "qty": it["qty"], price_key: it[price_key]}
+            if line is SaleItem:
+                line_row["business_id"] = bid
+            lines.append(line_row)
+            movements.append({"user_id": tenant.user_id, "business_id": bid,
+                              "product_id": it["product_id"], "qty": qty,
+                              "type": "OUT" if sign < 0 else "IN", "source": source,
+                              "unit_cost": it.get("unit_cost") if sign > 0 else None,
+                              "timestamp": now})
+            moved.append((it["product_id"], qty))
+    receipts_in = ([(l["product_id"], abs(l["qty"]), l["unit_cost"]) for l in lines]
+                   if header is Purchase else ())
+    costs = apply_stock_deltas(bid, movement_deltas(moved), receipts_in, allow_negative)
+    if line is SaleItem:
+        for l in lines:
+            l["unit_cost"] = costs.get(l["product_id"]) or None  # COGS at sale time
+    _bulk_insert(line, lines)
+    _bulk_insert(StockMovement, movements)
+    if header is Sale and ids:
+        record_daily_sales(bid, now.date(),
+                           [(l["product_id"], l["qty"], l["unit_price"]) for l in lines])
+        publish_sales(bid, now, len(ids), sum(l["qty"] for l in lines),
+                      sum(l["qty"] * l["unit_price"] for l in lines))
+    return ids, moved
+
+def apply_sync(tenant, payload):
+    """
+    Write one sync payload for `tenant`'s business inside the current session.
+    The caller commits. Returns counts plus per-record outcomes keyed by client_id.
+    """
+    bid = tenant.business_id
+    now = datetime.utcnow()
+    created = {"sales": 0, "purchases": 0, "products": 0}
+    duplicates = {"sales": 0, "purchases": 0, "products": 0}
+    rejected = []
+
+    # 1) reject malformed records, then drop those we have already applied
+    #    (or that repeat inside this payload)
+    incoming = {}
+    for kind in ("products", "sales", "purchases"):
+        recs = payload.get(kind) or []
+        if not isinstance(recs, list):
+            rejected.append({"client_id": None, "error": f"{kind} must be a list"})
+            recs = []
+        incoming[kind] = []
+        for r in recs:
+            error = _record_error(kind, r)
+            if error:
+                rejected.append({"client_id": _client_id(r), "error": error})
+            else:
+                incoming[kind].append(r)
+    all_ids = {r["client_id"] for recs in incoming.values() for r in recs if r.get("client_id")}
+    seen = _seen_client_ids(bid, all_ids) if all_ids else set()
+    fresh = {}
+    for kind, recs in incoming.items():
+        fresh[kind] = []
+        for r in recs:
+            cid = r.get("client_id")
+            if cid and cid in seen:
+                duplicates[kind] += 1
+                continue
+            if cid:
+                seen.add(cid)
+            fresh[kind].append(r)
+
+    # 2) validate item product ids with one ownership query
+    pids = {it["product_id"] for kind in ("sales", "purchases")
+            for r in fresh[kind] for it in r["items"]}
+    owned = set()
+    for part in _chunks(list(pids)):
+        owned.update(pid for (pid,) in db.session.query(Product.id)
+                     .filter(Product.business_id == bid, Product.id.in_(part)))
+
+    receipts = []  # (client_id, kind, server_id)
+
+    # 3) products: one set-based SKU check, one insert
+    new_products, batch_skus = [], set()
+    skus = [p.get("sku") for p in fresh["products"] if p.get("sku")]
+    existing = set()
+    for part in _chunks(skus):
+        existing.update(s for (s,) in db.session.query(Product.sku)
+                        .filter(Product.business_id == bid, Product.sku.in_(part)))
+    for p in fresh["products"]:
+        sku = p["sku"]
+        if sku in existing or sku in batch_skus:
+            duplicates["products"] += 1
+            continue
+        batch_skus.add(sku)
+        new_products.append(p)
+    product_ids = _insert_returning_ids(Product, [{
+        "user_id": tenant.user_id, "business_id": bid, "sku": p["sku"], "name": p["name"],
+        "barcode": p.get("barcode"), "reorder_point": p.get("reorder_point", 0),
+    } for p in new_products])
+    init_balances(bid, {pid: 0 for pid in product_ids})
+    receipts += [(p.get("client_id"), "product", pid) for p, pid in zip(new_products, product_ids)]
+    created["products"] = len(product_ids)
+
+    # 4) sales and purchases share the same header/lines shape
+    moved = []
+    for kind in ("sales", "purchases"):
+        good = []
+        for r in fresh[kind]:
+            if not all(it["product_id"] in owned for it in r["items"]):
+                rejected.append({"client_id": r.get("client_id"), "error": "One or more items are invalid"})
+                continue
+            good.append(r)
+        ids, kind_moved = write_documents(tenant, kind, good, now)
+        moved += kind_moved
+        receipts += [(r.get("client_id"), DOCUMENTS[kind][5], hid) for r, hid in zip(good, ids)]
+        created[kind] = len(ids)
+
+    # 5) remember client ids
+    _bulk_insert(SyncReceipt, [{"business_id": bid, "client_id": cid, "kind": k,
+                                "server_id": sid, "created_at": now}
+                               for cid, k, sid in receipts if cid])
+    if moved or product_ids:
+        bump_catalog_version(bid)
+    if moved:
+        publish_movements(bid, moved, now)
+    if product_ids:
+        publish(bid, "resync", {})
+
+    return {"version": SYNC_VERSION, "created": created,
+            "duplicates": duplicates, "rejected": rejected}
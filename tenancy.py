@@ -0,0 +1,109 @@
+# tenancy.py
+"""
+Cached user identity and the per-request tenant context.
+
+Flask-Login's user_loader used to run User.query.get on every request just so
+handlers could read current_user.business_id. Identity now lives in a small
+in-process TTL/LRU cache as a session-free CachedUser, and route modules scope
+their queries through `current_tenant`.
+
+Invalidation: every flush that updates or deletes a User drops its entry (role,
+password, business changes), and admin.users_create / set-password call
+invalidate_user() explicitly. Other processes (manage.py, other workers) see
+such changes once the entry's TTL (USER_CACHE_TTL) runs out.
+"""
+import threading, time
+from collections import OrderedDict
+from flask import g, abort
+from flask_login import UserMixin, current_user
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from werkzeug.local import LocalProxy
+from extensions import db, login_manager
+from models import User
+
+_lock = threading.Lock()
+_cache = OrderedDict()          # user_id -> (expires_at, CachedUser)
+_settings = {"ttl": 60, "size": 1024}
+
+class CachedUser(UserMixin):
+    """Read-only snapshot of a User row; safe to share between requests."""
+    FIELDS = ("id", "email", "store_name", "locale", "is_admin", "role", "business_id")
+
+    def __init__(self, user):
+        for f in self.FIELDS:
+            setattr(self, f, getattr(user, f))
+
+    @property
+    def is_manager(self): return (self.role or "").lower() == "manager"
+    @property
+    def is_staff(self):   return (self.role or "").lower() == "staff"
+
+def cached_user(user_id):
+    now = time.monotonic()
+    with _lock:
+        hit = _cache.get(user_id)
+        if hit and hit[0] > now:
+            _cache.move_to_end(user_id)
+            return hit[1]
+    row = db.session.get(User, user_id)
+    if row is None:
+        return None
+    snap = CachedUser(row)
+    with _lock:
+        _cache[user_id] = (now + _settings["ttl"], snap)
+        _cache.move_to_end(user_id)
+        while len(_cache) > _settings["size"]:
+            _cache.popitem(last=False)
+    return snap
+
+def invalidate_user(user_id=None):
+    """Drop one user's cached identity, or everything when user_id is None."""
+    with _lock:
+        if user_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(user_id, None)
+
+@login_manager.user_loader
+def load_user(user_id):
+    return cached_user(int(user_id))
+
+class TenantContext:
+    """Who is asking and which business every query must be scoped to."""
+    __slots__ = ("user_id", "business_id", "role")
+
+    def __init__(self, user_id, business_id, role):
+        self.user_id, self.business_id, self.role = user_id, business_id, role
+
+    def scope(self, model):
+        # Model.query limited to this business
+        return model.query.filter(model.business_id == self.business_id)
+
+def _tenant():
+    if "tenant" not in g:
+        if not current_user.is_authenticated:
+            abort(401)
+        g.tenant = TenantContext(current_user.id, current_user.business_id, current_user.role)
+    return g.tenant
+
+current_tenant = LocalProxy(_tenant)
+
+def _mark_stale(mapper, connection, target):
+    # drop now, and again after commit so a concurrent request can't re-cache the old row
+    invalidate_user(target.id)
+    sess = object_session(target)
+    if sess is not None:
+        sess.info.setdefault("stale_users", set()).add(target.id)
+
+event.listen(User, "after_update", _mark_stale)
+event.listen(User, "after_delete", _mark_stale)
+
+@event.listens_for(Session, "after_commit")
+def _flush_stale(session):
+    for uid in session.info.pop("stale_users", ()):
+        invalidate_user(uid)
+
+def init_tenancy(app):
+    _settings["ttl"] = app.config.get("USER_CACHE_TTL", 60)
+    _settings["size"] = app.config.get("USER_CACHE_SIZE", 1024)